@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Union
 
 import frappe
 from frappe import _
 from frappe.utils import flt, nowdate
 
-from car_workshop.utils.pricing import resolve_rate
-from car_workshop.mapping.work_order_billing_to_sales_invoice import map_to_sales_invoice
+from car_workshop.utils.pricing import resolve_rates_bulk
+from car_workshop.mapping.work_order_billing_to_sales_invoice import (
+    map_to_sales_invoice,
+    prefetch_mapping_data,
+)
+
+BULK_SALES_INVOICE_CHUNK_SIZE = 20
+BULK_SALES_INVOICE_EVENT = "car_workshop_bulk_sales_invoice"
 
 
 @frappe.whitelist()
@@ -43,61 +49,48 @@ def get_work_order_billing_source(work_order: str) -> Dict[str, List[Dict[str, A
     posting_date = getattr(work_order_doc, "posting_date", nowdate())
 
     result: Dict[str, List[Dict[str, Any]]] = {
-        "job_types": [],
-        "service_packages": [],
-        "parts": [],
+        "job_types": _get_billable_rows(
+            work_order, "Work Order Job Type", "Job Type", "job_type",
+            ["job_type", "job_type_name", "hours", "rate", "amount"],
+        ),
+        "service_packages": _get_billable_rows(
+            work_order, "Work Order Service Package", "Service Package", "service_package",
+            ["service_package", "service_package_name", "quantity", "rate", "amount"],
+        ),
+        "parts": _get_billable_rows(
+            work_order, "Work Order Part", "Part", "part",
+            ["part", "part_name", "quantity", "rate", "amount"],
+        ),
         "external_services": [],
     }
 
-    job_types = frappe.get_all(
-        "Work Order Job Type",
-        filters={"parent": work_order},
-        fields=["job_type", "job_type_name", "hours", "rate", "amount"],
-    )
-    for job in job_types:
-        item_code = frappe.db.get_value("Job Type", job.job_type, "item")
-        if not item_code:
-            continue
-        if not job.rate:
-            price = resolve_rate("Job Type", job.job_type, default_price_list, posting_date)
-            if price:
-                job.rate = price.get("rate")
-        job.amount = flt(job.hours) * flt(job.rate)
-        result["job_types"].append(job)
+    # Resolve all missing rates with one batched price lookup
+    rate_sources = {
+        "job_types": ("Job Type", "job_type"),
+        "service_packages": ("Service Package", "service_package"),
+        "parts": ("Part", "part"),
+    }
+    missing = [
+        (reference_type, row.get(link_field))
+        for key, (reference_type, link_field) in rate_sources.items()
+        for row in result[key]
+        if not row.rate
+    ]
+    prices = resolve_rates_bulk(missing, default_price_list, posting_date) if missing else {}
 
-    service_packages = frappe.get_all(
-        "Work Order Service Package",
-        filters={"parent": work_order},
-        fields=["service_package", "service_package_name", "quantity", "rate", "amount"],
-    )
-    for package in service_packages:
-        item_code = frappe.db.get_value("Service Package", package.service_package, "item")
-        if not item_code:
-            continue
-        if not package.rate:
-            price = resolve_rate(
-                "Service Package", package.service_package, default_price_list, posting_date
-            )
-            if price:
-                package.rate = price.get("rate")
-        package.amount = flt(package.quantity) * flt(package.rate)
-        result["service_packages"].append(package)
+    for key, (reference_type, link_field) in rate_sources.items():
+        for row in result[key]:
+            if not row.rate:
+                price = prices.get((reference_type, row.get(link_field)))
+                if price:
+                    row.rate = price.get("rate")
 
-    parts = frappe.get_all(
-        "Work Order Part",
-        filters={"parent": work_order},
-        fields=["part", "part_name", "quantity", "rate", "amount"],
-    )
-    for part in parts:
-        item_code = frappe.db.get_value("Part", part.part, "item")
-        if not item_code:
-            continue
-        if not part.rate:
-            price = resolve_rate("Part", part.part, default_price_list, posting_date)
-            if price:
-                part.rate = price.get("rate")
+    for job in result["job_types"]:
+        job.amount = flt(job.hours) * flt(job.rate)
+    for package in result["service_packages"]:
+        package.amount = flt(package.quantity) * flt(package.rate)
+    for part in result["parts"]:
         part.amount = flt(part.quantity) * flt(part.rate)
-        result["parts"].append(part)
 
     external_services = frappe.get_all(
         "Work Order External Service",
@@ -111,6 +104,43 @@ def get_work_order_billing_source(work_order: str) -> Dict[str, List[Dict[str, A
     return result
 
 
+def _get_billable_rows(
+    work_order: str,
+    child_doctype: str,
+    link_doctype: str,
+    link_field: str,
+    fields: List[str],
+) -> List[Dict[str, Any]]:
+    """Fetch child rows of a Work Order whose linked document has an Item.
+
+    The linked item code is joined in the same query, so rows without one are
+    dropped without a lookup per row.
+
+    Args:
+        work_order: Work Order document name.
+        child_doctype: Child table DocType, e.g. "Work Order Part".
+        link_doctype: DocType the row links to, e.g. "Part".
+        link_field: Child field holding the link.
+        fields: Child fields to return.
+
+    Returns:
+        The matching rows in table order, with only the requested fields.
+    """
+    columns = ", ".join(f"child.`{field}`" for field in fields)
+    return frappe.db.sql(
+        f"""
+        SELECT {columns}
+        FROM `tab{child_doctype}` child
+        INNER JOIN `tab{link_doctype}` link ON link.name = child.`{link_field}`
+        WHERE child.parent = %(work_order)s
+            AND IFNULL(link.item, '') != ''
+        ORDER BY child.idx
+        """,
+        {"work_order": work_order},
+        as_dict=True,
+    )
+
+
 @frappe.whitelist()
 def make_sales_invoice(docname: str) -> str:
     """
@@ -133,4 +163,112 @@ def make_sales_invoice(docname: str) -> str:
     # Map to Sales Invoice
     sales_invoice_name = map_to_sales_invoice(docname)
     
-    return sales_invoice_name
\ No newline at end of file
+    return sales_invoice_name
+
+
+@frappe.whitelist()
+def make_sales_invoices_bulk(names: Union[str, List[str]]) -> Dict[str, Any]:
+    """
+    Queue Sales Invoice creation for many Work Order Billings
+
+    Args:
+        names: Work Order Billing names, as a list or JSON list
+
+    Returns:
+        Dict: The queued job id and number of billings
+    """
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+
+    names = list(dict.fromkeys(name for name in names or [] if name))
+    if not names:
+        frappe.throw(_("Select at least one Work Order Billing"))
+
+    if not frappe.has_permission("Sales Invoice", "create"):
+        raise frappe.PermissionError(_("Not permitted to create Sales Invoice"))
+
+    job = frappe.enqueue(
+        "car_workshop.api.billing_api.process_sales_invoices_bulk",
+        queue="long",
+        timeout=3600,
+        names=names,
+        user=frappe.session.user,
+        now=frappe.flags.in_test,
+    )
+
+    return {"job_id": getattr(job, "id", None), "total": len(names)}
+
+
+def process_sales_invoices_bulk(
+    names: List[str],
+    user: Optional[str] = None,
+    chunk_size: int = BULK_SALES_INVOICE_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Create Sales Invoices for Work Order Billings in chunks (background job)
+
+    Each billing is loaded once and each chunk shares one prefetch of item
+    codes. Chunks are committed on their own, so a failure
+    only rolls back the billing (or, for a failed prefetch, the chunk) that
+    failed and finished chunks survive a worker crash.
+
+    Args:
+        names: Work Order Billing names
+        user: User to notify about progress
+        chunk_size: Number of billings per commit
+
+    Returns:
+        Dict: Created invoices and per-document failures
+    """
+    created: List[Dict[str, str]] = []
+    failed: List[Dict[str, str]] = []
+    total = len(names)
+
+    for start in range(0, total, chunk_size):
+        chunk = names[start:start + chunk_size]
+        billings = []
+        for name in chunk:
+            try:
+                billing = frappe.get_doc("Work Order Billing", name)
+                billing.check_permission("read")
+                billings.append(billing)
+            except Exception as e:
+                failed.append({"name": name, "error": str(e)})
+
+        try:
+            prefetched = prefetch_mapping_data(billings)
+        except Exception as e:
+            # Only this chunk's billings fail; later chunks still run
+            failed.extend({"name": billing.name, "error": str(e)} for billing in billings)
+            frappe.log_error(
+                message=frappe.get_traceback(),
+                title=_("Bulk Sales Invoice prefetch failed"),
+            )
+            billings = []
+
+        for billing in billings:
+            savepoint = "bulk_sales_invoice"
+            frappe.db.savepoint(savepoint)
+            try:
+                sales_invoice = map_to_sales_invoice(billing.name, prefetched, billing)
+                created.append({"name": billing.name, "sales_invoice": sales_invoice})
+            except Exception as e:
+                frappe.db.rollback(save_point=savepoint)
+                failed.append({"name": billing.name, "error": str(e)})
+                frappe.log_error(
+                    message=frappe.get_traceback(),
+                    title=_("Bulk Sales Invoice failed for {0}").format(billing.name),
+                )
+
+        frappe.db.commit()
+
+        done = min(start + chunk_size, total)
+        frappe.publish_progress(
+            done * 100 / total,
+            title=_("Creating Sales Invoices"),
+            description=_("{0} of {1} Work Order Billings processed").format(done, total),
+        )
+
+    summary = {"total": total, "created": created, "failed": failed}
+    frappe.publish_realtime(BULK_SALES_INVOICE_EVENT, summary, user=user)
+    return summary
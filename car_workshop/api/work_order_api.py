@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+DEFAULT_BOARD_PAGE_LENGTH = 20
+MAX_BOARD_PAGE_LENGTH = 100
+
+# Header columns only; counts and totals are kept on the Work Order by
+# WorkOrder.update_board_summary, so no child table is read
+WORK_ORDER_BOARD_FIELDS = [
+    "name",
+    "creation",
+    "customer",
+    "customer_vehicle",
+    "service_date",
+    "service_advisor",
+    "status",
+    "job_type_count",
+    "service_package_count",
+    "part_count",
+    "expense_count",
+    "total_labor_amount",
+    "total_package_amount",
+    "total_parts_amount",
+    "total_external_amount",
+    "total_amount",
+    "lines_without_po",
+    "required_part_qty",
+]
+
+
+@frappe.whitelist()
+def get_work_order_board(
+    status: Optional[Union[str, List[str]]] = None,
+    service_advisor: Optional[str] = None,
+    after: Optional[str] = None,
+    page_length: int = DEFAULT_BOARD_PAGE_LENGTH,
+) -> Dict[str, Any]:
+    """Summarise Work Orders for the workshop board, newest first.
+
+    Pages are keyset-paginated on creation, with the name breaking ties:
+    pass the returned ``next_cursor`` as ``after`` to read the next page.
+    Names are not used alone because naming series numbers are neither
+    fixed width nor handed out in creation order.
+
+    Args:
+        status: Status or list of statuses to include (JSON list accepted).
+        service_advisor: Only Work Orders of this Service Advisor.
+        after: Cursor returned with the previous page.
+        page_length: Number of Work Orders per page.
+
+    Returns:
+        A dictionary with the ``work_orders`` of the page and the
+        ``next_cursor``, or None on the last page.
+    """
+    page_length = min(cint(page_length) or DEFAULT_BOARD_PAGE_LENGTH, MAX_BOARD_PAGE_LENGTH)
+
+    filters: Dict[str, Any] = {"docstatus": ["<", 2]}
+    statuses = _parse_statuses(status)
+    if statuses:
+        filters["status"] = ["in", statuses]
+    if service_advisor:
+        filters["service_advisor"] = service_advisor
+    or_filters = None
+    if after:
+        creation, name = _parse_cursor(after)
+        # (creation, name) < cursor, as creation <= c AND (creation < c OR name < n)
+        filters["creation"] = ["<=", creation]
+        or_filters = {"creation": ["<", creation], "name": ["<", name]}
+
+    rows = frappe.get_list(
+        "Work Order",
+        filters=filters,
+        or_filters=or_filters,
+        fields=WORK_ORDER_BOARD_FIELDS,
+        order_by="creation desc, name desc",
+        limit_page_length=page_length + 1,
+    )
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        next_cursor = f"{rows[-1].creation}|{rows[-1].name}"
+
+    names = [row.name for row in rows]
+    issued_qty = _get_issued_qty(names)
+    billing = _get_billing_status(names)
+
+    for row in rows:
+        row.issued_qty = issued_qty.get(row.name, 0.0)
+        row.pending_qty = max(flt(row.required_part_qty) - row.issued_qty, 0.0)
+        row.billing_status = billing.get(row.name, "Unbilled")
+
+    return {"work_orders": rows, "next_cursor": next_cursor}
+
+
+def _parse_statuses(status: Optional[Union[str, List[str]]]) -> List[str]:
+    """Normalise the status filter to a list."""
+    if not status:
+        return []
+    if isinstance(status, str):
+        status = frappe.parse_json(status) if status.startswith("[") else [status]
+    return [s for s in status if s]
+
+
+def _parse_cursor(cursor: str) -> Tuple[str, str]:
+    """Split a ``creation|name`` cursor."""
+    creation, _sep, name = cursor.partition("|")
+    if not creation or not name:
+        frappe.throw(_("Invalid Work Order board cursor: {0}").format(cursor))
+    return creation, name
+
+
+def _get_issued_qty(work_orders: List[str]) -> Dict[str, float]:
+    """Net issued quantity per Work Order, read from the part movement balances."""
+    if not work_orders:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT work_order, SUM(issued_qty - returned_qty) AS issued_qty
+        FROM `tabWork Order Part Balance`
+        WHERE work_order IN %(work_orders)s
+        GROUP BY work_order
+        """,
+        {"work_orders": tuple(work_orders)},
+        as_dict=True,
+    )
+    return {row.work_order: flt(row.issued_qty) for row in rows}
+
+
+def _get_billing_status(work_orders: List[str]) -> Dict[str, str]:
+    """Billing status of the latest non-cancelled Work Order Billing per Work Order."""
+    if not work_orders:
+        return {}
+
+    rows = frappe.db.sql(
+        """
+        SELECT work_order, billing_status
+        FROM `tabWork Order Billing`
+        WHERE work_order IN %(work_orders)s AND docstatus < 2
+        ORDER BY creation
+        """,
+        {"work_orders": tuple(work_orders)},
+        as_dict=True,
+    )
+    # Later billings overwrite earlier ones
+    return {row.work_order: row.billing_status or "Unbilled" for row in rows}
@@ -5,9 +5,12 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.utils import flt, cint, getdate, nowdate, now_datetime
-from frappe.utils.background_jobs import enqueue
-from typing import List, Optional, Dict, Any, Union
-import json
+from frappe.utils.background_jobs import enqueue, is_job_enqueued
+from typing import List, Optional, Dict, Any, Tuple, Union
+
+# Maximum number of adjustment lines per Stock Entry. Large counts are split
+# into several Stock Entries so no single posting locks the stock ledger for long.
+STOCK_ENTRY_CHUNK_SIZE = 200
 
 class PartStockAdjustment(Document):
     def validate(self) -> None:
@@ -30,13 +33,7 @@ class PartStockAdjustment(Document):
         """
         # Use background job if many items
         if len(self.adjustment_items) > 10:
-            enqueue(
-                self.make_stock_entries,
-                queue='short',
-                timeout=600,
-                event='make_stock_entries',
-                adjustment_document=self.name
-            )
+            enqueue_stock_entries(self.name)
             frappe.msgprint(
                 _("Stock Entry creation has been queued. It may take a few minutes to complete.")
             )
@@ -130,46 +127,43 @@ class PartStockAdjustment(Document):
         - Check if all are in 'Submitted' status
         - Block cancellation if any Stock Entry cannot be cancelled
         """
-        stock_entries_with_issues = []
         non_cancellable_entries = []
         
         # Check from stock_entry_logs
         if self.stock_entry_logs:
-            for log in self.stock_entry_logs:
-                if log.stock_entry:
-                    se_status = self.check_stock_entry_status(log.stock_entry)
-                    
-                    if se_status.get('docstatus') == 2:
-                        # Already cancelled, so skip
-                        continue
-                    elif not se_status.get('can_cancel'):
-                        # Cannot be cancelled
-                        non_cancellable_entries.append({
-                            'name': log.stock_entry,
-                            'reason': se_status.get('reason'),
-                            'entry_type': log.entry_type
-                        })
+            entries = [
+                (log.stock_entry, log.entry_type)
+                for log in self.stock_entry_logs if log.stock_entry
+            ]
         else:
             # Fallback: Check linked Stock Entries via reference fields
-            stock_entries = frappe.get_all("Stock Entry", 
-                filters={
-                    "reference_doctype": self.doctype,
-                    "reference_docname": self.name,
-                    "docstatus": 1
-                },
-                fields=["name", "stock_entry_type"]
-            )
+            entries = [
+                (entry.name, entry.stock_entry_type)
+                for entry in frappe.get_all("Stock Entry", 
+                    filters={
+                        "reference_doctype": self.doctype,
+                        "reference_docname": self.name,
+                        "docstatus": 1
+                    },
+                    fields=["name", "stock_entry_type"]
+                )
+            ]
+        
+        statuses = self.check_stock_entries_status([name for name, _entry_type in entries])
+        
+        for name, entry_type in entries:
+            se_status = statuses[name]
             
-            for entry in stock_entries:
-                se_status = self.check_stock_entry_status(entry.name)
-                
-                if not se_status.get('can_cancel'):
-                    # Cannot be cancelled
-                    non_cancellable_entries.append({
-                        'name': entry.name,
-                        'reason': se_status.get('reason'),
-                        'entry_type': entry.stock_entry_type
-                    })
+            if se_status.get('docstatus') == 2:
+                # Already cancelled, so skip
+                continue
+            elif not se_status.get('can_cancel'):
+                # Cannot be cancelled
+                non_cancellable_entries.append({
+                    'name': name,
+                    'reason': se_status.get('reason'),
+                    'entry_type': entry_type
+                })
         
         # If there are any issues, block cancellation
         if non_cancellable_entries:
@@ -185,7 +179,7 @@ class PartStockAdjustment(Document):
             
             frappe.throw(error_msg)
     
-    def check_stock_entry_status(self, stock_entry_name):
+    def check_stock_entry_status(self, stock_entry_name: str) -> Dict[str, Any]:
         """
         Helper function to check if a Stock Entry can be cancelled
         
@@ -199,9 +193,44 @@ class PartStockAdjustment(Document):
                 - docstatus: Current docstatus value
                 - stock_entry_type: Type of the Stock Entry
         """
+        return self.check_stock_entries_status([stock_entry_name])[stock_entry_name]
+    
+    def check_stock_entries_status(self, stock_entry_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Check if Stock Entries can be cancelled, using a fixed number of
+        queries for all of them instead of loading each document
+        
+        Args:
+            stock_entry_names: Names of the Stock Entry documents
+            
+        Returns:
+            dict: Status information (see check_stock_entry_status) per Stock Entry name
+        """
+        stock_entry_names = list(dict.fromkeys(stock_entry_names))
+        if not stock_entry_names:
+            return {}
+        
         try:
-            stock_entry = frappe.get_doc("Stock Entry", stock_entry_name)
-            result = {
+            stock_entries = {
+                entry.name: entry
+                for entry in frappe.get_all("Stock Entry",
+                    filters={"name": ["in", stock_entry_names]},
+                    fields=["name", "docstatus", "stock_entry_type", "posting_date", "creation"]
+                )
+            }
+        except Exception as e:
+            return {name: self._stock_entry_status_error(str(e)) for name in stock_entry_names}
+        
+        results = {}
+        pending = []
+        for name in stock_entry_names:
+            stock_entry = stock_entries.get(name)
+            if not stock_entry:
+                results[name] = self._stock_entry_status_error(
+                    _("Stock Entry {0} not found").format(name))
+                continue
+            
+            results[name] = {
                 'can_cancel': True,
                 'reason': "",
                 'docstatus': stock_entry.docstatus,
@@ -210,150 +239,250 @@ class PartStockAdjustment(Document):
             
             # If already cancelled, it's fine
             if stock_entry.docstatus == 2:
-                return result
+                continue
             
             # Check if it's in submitted state
             if stock_entry.docstatus != 1:
-                result['can_cancel'] = False
-                result['reason'] = _("Not in submitted state")
-                return result
-            
-            # Check for dependent documents that would prevent cancellation
-            # 1. Check if any dependent GL Entries exist
-            gl_entries = frappe.get_all("GL Entry", 
-                filters={"voucher_type": "Stock Entry", "voucher_no": stock_entry_name},
-                limit=1
-            )
-            
-            if gl_entries:
-                # Check if there are any linked payments or journal entries
-                dependent_docs = frappe.get_all("Journal Entry Account", 
-                    filters={"reference_type": "GL Entry", "reference_name": ["in", [e.name for e in gl_entries]]},
-                    fields=["parent"],
-                    limit=1
-                )
-                
-                if dependent_docs:
-                    result['can_cancel'] = False
-                    result['reason'] = _("Has linked Journal Entries")
-                    return result
-            
-            # 2. Check if this Stock Entry has subsequent inventory movements
-            current_date = frappe.utils.now_datetime()
-            subsequent_entries = frappe.get_all("Stock Ledger Entry",
-                filters={
-                    "item_code": ["in", [d.item_code for d in stock_entry.items]],
-                    "warehouse": ["in", list(set([d.s_warehouse or d.t_warehouse for d in stock_entry.items]))],
-                    "posting_date": [">", stock_entry.posting_date],
-                    "creation": [">", stock_entry.creation],
-                    "voucher_no": ["!=", stock_entry.name]
-                },
-                limit=1
-            )
-            
-            if subsequent_entries:
-                result['can_cancel'] = False
-                result['reason'] = _("Has subsequent inventory movements")
-                return result
+                results[name]['can_cancel'] = False
+                results[name]['reason'] = _("Not in submitted state")
+                continue
             
-            # 3. Check if created in a closed fiscal year
+            pending.append(name)
+        
+        def block(names, reason):
+            for name in names:
+                if name in pending:
+                    pending.remove(name)
+                    results[name]['can_cancel'] = False
+                    results[name]['reason'] = reason
+        
+        # 1. Check for GL Entries referenced by Journal Entries
+        if pending:
+            block(frappe.db.sql_list("""
+                SELECT DISTINCT gle.voucher_no
+                FROM `tabGL Entry` gle
+                INNER JOIN `tabJournal Entry Account` jea
+                    ON jea.reference_type = 'GL Entry' AND jea.reference_name = gle.name
+                WHERE gle.voucher_type = 'Stock Entry'
+                    AND gle.voucher_no IN %(names)s
+            """, {"names": tuple(pending)}), _("Has linked Journal Entries"))
+        
+        # 2. Check for later movements of any item/warehouse pair of each entry.
+        # Driven by the entries' detail rows, so each probe of Stock Ledger
+        # Entry is an (item_code, warehouse) index lookup
+        if pending:
+            block(frappe.db.sql_list("""
+                SELECT DISTINCT sed.parent
+                FROM `tabStock Entry Detail` sed
+                INNER JOIN `tabStock Entry` se ON se.name = sed.parent
+                INNER JOIN `tabStock Ledger Entry` sle
+                    ON sle.item_code = sed.item_code
+                    AND sle.warehouse IN (sed.s_warehouse, sed.t_warehouse)
+                WHERE sed.parent IN %(names)s
+                    AND sed.parenttype = 'Stock Entry'
+                    AND sle.is_cancelled = 0
+                    AND sle.voucher_no != sed.parent
+                    AND sle.posting_date > se.posting_date
+                    AND sle.creation > se.creation
+            """, {"names": tuple(pending)}), _("Has subsequent inventory movements"))
+        
+        # 3. Check if created in a closed fiscal year
+        if pending:
             from frappe.utils.jinja import get_jenv
             try:
                 get_jenv().get_template('templates/includes/fiscal_year_controller.html')
-                year_closed = frappe.db.get_value("Fiscal Year", {
-                    "year_start_date": ["<=", stock_entry.posting_date],
-                    "year_end_date": [">=", stock_entry.posting_date]
-                }, "closed")
-                
-                if year_closed:
-                    result['can_cancel'] = False
-                    result['reason'] = _("Created in a closed fiscal year")
-                    return result
+                posting_dates = [getdate(stock_entries[name].posting_date) for name in pending]
+                closed_years = frappe.get_all("Fiscal Year",
+                    filters={
+                        "year_start_date": ["<=", max(posting_dates)],
+                        "year_end_date": [">=", min(posting_dates)],
+                        "closed": 1
+                    },
+                    fields=["year_start_date", "year_end_date"]
+                )
+                block([
+                    name for name in pending
+                    if any(
+                        getdate(year.year_start_date) <= getdate(stock_entries[name].posting_date) <= getdate(year.year_end_date)
+                        for year in closed_years
+                    )
+                ], _("Created in a closed fiscal year"))
             except Exception:
                 # Fiscal year template not available, skip this check
                 pass
+        
+        # 4. Check for any custom validations; documents are only loaded
+        # when a validate_cancellation hook is registered
+        if pending and self._has_cancellation_validators():
+            for name in list(pending):
+                try:
+                    frappe.get_doc("Stock Entry", name).run_method("validate_cancellation")
+                except Exception as e:
+                    block([name], str(e))
+        
+        return results
+    
+    @staticmethod
+    def _stock_entry_status_error(reason: str) -> Dict[str, Any]:
+        return {
+            'can_cancel': False,
+            'reason': reason,
+            'docstatus': 0,
+            'stock_entry_type': "Unknown"
+        }
+    
+    @staticmethod
+    def _has_cancellation_validators() -> bool:
+        """Whether any app hooks validate_cancellation on Stock Entry"""
+        doc_events = frappe.get_hooks("doc_events") or {}
+        return any(
+            (doc_events.get(doctype) or {}).get("validate_cancellation")
+            for doctype in ("Stock Entry", "*")
+        )
+    
+    def make_stock_entries(self, chunk_size: Optional[int] = None, commit: bool = False) -> None:
+        """
+        Create Stock Entries for the adjustments:
+        - Material Receipt entries for positive adjustments
+        - Material Issue entries for negative adjustments
+        
+        Each entry type is split into chunks of at most chunk_size lines. Every
+        chunk is recorded in stock_entry_logs as soon as its Stock Entry is
+        submitted, and chunks already logged are skipped, so a failed run can
+        be resumed. Before each chunk the adjustment row is locked and the
+        logs are re-read, so two runs never post the same chunk.
+        
+        Args:
+            chunk_size: Maximum number of lines per Stock Entry
+            commit: Commit after every chunk (background jobs only)
+        """
+        chunk_size = cint(chunk_size or STOCK_ENTRY_CHUNK_SIZE)
+        self.set_missing_item_codes()
+        
+        chunks = self.get_stock_entry_chunks(chunk_size)
+        
+        stock_entries = []
+        for position, (entry_type, chunk_index, items) in enumerate(chunks, 1):
+            if (entry_type, chunk_index) in self.lock_posted_chunks():
+                continue
             
-            # 4. Check for any custom validations
-            try:
-                stock_entry.run_method("validate_cancellation")
-            except Exception as e:
-                result['can_cancel'] = False
-                result['reason'] = str(e)
-                return result
+            stock_entry = self.create_stock_entry(items, entry_type)
+            if not stock_entry:
+                continue
             
-            return result
-        except Exception as e:
-            return {
-                'can_cancel': False,
-                'reason': str(e),
-                'docstatus': 0,
-                'stock_entry_type': "Unknown"
-            }
+            self.log_stock_entry(stock_entry, chunk_index, len(items))
+            stock_entries.append(stock_entry)
+            
+            if commit:
+                frappe.db.commit()
+                frappe.publish_progress(
+                    position * 100 / len(chunks),
+                    title=_("Creating Stock Entries"),
+                    doctype=self.doctype,
+                    docname=self.name
+                )
+        
+        if stock_entries:
+            # Update HTML field for display
+            self.update_stock_entries_html([
+                frappe._dict(name=log.stock_entry, stock_entry_type=log.entry_type)
+                for log in self.stock_entry_logs if log.stock_entry
+            ])
+            
+            frappe.msgprint(_("Stock Entries created: {0}").format(
+                ", ".join([entry.name for entry in stock_entries])))
     
-    def make_stock_entries(self) -> None:
+    def lock_posted_chunks(self) -> set:
         """
-        Create Stock Entries for the adjustments:
-        - One Entry for positive adjustments (Material Receipt)
-        - One Entry for negative adjustments (Material Issue)
+        Lock the adjustment row until the next commit and read the chunks
+        already posted, including those committed by another run meanwhile
+        
+        Returns:
+            set: (entry_type, chunk_index) of every logged chunk
         """
-        positive_items = []
-        negative_items = []
+        frappe.db.sql("""
+            SELECT name FROM `tabPart Stock Adjustment`
+            WHERE name = %(name)s
+            FOR UPDATE
+        """, {"name": self.name})
+        
+        return {
+            (log.entry_type, cint(log.chunk_index))
+            for log in frappe.get_all(
+                "Stock Entry Log",
+                filters={
+                    "parent": self.name,
+                    "parenttype": self.doctype,
+                    "parentfield": "stock_entry_logs",
+                    "stock_entry": ["is", "set"],
+                },
+                fields=["entry_type", "chunk_index"],
+            )
+        }
+    
+    def set_missing_item_codes(self) -> None:
+        """Fill item_code from Part for all adjustment items in one query"""
+        parts = list({item.part for item in self.adjustment_items if item.part and not item.item_code})
+        if not parts:
+            return
+        
+        from car_workshop.utils.part_snapshot import get_part_item_codes
+        
+        item_codes = get_part_item_codes(parts)
         
-        # Group items by positive and negative differences
         for item in self.adjustment_items:
             if not item.item_code:
-                # Get item code from part
-                item_code = frappe.db.get_value("Part", item.part, "item_code")
+                item_code = item_codes.get(item.part)
                 if not item_code:
                     frappe.throw(_("Item Code not found for Part {0}").format(item.part))
                 item.item_code = item_code
+    
+    def get_stock_entry_chunks(self, chunk_size: int) -> List[Any]:
+        """
+        Split adjustment items into Stock Entry sized chunks
+        
+        Args:
+            chunk_size: Maximum number of lines per chunk
             
+        Returns:
+            list: (entry_type, chunk_index, items) tuples in posting order
+        """
+        items_by_type = {"Material Receipt": [], "Material Issue": []}
+        
+        # Group items by positive and negative differences
+        for item in self.adjustment_items:
             if flt(item.difference) > 0:
-                positive_items.append(item)
+                items_by_type["Material Receipt"].append(item)
             elif flt(item.difference) < 0:
-                negative_items.append(item)
+                items_by_type["Material Issue"].append(item)
         
-        stock_entries = []
-        
-        # Create Stock Entry for positive adjustments (Material Receipt)
-        if positive_items:
-            receipt_entry = self.create_stock_entry(positive_items, "Material Receipt")
-            if receipt_entry:
-                stock_entries.append(receipt_entry)
+        chunks = []
+        for entry_type, items in items_by_type.items():
+            for chunk_index, start in enumerate(range(0, len(items), chunk_size)):
+                chunks.append((entry_type, chunk_index, items[start:start + chunk_size]))
         
-        # Create Stock Entry for negative adjustments (Material Issue)
-        if negative_items:
-            issue_entry = self.create_stock_entry(negative_items, "Material Issue")
-            if issue_entry:
-                stock_entries.append(issue_entry)
+        return chunks
+    
+    def log_stock_entry(self, stock_entry: Any, chunk_index: int, item_count: int) -> None:
+        """
+        Record a submitted Stock Entry in stock_entry_logs
         
-        # Store stock entry references
-        if stock_entries:
-            # Create a list to store stock entry logs
-            if not hasattr(self, 'stock_entry_logs'):
-                self.stock_entry_logs = []
-            
-            # Clear existing logs if any
-            self.stock_entry_logs = []
-            
-            for entry in stock_entries:
-                # Add to log list
-                self.append('stock_entry_logs', {
-                    'stock_entry': entry.name,
-                    'entry_type': entry.stock_entry_type,
-                    'posting_date': entry.posting_date,
-                    'created_by': frappe.session.user,
-                    'creation_date': now_datetime()
-                })
-            
-            # Save to database
-            self.db_update()
-            
-            # Update HTML field for display
-            self.update_stock_entries_html(stock_entries)
-            
-            frappe.msgprint(_("Stock Entries created: {0}").format(
-                ", ".join([entry.name for entry in stock_entries])))
+        Args:
+            stock_entry: Submitted Stock Entry document
+            chunk_index: Index of the chunk within its entry type
+            item_count: Number of adjustment lines in the chunk
+        """
+        log = self.append('stock_entry_logs', {
+            'stock_entry': stock_entry.name,
+            'entry_type': stock_entry.stock_entry_type,
+            'posting_date': stock_entry.posting_date,
+            'chunk_index': chunk_index,
+            'item_count': item_count,
+            'created_by': frappe.session.user,
+            'creation_date': now_datetime()
+        })
+        # The adjustment itself is already saved, so insert the row directly
+        log.db_insert()
     
     def update_stock_entries_html(self, stock_entries: List[Any]) -> None:
         """
@@ -499,7 +628,23 @@ def create_adjustment_from_opname(opname_id: str) -> Optional[Any]:
     if not opname_id:
         frappe.throw(_("Stock Opname ID is required"))
         
-    opname = frappe.get_doc("Part Stock Opname", opname_id)
+    return make_adjustment_from_opname(frappe.get_doc("Part Stock Opname", opname_id))
+
+
+def make_adjustment_from_opname(opname: Any) -> Optional[Any]:
+    """
+    Create a stock adjustment from a loaded stock opname; a zone session
+    group merges the counts of all its sessions
+    
+    Args:
+        opname: Part Stock Opname document
+        
+    Returns:
+        Part Stock Adjustment doc or None if no differences found
+    """
+    if opname.get("parent_opname"):
+        frappe.throw(_("Stock Opname {0} is a zone session of {1}. Create the adjustment from {1}.").format(
+            opname.name, opname.parent_opname))
     
     if opname.docstatus != 1:
         frappe.throw(_("Stock Opname must be submitted to create adjustment"))
@@ -517,40 +662,45 @@ def create_adjustment_from_opname(opname_id: str) -> Optional[Any]:
     
     # Get system quantities and add items
     has_differences = False
+    sessions = []
     
+    if opname.get("is_group"):
+        # Merge the counts of all zone sessions
+        sessions, has_differences = append_zone_session_differences(adjustment, opname.name)
     # Try to load system quantities from cache in opname
-    if hasattr(opname, 'system_quantities_cache') and opname.system_quantities_cache:
-        system_quantities = json.loads(opname.system_quantities_cache)
+    elif hasattr(opname, 'system_quantities_cache') and opname.system_quantities_cache:
+        from car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname import (
+            SystemQuantitySnapshot,
+        )
+
+        system_quantities = SystemQuantitySnapshot.loads(opname.system_quantities_cache)
         
-        for item in opname.opname_items:
-            if not item.part:
-                continue
-                
-            if item.part in system_quantities:
-                system_qty = system_quantities[item.part]["actual_qty"]
-                difference = flt(item.qty_counted) - system_qty
-                
-                # Only add items with differences
-                if difference != 0:
-                    adjustment.append("adjustment_items", {
-                        "part": item.part,
-                        "item_code": system_quantities[item.part]["item_code"],
-                        "actual_qty": system_qty,
-                        "counted_qty": item.qty_counted,
-                        "difference": difference,
-                        "uom": item.uom,
-                        "valuation_rate": system_quantities[item.part]["valuation_rate"],
-                        "adjustment_amount": difference * system_quantities[item.part]["valuation_rate"]
-                    })
-                    has_differences = True
+        # Only add items with differences
+        for item, item_code, system_qty, valuation_rate, difference in system_quantities.iter_differences(
+            opname.opname_items
+        ):
+            adjustment.append("adjustment_items", {
+                "part": item.part,
+                "item_code": item_code,
+                "actual_qty": system_qty,
+                "counted_qty": item.qty_counted,
+                "difference": difference,
+                "uom": item.uom,
+                "valuation_rate": valuation_rate,
+                "adjustment_amount": difference * valuation_rate
+            })
+            has_differences = True
     else:
         # Fallback: Query current quantities if cache not available
+        from car_workshop.utils.part_snapshot import get_part_item_codes
+        
+        part_item_codes = get_part_item_codes(item.part for item in opname.opname_items)
         for item in opname.opname_items:
             if not item.part:
                 continue
                 
             # Get item_code from part
-            item_code = frappe.db.get_value("Part", item.part, "item_code")
+            item_code = part_item_codes.get(item.part)
             if not item_code:
                 continue
                 
@@ -589,5 +739,142 @@ def create_adjustment_from_opname(opname_id: str) -> Optional[Any]:
     
     # Update stock opname status
     opname.db_set('status', 'Adjusted')
+    for session in sessions:
+        frappe.db.set_value("Part Stock Opname", session, "status", "Adjusted")
+
+    return adjustment
+
+
+def append_zone_session_differences(adjustment: Any, group_opname: str) -> Tuple[List[str], bool]:
+    """
+    Add the differences of every zone session of a grouped Stock Opname
+    to one adjustment, comparing each session against its own snapshot
+    
+    Args:
+        adjustment: Part Stock Adjustment being built
+        group_opname: Name of the zone session group
+        
+    Returns:
+        tuple: (names of the merged sessions, whether any difference was added)
+    """
+    from car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname import (
+        SystemQuantitySnapshot,
+    )
+    
+    sessions = frappe.get_all("Part Stock Opname",
+        filters={"parent_opname": group_opname, "docstatus": ["<", 2]},
+        fields=["name", "zone", "docstatus", "status", "system_quantities_cache"],
+        order_by="creation asc"
+    )
+    
+    if not sessions:
+        frappe.throw(_("No zone sessions found for Stock Opname {0}").format(group_opname))
+    
+    drafts = [session.name for session in sessions if session.docstatus != 1]
+    if drafts:
+        frappe.throw(_("All zone sessions must be submitted before merging. Draft sessions: {0}").format(
+            ", ".join(drafts)))
+    
+    adjusted = [session.name for session in sessions if session.status == "Adjusted"]
+    if adjusted:
+        frappe.throw(_("Zone sessions {0} have already been adjusted").format(", ".join(adjusted)))
+    
+    # Load the counted items of all sessions in one query
+    items_by_session = {session.name: [] for session in sessions}
+    for item in frappe.get_all("Part Stock Opname Item",
+        filters={"parent": ["in", list(items_by_session)], "parenttype": "Part Stock Opname"},
+        fields=["parent", "part", "qty_counted", "uom"],
+        order_by="parent asc, idx asc"
+    ):
+        items_by_session[item.parent].append(item)
+    
+    counted_in = {}
+    duplicates = []
+    for session in sessions:
+        for item in items_by_session[session.name]:
+            if item.part in counted_in:
+                duplicates.append(_("Part {0} is counted in both {1} and {2}").format(
+                    item.part, counted_in[item.part], session.name))
+            counted_in[item.part] = session.name
+    
+    if duplicates:
+        frappe.throw("<br>".join(duplicates))
+    
+    has_differences = False
+    for session in sessions:
+        system_quantities = SystemQuantitySnapshot.loads(session.system_quantities_cache)
+        
+        # Only add items with differences
+        for item, item_code, system_qty, valuation_rate, difference in system_quantities.iter_differences(
+            items_by_session[session.name]
+        ):
+            adjustment.append("adjustment_items", {
+                "part": item.part,
+                "item_code": item_code,
+                "actual_qty": system_qty,
+                "counted_qty": item.qty_counted,
+                "difference": difference,
+                "uom": item.uom,
+                "valuation_rate": valuation_rate,
+                "adjustment_amount": difference * valuation_rate
+            })
+            has_differences = True
+    
+    return [session.name for session in sessions], has_differences
+
+
+def get_stock_entries_job_id(adjustment_document: str) -> str:
+    """Fixed id of the Stock Entry job of an adjustment, so only one runs at a time"""
+    return f"part_stock_adjustment_stock_entries::{adjustment_document}"
+
+
+def enqueue_stock_entries(adjustment_document: str) -> None:
+    """Queue Stock Entry creation for a submitted Part Stock Adjustment"""
+    enqueue(
+        make_stock_entries_for_adjustment,
+        queue='long',
+        timeout=3600,
+        event='make_stock_entries',
+        enqueue_after_commit=True,
+        job_id=get_stock_entries_job_id(adjustment_document),
+        deduplicate=True,
+        adjustment_document=adjustment_document
+    )
+
+
+def make_stock_entries_for_adjustment(adjustment_document: str) -> None:
+    """
+    Background job creating the remaining Stock Entries of an adjustment,
+    committing after each chunk
+    
+    Args:
+        adjustment_document: Name of the Part Stock Adjustment
+    """
+    adjustment = frappe.get_doc("Part Stock Adjustment", adjustment_document)
+    if adjustment.docstatus != 1:
+        return
+    
+    adjustment.make_stock_entries(commit=True)
+
 
-    return adjustment
\ No newline at end of file
+@frappe.whitelist()
+def resume_stock_entries(adjustment_document: str) -> None:
+    """
+    Resume Stock Entry creation after a failed background job.
+    Chunks already logged in stock_entry_logs are not posted again, and a
+    job that is still queued or running is not queued twice.
+    
+    Args:
+        adjustment_document: Name of the Part Stock Adjustment
+    """
+    adjustment = frappe.get_doc("Part Stock Adjustment", adjustment_document)
+    adjustment.check_permission("submit")
+    
+    if adjustment.docstatus != 1:
+        frappe.throw(_("Part Stock Adjustment must be submitted to create Stock Entries"))
+    
+    if is_job_enqueued(get_stock_entries_job_id(adjustment.name)):
+        frappe.throw(_("Stock Entry creation for {0} is still running").format(adjustment.name))
+    
+    enqueue_stock_entries(adjustment.name)
+    frappe.msgprint(_("Stock Entry creation has been queued. It may take a few minutes to complete."))
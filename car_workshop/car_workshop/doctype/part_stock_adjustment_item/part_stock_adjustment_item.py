@@ -33,8 +33,11 @@ class PartStockOpnameItem(Document):
             return
             
         if not self.item_code:
-            # Get item code from Part
-            item_code = frappe.db.get_value("Part", self.part, "item")
+            # Get item code from the Part snapshot
+            from car_workshop.utils.part_snapshot import get_part_snapshot
+            
+            part = get_part_snapshot(self.part)
+            item_code = part.item_code if part else None
             if not item_code:
                 frappe.throw(_("Part {0} is not linked to any Item").format(self.part))
             self.item_code = item_code
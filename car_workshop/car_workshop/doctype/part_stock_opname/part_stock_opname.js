@@ -37,8 +37,18 @@ frappe.ui.form.on('Part Stock Opname', {
             });
         }
         
+        // Zone session groups are counted through their sessions
+        if (frm.doc.is_group && frm.doc.docstatus < 2 && frm.doc.status !== "Adjusted") {
+            frm.add_custom_button(__('New Zone Session'), function() {
+                frappe.model.open_mapped_doc({
+                    method: 'car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname.make_zone_session',
+                    frm: frm
+                });
+            }, __("Actions"));
+        }
+        
         // Add barcode scan button in header
-        if (frm.doc.docstatus === 0) {
+        if (frm.doc.docstatus === 0 && !frm.doc.is_group) {
             frm.add_custom_button(__('Scan Barcode'), function() {
                 scan_barcode(frm);
             }, __("Actions")).addClass('btn-primary');
@@ -7,18 +7,157 @@ from frappe.model.document import Document
 from frappe.utils import flt, cint, getdate, now_datetime, nowdate
 import json
 
+SNAPSHOT_VERSION = 2
+
+
+class SystemQuantitySnapshot:
+    """
+    Snapshot of system quantities stored in system_quantities_cache as
+    parallel arrays (parts, item_codes, actual_qty, valuation_rate) instead of
+    one dict per Part. A loaded snapshot keeps the stored JSON as is until a
+    column is first read, and Parts are looked up through a position index
+    built on first lookup.
+    """
+
+    def __init__(self, parts=None, item_codes=None, actual_qty=None, valuation_rate=None):
+        self._raw = None
+        self._columns = (
+            list(parts or []),
+            list(item_codes or []),
+            list(actual_qty or []),
+            list(valuation_rate or []),
+        )
+        self._positions = None
+
+    @classmethod
+    def loads(cls, value):
+        """
+        Wrap a snapshot stored as JSON; it is parsed on first access
+
+        Args:
+            value: Contents of system_quantities_cache
+
+        Returns:
+            SystemQuantitySnapshot: Snapshot, empty if nothing was stored
+        """
+        snapshot = cls()
+        snapshot._raw = value or None
+        return snapshot
+
+    @property
+    def parts(self):
+        return self._get_columns()[0]
+
+    @property
+    def item_codes(self):
+        return self._get_columns()[1]
+
+    @property
+    def actual_qty(self):
+        return self._get_columns()[2]
+
+    @property
+    def valuation_rate(self):
+        return self._get_columns()[3]
+
+    def _get_columns(self):
+        if self._raw is None:
+            return self._columns
+
+        data = json.loads(self._raw)
+        self._raw = None
+        if data.get("version") == SNAPSHOT_VERSION:
+            self._columns = (data["parts"], data["item_codes"], data["actual_qty"], data["valuation_rate"])
+        else:
+            # Documents saved before the columnar format keep a dict per Part
+            self._columns = (
+                list(data),
+                [row["item_code"] for row in data.values()],
+                [row["actual_qty"] for row in data.values()],
+                [row["valuation_rate"] for row in data.values()],
+            )
+        return self._columns
+
+    def dumps(self):
+        """Serialise the snapshot as compact JSON"""
+        if self._raw is not None:
+            return self._raw
+
+        return json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "parts": self.parts,
+            "item_codes": self.item_codes,
+            "actual_qty": self.actual_qty,
+            "valuation_rate": self.valuation_rate,
+        }, separators=(",", ":"))
+
+    def add(self, part, item_code, actual_qty, valuation_rate):
+        """Append the system quantity of a Part"""
+        if self._positions is not None:
+            self._positions[part] = len(self.parts)
+        self.parts.append(part)
+        self.item_codes.append(item_code)
+        self.actual_qty.append(flt(actual_qty))
+        self.valuation_rate.append(flt(valuation_rate))
+
+    def get(self, part):
+        """
+        Get the snapshot of a Part
+
+        Args:
+            part: Part name
+
+        Returns:
+            tuple: (item_code, actual_qty, valuation_rate) or None if not in the snapshot
+        """
+        if self._positions is None:
+            self._positions = {name: position for position, name in enumerate(self.parts)}
+
+        position = self._positions.get(part)
+        if position is None:
+            return None
+        return self.item_codes[position], self.actual_qty[position], self.valuation_rate[position]
+
+    def __contains__(self, part):
+        return self.get(part) is not None
+
+    def iter_differences(self, opname_items):
+        """
+        Compare counted quantities with the snapshot
+
+        Args:
+            opname_items: Part Stock Opname Item rows
+
+        Yields:
+            tuple: (item, item_code, system_qty, valuation_rate, difference) for rows
+            whose counted quantity differs from the snapshot
+        """
+        for item in opname_items:
+            snapshot = self.get(item.part) if item.part else None
+            if not snapshot:
+                continue
+
+            item_code, system_qty, valuation_rate = snapshot
+            difference = flt(item.qty_counted) - system_qty
+            if difference != 0:
+                yield item, item_code, system_qty, valuation_rate, difference
+
+
 class PartStockOpname(Document):
     def validate(self):
         """
         Validate the document:
         - Check all required fields
+        - Validate zone session against its group
         - Validate items
         - Store system quantities for later comparison
         """
         self.validate_required_fields()
+        self.validate_zone_session()
         self.validate_items()
         self.update_status()
-        self.store_system_quantities()
+        if not self.is_group:
+            self.store_system_quantities()
     
     def on_submit(self):
         """
@@ -49,21 +188,82 @@ class PartStockOpname(Document):
         if not self.posting_time:
             self.posting_time = now_datetime().strftime('%H:%M:%S')
             
+        if self.is_group:
+            if self.opname_items:
+                frappe.throw(_("Items are counted in the zone sessions of this Stock Opname, not in the group itself"))
+            return
+            
         if not self.opname_items or len(self.opname_items) == 0:
             frappe.throw(_("At least one item is required for stock opname"))
     
+    def validate_zone_session(self):
+        """
+        Validate a zone session:
+        - Parent must be an open zone session group for the same warehouse
+        - Parts must not be counted in another session of the same group
+        """
+        if not self.parent_opname:
+            return
+        
+        if self.is_group:
+            frappe.throw(_("A zone session group cannot be a session of another Stock Opname"))
+        
+        group = frappe.db.get_value("Part Stock Opname", self.parent_opname,
+            ["is_group", "warehouse", "docstatus", "status"], as_dict=1)
+        
+        if not group or not group.is_group:
+            frappe.throw(_("Stock Opname {0} is not split into zone sessions").format(self.parent_opname))
+        
+        if group.docstatus == 2 or group.status == "Adjusted":
+            frappe.throw(_("Stock Opname {0} is already closed").format(self.parent_opname))
+        
+        if self.warehouse != group.warehouse:
+            frappe.throw(_("Zone session warehouse must be {0}, the warehouse of Stock Opname {1}").format(
+                group.warehouse, self.parent_opname))
+        
+        self.check_parts_in_other_sessions()
+    
+    def check_parts_in_other_sessions(self):
+        """Check in one query that no Part is also counted in another session of the group"""
+        parts = tuple({item.part for item in self.opname_items if item.part})
+        if not parts:
+            return
+        
+        query = """
+            SELECT item.part, opname.name, opname.zone
+            FROM `tabPart Stock Opname Item` item
+            INNER JOIN `tabPart Stock Opname` opname
+                ON opname.name = item.parent
+            WHERE opname.parent_opname = %(group)s
+                AND opname.docstatus < 2
+                AND item.part IN %(parts)s
+        """
+        params = {"group": self.parent_opname, "parts": parts}
+        
+        if not self.is_new():
+            query += " AND opname.name != %(name)s"
+            params["name"] = self.name
+        
+        conflicts = frappe.db.sql(query, params, as_dict=1)
+        if conflicts:
+            frappe.throw("<br>".join(
+                _("Part {0} is already counted in zone session {1} ({2})").format(
+                    row.part, row.name, row.zone or _("no zone"))
+                for row in conflicts
+            ))
+    
     def validate_items(self):
         """
         Validate items:
         - Check for duplicate parts
         - Ensure counted quantity is valid and > 0
         """
-        part_list = []
+        seen_parts = set()
         for i, item in enumerate(self.opname_items):
             # Check for duplicate parts
-            if item.part in part_list:
+            if item.part in seen_parts:
                 frappe.throw(_("Duplicate Part {0} at row {1}").format(item.part, i+1))
-            part_list.append(item.part)
+            seen_parts.add(item.part)
             
             # Ensure counted quantity is valid and > 0
             if flt(item.qty_counted) <= 0:
@@ -80,24 +280,36 @@ class PartStockOpname(Document):
         if self.status == "Adjusted":
             frappe.throw(_("Document cannot be cancelled as it has already been adjusted"))
     
-    def store_system_quantities(self):
+    def store_system_quantities(self, refresh=False):
         """
         Store system quantities as hidden cache for later comparison
-        when creating adjustment
+        when creating adjustment. Parts are snapshotted once, when they are
+        first saved on the document; pass refresh to snapshot all Parts again.
         """
-        system_quantities = {}
+        current = getattr(self, 'system_quantities_cache', None)
+        snapshot = SystemQuantitySnapshot() if refresh else SystemQuantitySnapshot.loads(current)
 
-        # Map parts to their corresponding item codes
+        # Map parts not yet in the snapshot to their item codes in one query
+        new_parts = list(dict.fromkeys(
+            item.part for item in self.opname_items if item.part and item.part not in snapshot
+        ))
         part_to_item_code = {}
-        for item in self.opname_items:
-            if not item.part:
-                continue
-            item_code = frappe.db.get_value("Part", item.part, "item_code")
-            if item_code:
-                part_to_item_code[item.part] = item_code
+        if new_parts:
+            item_codes = {
+                row.name: row.item_code
+                for row in frappe.get_all(
+                    "Part",
+                    filters={"name": ["in", new_parts]},
+                    fields=["name", "item_code"],
+                )
+                if row.item_code
+            }
+            # Keep the order of the rows in the snapshot
+            part_to_item_code = {part: item_codes[part] for part in new_parts if part in item_codes}
 
         if not part_to_item_code:
-            self.system_quantities_cache = json.dumps(system_quantities)
+            if not current or refresh:
+                self.system_quantities_cache = snapshot.dumps()
             return
 
         # Prefetch Bin records for all item codes
@@ -109,25 +321,18 @@ class PartStockOpname(Document):
         )
         bin_by_item_code = {b.item_code: b for b in bins}
 
-        # Populate system quantities using prefetched data
-        for item in self.opname_items:
-            part = item.part
-            if not part:
-                continue
-
-            item_code = part_to_item_code.get(part)
-            if not item_code:
-                continue
+        # Add new parts to the snapshot using prefetched data
+        for part, item_code in part_to_item_code.items():
             bin_data = bin_by_item_code.get(item_code)
+            snapshot.add(
+                part,
+                item_code,
+                bin_data.actual_qty if bin_data else 0,
+                bin_data.valuation_rate if bin_data else 0,
+            )
 
-            system_quantities[part] = {
-                "item_code": item_code,
-                "actual_qty": flt(bin_data.actual_qty) if bin_data else 0,
-                "valuation_rate": flt(bin_data.valuation_rate) if bin_data else 0,
-            }
-
-        # Store as JSON string in a hidden field
-        self.system_quantities_cache = json.dumps(system_quantities)
+        # Store as compact JSON string in a hidden field
+        self.system_quantities_cache = snapshot.dumps()
     
     def update_status(self):
         """Set document status based on docstatus"""
@@ -141,63 +346,14 @@ class PartStockOpname(Document):
     def create_stock_adjustment(self):
         """
         Create a Part Stock Adjustment document with the differences
-        between counted and actual quantities
+        between counted and actual quantities, merging all zone sessions
+        of a group
         """
-        if self.docstatus != 1:
-            frappe.throw(_("Stock Adjustment can only be created for submitted documents"))
-            
-        if self.status == "Adjusted":
-            frappe.throw(_("Stock Adjustment has already been created for this document"))
-        
-        # Retrieve system quantities from cache
-        if not hasattr(self, 'system_quantities_cache') or not self.system_quantities_cache:
-            frappe.throw(_("System quantities cache not found. Please refresh the document."))
-            
-        system_quantities = json.loads(self.system_quantities_cache)
-        
-        # Create Part Stock Adjustment
-        adjustment = frappe.new_doc("Part Stock Adjustment")
-        adjustment.posting_date = nowdate()
-        adjustment.posting_time = now_datetime().strftime('%H:%M:%S')
-        adjustment.warehouse = self.warehouse
-        adjustment.reference_doctype = self.doctype
-        adjustment.reference_docname = self.name
-        adjustment.remarks = _("Created from Stock Opname {0}").format(self.name)
-        
-        # Add items with differences
-        items_with_diff = 0
-        
-        for item in self.opname_items:
-            if not item.part or item.part not in system_quantities:
-                continue
-                
-            system_qty = system_quantities[item.part]["actual_qty"]
-            difference = flt(item.qty_counted) - system_qty
-            
-            # Only add items with differences
-            if difference != 0:
-                adjustment.append("items", {
-                    "part": item.part,
-                    "item_code": system_quantities[item.part]["item_code"],
-                    "system_qty": system_qty,
-                    "counted_qty": item.qty_counted,
-                    "difference_qty": difference,
-                    "uom": item.uom,
-                    "valuation_rate": system_quantities[item.part]["valuation_rate"],
-                    "adjustment_amount": difference * system_quantities[item.part]["valuation_rate"]
-                })
-                items_with_diff += 1
-        
-        if items_with_diff == 0:
-            frappe.msgprint(_("No differences found between counted and system quantities"))
-            return None
-        
-        adjustment.insert(ignore_permissions=True)
-        
-        # Update status to Adjusted
-        self.db_set('status', 'Adjusted')
-        
-        return adjustment
+        from car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment import (
+            make_adjustment_from_opname,
+        )
+
+        return make_adjustment_from_opname(self)
 
 @frappe.whitelist()
 def get_part_from_barcode(barcode):
@@ -210,49 +366,55 @@ def get_part_from_barcode(barcode):
     Returns:
         dict: Part details
     """
-    if not barcode:
-        return {}
+    from car_workshop.utils.barcode_index import get_part_by_barcode
+
+    return get_part_by_barcode(barcode)
+
+@frappe.whitelist()
+def get_parts_from_barcodes(barcodes):
+    """
+    Get parts for a batch of scanned barcodes
     
-    # Try to find the barcode in Item Barcode
-    barcode_data = frappe.db.get_value(
-        "Item Barcode",
-        {"barcode": barcode},
-        ["parent as item_code"],
-        as_dict=True
-    )
+    Args:
+        barcodes: List (or JSON list) of barcodes buffered by the scanner
+        
+    Returns:
+        dict: Part details keyed by barcode, empty for unknown barcodes
+    """
+    from car_workshop.utils.barcode_index import get_parts_by_barcodes
+
+    if isinstance(barcodes, str):
+        barcodes = frappe.parse_json(barcodes)
+
+    return get_parts_by_barcodes(barcodes or [])
+
+@frappe.whitelist()
+def make_zone_session(source_name, target_doc=None):
+    """
+    Create a new zone session for a Stock Opname split into zone sessions
     
-    if barcode_data and barcode_data.item_code:
-        # Find the part linked to this item
-        part_data = frappe.db.get_value(
-            "Part",
-            {"item": barcode_data.item_code},
-            ["name", "part_name", "uom"],
-            as_dict=True
-        )
+    Args:
+        source_name: Name of the zone session group
+        target_doc: Target document (unused)
         
-        if part_data:
-            return {
-                "part": part_data.name,
-                "part_name": part_data.part_name,
-                "uom": part_data.uom or "Pcs"
-            }
+    Returns:
+        Part Stock Opname: Unsaved zone session
+    """
+    group = frappe.get_doc("Part Stock Opname", source_name)
+    
+    if not group.is_group:
+        frappe.throw(_("Stock Opname {0} is not split into zone sessions").format(group.name))
     
-    # If not found in Item Barcode, try to find directly in Part
-    part_data = frappe.db.get_value(
-        "Part",
-        {"barcode": barcode},
-        ["name", "part_name", "uom"],
-        as_dict=True
-    )
+    if group.docstatus == 2 or group.status == "Adjusted":
+        frappe.throw(_("Stock Opname {0} is already closed").format(group.name))
     
-    if part_data:
-        return {
-            "part": part_data.name,
-            "part_name": part_data.part_name,
-            "uom": part_data.uom or "Pcs"
-        }
+    session = frappe.new_doc("Part Stock Opname")
+    session.parent_opname = group.name
+    session.warehouse = group.warehouse
+    session.posting_date = group.posting_date
+    session.posting_time = group.posting_time
     
-    return {}
+    return session
 
 @frappe.whitelist()
 def make_stock_adjustment(source_name, target_doc=None):
@@ -216,40 +216,19 @@ function validate_qty_against_work_order(frm, row) {
         return;
     }
     
-    // Get the Work Order
+    // Get the returnable balance of this item from the part movement ledger
     frappe.call({
-        method: 'frappe.client.get',
+        method: 'car_workshop.car_workshop.doctype.return_material.return_material.get_return_balance',
         args: {
-            doctype: 'Work Order',
-            name: frm.doc.work_order
+            work_order: frm.doc.work_order,
+            item_code: row.item_code,
+            work_order_item: row.work_order_item
         },
         callback: function(r) {
-            if (!r.message) return;
-            
-            let work_order = r.message;
-            let consumed_qty = 0;
-            let item_found = false;
-            
-            // Find the consumed qty for this item in work order
-            if (work_order.part_detail) {
-                for (let part of work_order.part_detail) {
-                    if ((row.work_order_item && part.name === row.work_order_item) || 
-                        (!row.work_order_item && part.item_code === row.item_code)) {
-                        consumed_qty = flt(part.consumed_qty);
-                        item_found = true;
-                        
-                        // Set work_order_item if not already set
-                        if (!row.work_order_item) {
-                            frappe.model.set_value(row.doctype, row.name, 'work_order_item', part.name);
-                        }
-                        
-                        break;
-                    }
-                }
-            }
+            let balance = r.message;
             
             // Check if this item was found in the work order
-            if (!item_found) {
+            if (!balance) {
                 const itemCode = frappe.utils.escape_html(row.item_code);
                 const workOrder = frappe.utils.escape_html(frm.doc.work_order || '');
                 frappe.show_alert({
@@ -259,63 +238,17 @@ function validate_qty_against_work_order(frm, row) {
                 return;
             }
             
-            // Get already returned qty from other returns
-            frappe.call({
-                method: 'frappe.client.get_list',
-                args: {
-                    doctype: 'Return Material',
-                    filters: {
-                        'work_order': frm.doc.work_order,
-                        'docstatus': 1,
-                        'name': ['!=', frm.docname || '']
-                    },
-                    fields: ['name']
-                },
-                callback: function(r) {
-                    if (!r.message) {
-                        check_qty(consumed_qty, 0);
-                        return;
-                    }
-                    
-                    // If other returns exist, get their quantities
-                    let promises = [];
-                    let already_returned = 0;
-                    
-                    r.message.forEach(ret => {
-                        promises.push(new Promise(resolve => {
-                            frappe.call({
-                                method: 'frappe.client.get',
-                                args: {
-                                    doctype: 'Return Material',
-                                    name: ret.name,
-                                    filters: {
-                                        'docstatus': 1
-                                    }
-                                },
-                                callback: function(r) {
-                                    if (r.message && r.message.items) {
-                                        r.message.items.forEach(item => {
-                                            if (item.item_code === row.item_code) {
-                                                already_returned += flt(item.qty);
-                                            }
-                                        });
-                                    }
-                                    resolve();
-                                }
-                            });
-                        }));
-                    });
-                    
-                    // When all return documents are processed
-                    Promise.all(promises).then(() => {
-                        check_qty(consumed_qty, already_returned);
-                    });
-                }
-            });
+            // Set work_order_item if not already set
+            if (!row.work_order_item) {
+                frappe.model.set_value(row.doctype, row.name, 'work_order_item', balance.work_order_item);
+            }
+            
+            // Consumed qty is already net of submitted returns
+            check_qty(flt(balance.consumed_qty));
             
             // Function to check qty and show alerts
-            function check_qty(consumed_qty, already_returned) {
-                let available_qty = Math.max(0, consumed_qty - already_returned);
+            function check_qty(consumed_qty) {
+                let available_qty = Math.max(0, consumed_qty);
                 
                 if (flt(row.qty) > available_qty) {
                     const qtyVal = frappe.utils.escape_html(String(row.qty));
@@ -23,10 +23,14 @@ class ReturnMaterial(Document):
     def on_submit(self):
         """
         On document submission:
+        - Record the return in the Work Order part movement ledger
         - Create Stock Entry for material return
-        - Update Work Order consumed quantities
         - Set document status
         """
+        from car_workshop.utils.part_movement_ledger import record_part_movements
+        
+        record_part_movements(self, "Return")
+        
         # Use background job if many items
         if len(self.items) > 10:
             enqueue(
@@ -48,10 +52,13 @@ class ReturnMaterial(Document):
         """
         On document cancellation:
         - Cancel the corresponding Stock Entry
-        - Revert Work Order consumed quantities
+        - Reverse the return in the Work Order part movement ledger
         - Set document status
         """
+        from car_workshop.utils.part_movement_ledger import record_part_movements
+        
         self.cancel_stock_entry_if_exists()
+        record_part_movements(self, "Return Cancellation")
         self.set_status()
     
     def validate_required_fields(self):
@@ -72,45 +79,34 @@ class ReturnMaterial(Document):
         """
         Validate that each item's quantity does not exceed what was issued in Work Order
         """
-        work_order = frappe.get_doc("Work Order", self.work_order)
-        
-        # Create a dictionary of consumed quantities from Work Order
+        # Issued quantities less submitted returns, from the part balance ledger
         consumed_qty_dict = {}
+        part_item_codes = {}
+        for row in get_return_balances(self.work_order):
+            consumed_qty_dict[row.item_code] = {
+                'consumed_qty': flt(row.consumed_qty),
+                'part': row.part,
+                'work_order_item': row.work_order_item
+            }
+            if row.part:
+                part_item_codes.setdefault(row.part, row.item_code)
         
-        # Process work order parts to get consumed quantities
-        for part in work_order.part_detail:
-            if hasattr(part, 'consumed_qty') and part.item_code:
-                consumed_qty_dict[part.item_code] = {
-                    'consumed_qty': flt(part.consumed_qty),
-                    'part': part.part if hasattr(part, 'part') else None,
-                    'work_order_item': part.name
-                }
-        
-        # Check if any other return material documents exist for the same work order
-        other_returns = frappe.get_all(
-            "Return Material",
-            filters={
-                "work_order": self.work_order,
-                "docstatus": 1,
-                "name": ["!=", self.name if not self.is_new() else ""]
-            },
-            fields=["name"]
-        )
-        
-        # If other returns exist, reduce the available quantities
-        if other_returns:
-            for return_doc_name in other_returns:
-                return_doc = frappe.get_doc("Return Material", return_doc_name.name)
-                for item in return_doc.items:
-                    if item.item_code in consumed_qty_dict:
-                        consumed_qty_dict[item.item_code]['consumed_qty'] -= flt(item.qty)
+        # Look up item codes of parts not found in the Work Order in one query
+        missing_parts = list({
+            item.part for item in self.items
+            if not item.item_code and item.part and item.part not in part_item_codes
+        })
+        if missing_parts:
+            from car_workshop.utils.part_snapshot import get_part_item_codes
+            
+            part_item_codes.update(get_part_item_codes(missing_parts))
         
         # Validate each item in this document
         for i, item in enumerate(self.items):
             if not item.item_code:
                 # Auto-fetch item_code from part if not set
                 if item.part:
-                    item_code = frappe.db.get_value("Part", item.part, "item_code")
+                    item_code = part_item_codes.get(item.part)
                     if not item_code:
                         frappe.throw(_("Part {0} at row {1} is not linked to any Item").format(
                             item.part, i+1))
@@ -223,9 +219,6 @@ class ReturnMaterial(Document):
             
             # Save the reference to Stock Entry
             self.db_set("stock_entry", stock_entry.name)
-            
-            # Update Work Order consumed quantities
-            self.update_work_order_consumed_qty()
 
             frappe.msgprint(_("Stock Entry {0} created and submitted").format(
                 frappe.get_desk_link("Stock Entry", stock_entry.name)))
@@ -238,29 +231,6 @@ class ReturnMaterial(Document):
             )
             frappe.throw(_("Error creating Stock Entry: {0}").format(str(e)))
     
-    def update_work_order_consumed_qty(self):
-        """Update consumed quantities in Work Order"""
-        if not self.work_order:
-            return
-        
-        work_order = frappe.get_doc("Work Order", self.work_order)
-        updated = False
-        
-        for item in self.items:
-            # Find the matching work order item
-            for wo_item in work_order.part_detail:
-                if (item.work_order_item and wo_item.name == item.work_order_item) or \
-                   (not item.work_order_item and wo_item.item_code == item.item_code):
-                    # Reduce consumed quantity by returned quantity
-                    wo_item.consumed_qty = max(0, flt(wo_item.consumed_qty) - flt(item.qty))
-                    updated = True
-                    break
-        
-        if updated:
-            # Save the work order with updated consumed quantities
-            work_order.flags.ignore_validate_update_after_submit = True
-            work_order.save()
-    
     def cancel_stock_entry_if_exists(self):
         """Cancel the corresponding Stock Entry if it exists"""
         stock_entry_name = self.stock_entry or frappe.db.get_value(
@@ -280,36 +250,71 @@ class ReturnMaterial(Document):
                     stock_entry.cancel()
                     frappe.msgprint(_("Stock Entry {0} cancelled").format(
                         frappe.get_desk_link("Stock Entry", stock_entry_name)))
-                    
-                    # Restore Work Order consumed quantities
-                    self.restore_work_order_consumed_qty()
             except Exception as e:
                 frappe.log_error(_("Error cancelling Stock Entry {0} for Return Material {1}: {2}").format(
                     stock_entry_name, self.name, str(e)), "Return Material Error")
                 frappe.throw(_("Error cancelling Stock Entry: {0}").format(str(e)))
+
+
+def get_return_balances(work_order):
+    """
+    Consumed and returned quantity of every part of a Work Order, read from
+    the Work Order Part Balance rows kept by the part movement ledger
     
-    def restore_work_order_consumed_qty(self):
-        """Restore consumed quantities in Work Order when return is cancelled"""
-        if not self.work_order:
-            return
-        
-        work_order = frappe.get_doc("Work Order", self.work_order)
-        updated = False
+    Args:
+        work_order: Work Order name
         
-        for item in self.items:
-            # Find the matching work order item
-            for wo_item in work_order.part_detail:
-                if (item.work_order_item and wo_item.name == item.work_order_item) or \
-                   (not item.work_order_item and wo_item.item_code == item.item_code):
-                    # Add back the returned quantity to consumed_qty
-                    wo_item.consumed_qty = flt(wo_item.consumed_qty) + flt(item.qty)
-                    updated = True
-                    break
+    Returns:
+        list: Rows with work_order_item, part, item_code, rate, consumed_qty
+        (issued less returned) and returned_qty, in Work Order order
+    """
+    if not work_order:
+        return []
+    
+    return frappe.db.sql("""
+        SELECT
+            wop.name AS work_order_item,
+            wop.part,
+            wop.item_code,
+            wop.rate,
+            IFNULL(bal.issued_qty, 0) - IFNULL(bal.returned_qty, 0) AS consumed_qty,
+            IFNULL(bal.returned_qty, 0) AS returned_qty
+        FROM `tabWork Order Part` wop
+        LEFT JOIN `tabWork Order Part Balance` bal
+            ON bal.work_order = wop.parent AND bal.item_code = wop.item_code
+        WHERE wop.parent = %(work_order)s
+            AND wop.parenttype = 'Work Order'
+            AND IFNULL(wop.item_code, '') != ''
+        ORDER BY wop.idx
+    """, {"work_order": work_order}, as_dict=1)
+
+
+@frappe.whitelist()
+def get_return_balance(work_order, item_code, work_order_item=None):
+    """
+    Get the returnable quantity of one Work Order item
+    
+    Args:
+        work_order: Work Order name
+        item_code: Item being returned
+        work_order_item: Work Order Part row, if already known
         
-        if updated:
-            # Save the work order with restored consumed quantities
-            work_order.flags.ignore_validate_update_after_submit = True
-            work_order.save()
+    Returns:
+        dict: work_order_item, consumed_qty and returned_qty, or None if the
+        item is not on the Work Order
+    """
+    frappe.has_permission("Work Order", "read", work_order, throw=True)
+
+    for row in get_return_balances(work_order):
+        if (work_order_item and row.work_order_item == work_order_item) or \
+           (not work_order_item and row.item_code == item_code):
+            return {
+                "work_order_item": row.work_order_item,
+                "consumed_qty": flt(row.consumed_qty),
+                "returned_qty": flt(row.returned_qty),
+            }
+    
+    return None
 
 
 @frappe.whitelist()
@@ -326,44 +331,35 @@ def get_returnable_items(work_order):
     if not work_order:
         return []
     
-    work_order_doc = frappe.get_doc("Work Order", work_order)
+    # Get all parts with consumed quantities not fully returned yet
+    balances = [
+        row for row in get_return_balances(work_order)
+        if flt(row.consumed_qty) > 0
+    ]
+    if not balances:
+        return []
+    
+    # Get item details for all parts at once
+    item_details_map = {
+        item.name: item
+        for item in frappe.get_all("Item",
+            filters={"name": ["in", list({row.item_code for row in balances})]},
+            fields=["name", "item_name", "stock_uom", "valuation_rate"]
+        )
+    }
     
-    # Get all parts with consumed quantities
     returnable_items = []
     
-    for part in work_order_doc.part_detail:
-        if not hasattr(part, 'consumed_qty') or flt(part.consumed_qty) <= 0:
-            continue
-        
-        # Check if this item has already been fully returned
-        existing_returns = frappe.db.sql("""
-            SELECT SUM(rmi.qty) as total_returned
-            FROM `tabReturn Material Item` rmi
-            INNER JOIN `tabReturn Material` rm ON rmi.parent = rm.name
-            WHERE rm.work_order = %s
-            AND rm.docstatus = 1
-            AND rmi.item_code = %s
-        """, (work_order, part.item_code), as_dict=1)
-        
-        total_returned = flt(existing_returns[0].total_returned) if existing_returns else 0
-        available_to_return = max(0, flt(part.consumed_qty) - total_returned)
-        
-        if available_to_return <= 0:
-            continue
-        
-        # Get item details
-        item_details = frappe.db.get_value("Item", part.item_code, 
-            ["item_name", "stock_uom", "valuation_rate"], as_dict=1)
+    for part in balances:
+        total_returned = flt(part.returned_qty)
+        available_to_return = flt(part.consumed_qty)
         
+        item_details = item_details_map.get(part.item_code)
         if not item_details:
             continue
         
-        # Get part if available
-        part_name = part.part if hasattr(part, 'part') else frappe.db.get_value(
-            "Part", {"item": part.item_code}, "name")
-        
         returnable_items.append({
-            "part": part_name,
+            "part": part.part,
             "item_code": part.item_code,
             "item_name": item_details.item_name,
             "qty": available_to_return,
@@ -372,7 +368,7 @@ def get_returnable_items(work_order):
             "uom": item_details.stock_uom,
             "valuation_rate": item_details.valuation_rate or part.rate,
             "amount": (item_details.valuation_rate or part.rate) * available_to_return,
-            "work_order_item": part.name
+            "work_order_item": part.work_order_item
         })
     
-    return returnable_items
\ No newline at end of file
+    return returnable_items
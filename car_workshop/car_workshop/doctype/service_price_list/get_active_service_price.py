@@ -8,6 +8,8 @@ import frappe
 from frappe import _
 from frappe.utils import getdate, flt, nowdate
 
+from car_workshop.utils.price_cache import cached_price
+
 
 @frappe.whitelist()
 def get_active_service_price(
@@ -37,7 +39,20 @@ def get_active_service_price(
     # Set default posting date if not provided
     if not posting_date:
         posting_date = nowdate()
-    
+
+    return cached_price(
+        "active_service_price", reference_type, reference_name, price_list, posting_date,
+        lambda: _get_active_service_price(reference_type, reference_name, price_list, posting_date)
+    )
+
+
+def _get_active_service_price(
+    reference_type: str,
+    reference_name: str,
+    price_list: str,
+    posting_date: str
+) -> Dict[str, Any]:
+    """Uncached lookup behind get_active_service_price"""
     # For Part type, first try to get Item Price
     if reference_type == "Part":
         item_price_data = get_item_price_for_part(reference_name, price_list, posting_date)
@@ -75,6 +90,18 @@ def get_item_price_for_part(
     Returns:
         Optional[Dict]: Dictionary with price details or None if not found
     """
+    return cached_price(
+        "item_price", "Part", part_name, price_list, posting_date,
+        lambda: _get_item_price_for_part(part_name, price_list, posting_date)
+    )
+
+
+def _get_item_price_for_part(
+    part_name: str,
+    price_list: str,
+    posting_date: str
+) -> Optional[Dict[str, Any]]:
+    """Uncached lookup behind get_item_price_for_part"""
     # Get the Item code for the Part
     item_code = frappe.db.get_value("Part", part_name, "item")
     
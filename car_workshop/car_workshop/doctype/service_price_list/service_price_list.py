@@ -9,6 +9,8 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import getdate, nowdate, flt
 
+from car_workshop.utils.price_cache import cached_price
+
 
 class ServicePriceList(Document):
     def validate(self):
@@ -112,6 +114,9 @@ class ServicePriceList(Document):
                 _("Deactivated conflicting price entry: {0}").format(entry.name),
                 alert=True
             )
+
+        # db.set_value bypasses doc_events; the on_update hook of this entry
+        # drops cached prices of the same reference once the save commits
     
     def on_trash(self) -> None:
         """Check if this is the only active price for the reference"""
@@ -164,7 +169,20 @@ class ServicePriceList(Document):
         # Convert to string date if it's a date object
         if isinstance(posting_date, date):
             posting_date = posting_date.strftime("%Y-%m-%d")
-            
+
+        return cached_price(
+            "active_rate", reference_type, reference_name, price_list, posting_date,
+            lambda: cls._get_active_rate(reference_type, reference_name, price_list, posting_date)
+        )
+
+    @staticmethod
+    def _get_active_rate(
+        reference_type: str,
+        reference_name: str,
+        price_list: str,
+        posting_date: str
+    ) -> Optional[Dict[str, Any]]:
+        """Uncached lookup behind get_active_rate"""
         # Get the latest active price for the given date
         price_record = frappe.db.sql(
             """
@@ -1,15 +1,22 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.model.naming import make_autoname
-from frappe.utils import flt
+from frappe.utils import cint, flt
 from frappe.model.mapper import get_mapped_doc
 
 
 class WorkOrder(Document):
     def autoname(self):
-        # Set document name with format "WO-.YYYY.-.####"
-        self.name = make_autoname("WO-.YYYY.-.####")
+        # Set document name with format "WO-.YYYY.-.####"; site config may
+        # widen the counter and hand out numbers from preallocated blocks
+        from car_workshop.utils.series_allocator import make_series_name
+        
+        self.name = make_series_name(
+            "Work Order",
+            "WO-.YYYY.-.",
+            digits=cint(frappe.conf.get("work_order_series_digits")) or 4,
+            block_size=cint(frappe.conf.get("work_order_series_block_size")),
+        )
     
     def validate(self):
         # Validate purchase orders for parts with "Beli Baru" source
@@ -20,6 +27,12 @@ class WorkOrder(Document):
         
         # Calculate total amount
         self.calculate_total_amount()
+        
+        # Refresh the aggregates read by the work order board
+        self.update_board_summary()
+        
+        # Consumed quantities are owned by the part movement ledger
+        self.update_consumed_qty()
     
     def validate_part_purchase_orders(self):
         """Validate purchase orders for parts with 'Beli Baru' source"""
@@ -45,21 +58,51 @@ class WorkOrder(Document):
     
     def calculate_total_amount(self):
         """Calculate total amount of the work order"""
-        total = 0
+        self.total_parts_amount = self.calculate_part_total()
+        self.total_labor_amount = self.calculate_job_type_total()
+        self.total_package_amount = self.calculate_service_package_total()
+        self.total_external_amount = self.calculate_expense_total()
         
-        # Sum part amounts
-        total += self.calculate_part_total()
+        self.total_amount = (
+            self.total_parts_amount
+            + self.total_labor_amount
+            + self.total_package_amount
+            + self.total_external_amount
+        )
+    
+    def update_board_summary(self):
+        """
+        Set the row counts, lines without a purchase order and required part
+        quantity, so the work order board reads them without loading child rows
+        """
+        parts = self.part_detail or []
+        job_types = self.job_type_detail or []
+        expenses = self.external_expense or []
         
-        # Sum job type prices
-        total += self.calculate_job_type_total()
+        self.part_count = len(parts)
+        self.job_type_count = len(job_types)
+        self.service_package_count = len(self.service_package_detail or [])
+        self.expense_count = len(expenses)
+        self.required_part_qty = sum(flt(part.quantity) for part in parts)
         
-        # Sum service package total prices
-        total += self.calculate_service_package_total()
+        # Same rows the purchase order picker offers
+        self.lines_without_po = (
+            sum(1 for part in parts if not part.purchase_order)
+            + sum(1 for job in job_types if job.is_opl and not job.purchase_order)
+            + sum(1 for expense in expenses if not expense.purchase_order)
+        )
+    
+    def update_consumed_qty(self):
+        """Set consumed quantities from the ledger so a stale form cannot overwrite them"""
+        if self.is_new() or not self.part_detail:
+            return
         
-        # Sum expense amounts
-        total += self.calculate_expense_total()
+        from car_workshop.utils.part_movement_ledger import get_part_balances
         
-        self.total_amount = total
+        balances = get_part_balances(self.name, [part.item_code for part in self.part_detail])
+        for part in self.part_detail:
+            balance = balances.get(part.item_code)
+            part.consumed_qty = balance.consumed_qty if balance else 0
     
     def calculate_part_total(self):
         """Calculate total amount for parts"""
@@ -195,12 +238,28 @@ def make_material_issue(source_name, target_doc=None):
     Returns:
         Workshop Material Issue doc
     """
+    from car_workshop.utils.employee_cache import get_user_employee
+    
+    # Get the source document
+    doc = frappe.get_doc("Work Order", source_name)
+    
+    # Issue from the Work Order's warehouse, else the default stock warehouse
+    warehouse = doc.set_warehouse or frappe.db.get_single_value("Stock Settings", "default_warehouse")
+    
+    # Valuation rates of all parts in one query instead of one Bin per row
+    valuation_rates = get_bin_valuation_rates(
+        [part.item_code for part in doc.part_detail or []],
+        warehouse,
+    )
+    
     def set_missing_values(source, target):
         # Set default values if missing
         target.posting_date = frappe.utils.getdate()
+        if not target.set_warehouse:
+            target.set_warehouse = warehouse
         
         # Set issued_by as the current user's Employee record if exists
-        employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
+        employee = get_user_employee()
         if employee:
             target.issued_by = employee
             
@@ -209,19 +268,9 @@ def make_material_issue(source_name, target_doc=None):
         
     def update_item(source_obj, target_obj, source_parent):
         # Set valuation rate and amount based on warehouse stock
-        bin_data = frappe.db.get_value(
-            "Bin",
-            {"item_code": source_obj.item_code, "warehouse": source_parent.set_warehouse},
-            ["valuation_rate"],
-            as_dict=1,
-        ) or {"valuation_rate": 0}
-
-        target_obj.rate = bin_data.valuation_rate
+        target_obj.rate = valuation_rates.get(source_obj.item_code, 0)
         target_obj.amount = flt(target_obj.qty) * flt(target_obj.rate)
     
-    # Get the source document
-    doc = frappe.get_doc("Work Order", source_name)
-    
     # Create the target document using mapped doc
     target_doc = get_mapped_doc("Work Order", source_name, {
         "Work Order": {
@@ -247,6 +296,30 @@ def make_material_issue(source_name, target_doc=None):
 
     return target_doc
 
+def get_bin_valuation_rates(item_codes, warehouse):
+    """
+    Get the valuation rate of many items in a warehouse with one query
+    
+    Args:
+        item_codes: Item codes
+        warehouse: Warehouse of the Bins
+        
+    Returns:
+        dict: Mapping of item code to valuation rate, for items with a Bin
+    """
+    item_codes = list({item_code for item_code in item_codes if item_code})
+    if not item_codes or not warehouse:
+        return {}
+    
+    return {
+        row.item_code: flt(row.valuation_rate)
+        for row in frappe.get_all(
+            "Bin",
+            filters={"item_code": ["in", item_codes], "warehouse": warehouse},
+            fields=["item_code", "valuation_rate"],
+        )
+    }
+
 # Add the following function to the existing work_order.py file
 
 @frappe.whitelist()
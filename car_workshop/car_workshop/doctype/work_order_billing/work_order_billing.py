@@ -8,6 +8,24 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import flt, getdate, nowdate, add_days, get_datetime
 
+from car_workshop.utils.tax_template_cache import get_template_taxes
+
+
+# Child table -> field multiplied by rate to get the row amount (None: amount = rate)
+BILLING_AMOUNT_QTY_FIELDS = {
+    "job_type_items": "hours",
+    "service_package_items": "quantity",
+    "part_items": "quantity",
+    "external_service_items": None,
+}
+
+# Total field -> child tables summed into it
+BILLING_TOTAL_FIELDS = {
+    "total_services_amount": ("job_type_items", "service_package_items"),
+    "total_parts_amount": ("part_items",),
+    "total_external_services_amount": ("external_service_items",),
+}
+
 
 class WorkOrderBilling(Document):
     def validate(self):
@@ -119,39 +137,21 @@ class WorkOrderBilling(Document):
         Calculate and update all total fields for the document.
         This serves as a preview - final calculations will be done in Sales Invoice.
         """
-        # Calculate job type items total
-        self.total_services_amount = 0
-        for item in self.job_type_items:
-            item.amount = flt(item.hours) * flt(item.rate)
-            self.total_services_amount += flt(item.amount)
-            
-        # Calculate service package items total
-        for item in self.service_package_items:
-            item.amount = flt(item.quantity) * flt(item.rate)
-            self.total_services_amount += flt(item.amount)
-            
-        # Calculate part items total
-        self.total_parts_amount = 0
-        for item in self.part_items:
-            item.amount = flt(item.quantity) * flt(item.rate)
-            self.total_parts_amount += flt(item.amount)
-            
-        # Calculate external service items total
-        self.total_external_services_amount = 0
-        for item in self.external_service_items:
-            item.amount = flt(item.rate)
-            self.total_external_services_amount += flt(item.amount)
+        # Recalculate row amounts and subtotals
+        for total_field, tables in BILLING_TOTAL_FIELDS.items():
+            total = 0
+            for table in tables:
+                qty_field = BILLING_AMOUNT_QTY_FIELDS[table]
+                for item in self.get(table) or []:
+                    item.amount = flt(item.get(qty_field)) * flt(item.rate) if qty_field else flt(item.rate)
+                    total += flt(item.amount)
+            self.set(total_field, total)
             
         # Calculate subtotal
         self.subtotal = flt(self.total_services_amount) + flt(self.total_parts_amount) + flt(self.total_external_services_amount)
         
         # Calculate tax amount - preview only, final tax calculated in SI
-        self.tax_amount = 0
-        if self.taxes_and_charges:
-            tax_template = frappe.get_doc("Sales Taxes and Charges Template", self.taxes_and_charges)
-            for tax in tax_template.taxes:
-                if tax.charge_type == "On Net Total":
-                    self.tax_amount += flt(self.subtotal) * flt(tax.rate) / 100
+        self.tax_amount = self.calculate_tax_preview()
                     
         # Calculate grand total
         self.grand_total = flt(self.subtotal) + flt(self.tax_amount) - flt(self.discount_amount)
@@ -160,14 +160,28 @@ class WorkOrderBilling(Document):
         self.rounded_total_preview = round(self.grand_total)
         
         # Calculate payment amount total (for preview)
-        self.payment_amount = 0
-        for payment in self.payment_details:
-            self.payment_amount += flt(payment.amount)
+        self.payment_amount = sum(flt(payment.amount) for payment in self.payment_details or [])
 
         # Preview of down payment and balance
         down_payment = self.get_down_payment_amount()
         self.remaining_balance = flt(self.grand_total) - down_payment
         self.balance_amount = flt(self.remaining_balance) - flt(self.payment_amount)
+
+    def calculate_tax_preview(self) -> float:
+        """
+        Preview tax on the subtotal using the cached Sales Taxes and Charges Template
+        
+        Returns:
+            float: Tax amount for "On Net Total" rows of the template
+        """
+        if not self.taxes_and_charges:
+            return 0
+
+        tax_amount = 0
+        for tax in get_template_taxes("Sales Taxes and Charges Template", self.taxes_and_charges):
+            if tax.charge_type == "On Net Total":
+                tax_amount += flt(self.subtotal) * flt(tax.rate) / 100
+        return tax_amount
     
     def get_down_payment_amount(self) -> float:
         """
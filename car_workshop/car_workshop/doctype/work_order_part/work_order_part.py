@@ -17,11 +17,20 @@ class WorkOrderPart(Document):
     def fetch_part_details(self):
         """Fetch missing values from Part doctype"""
         if self.part:
-            part_fields = ["part_number", "part_name", "item_code", "brand", "category"]
-            part_doc = frappe.get_doc("Part", self.part)
+            from car_workshop.utils.part_snapshot import get_part_snapshot, get_part_snapshots
+            
+            # Load the snapshots of every row of the Work Order in one query
+            parent_doc = getattr(self, "parent_doc", None)
+            if parent_doc:
+                get_part_snapshots(row.part for row in parent_doc.get("part_detail") or [])
             
+            part_doc = get_part_snapshot(self.part)
+            if not part_doc:
+                return
+            
+            part_fields = ["part_number", "part_name", "item_code", "brand", "category"]
             for field in part_fields:
-                if not self.get(field) and hasattr(part_doc, field):
+                if not self.get(field) and part_doc.get(field):
                     self.set(field, part_doc.get(field))
             
             # Set rate from Part's current_price if not already set
@@ -0,0 +1 @@
+# This file is needed for Python to recognize this directory as a package
\ No newline at end of file
@@ -0,0 +1,9 @@
+# Copyright (c) 2025, Danny Audian and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class WorkOrderPartBalance(Document):
+    # Maintained incrementally by car_workshop.utils.part_movement_ledger
+    pass
@@ -0,0 +1,20 @@
+# Copyright (c) 2025, Danny Audian and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class WorkOrderPartMovement(Document):
+    # Rows are written in bulk by car_workshop.utils.part_movement_ledger
+    pass
+
+
+def on_doctype_update():
+    # A voucher row is recorded once per movement type; the ledger relies on
+    # this key to reject retried or concurrent writes
+    frappe.db.add_unique(
+        "Work Order Part Movement",
+        ["voucher_type", "voucher_no", "movement_type", "voucher_detail_no"],
+        constraint_name="unique_voucher_movement",
+    )
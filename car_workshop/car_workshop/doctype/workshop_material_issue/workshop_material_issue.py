@@ -19,10 +19,11 @@ class WorkshopMaterialIssue(Document):
         """
         self.validate_mandatory_fields()
         self.validate_warehouse()
-        self.validate_items()
+        stock_details = self.get_stock_details()
+        self.validate_items(stock_details)
         self.check_duplicate_parts()
         self.check_for_duplicates()
-        self.validate_stock_availability()
+        self.validate_stock_availability(stock_details)
         self.calculate_totals()
     
     def on_submit(self):
@@ -163,8 +164,55 @@ class WorkshopMaterialIssue(Document):
             frappe.throw(_("Source Warehouse {0} belongs to company {1}, but the current company is {2}").format(
                 self.set_warehouse, warehouse_details.company, company))
     
-    def validate_items(self):
+    def get_stock_details(self):
+        """
+        Prefetch Part, Item and Bin details for the whole items table
+        so validation runs a fixed number of queries regardless of row count
+
+        Returns:
+            dict: Lookups keyed as parts (by Part), items (by Item Code)
+            and bins (by Item Code, for the source warehouse)
+        """
+        stock_details = {"parts": {}, "items": {}, "bins": {}}
+
+        # Parts whose item_code or description still needs to be fetched
+        parts = list({
+            item.part for item in self.items
+            if item.part and (not item.item_code or not item.description)
+        })
+        if parts:
+            from car_workshop.utils.part_snapshot import get_part_snapshots
+
+            stock_details["parts"] = get_part_snapshots(parts)
+
+        item_codes = {item.item_code for item in self.items if item.item_code}
+        item_codes.update(part.item_code for part in stock_details["parts"].values() if part.item_code)
+        if not item_codes:
+            return stock_details
+
+        item_codes = list(item_codes)
+        for item_detail in frappe.get_all(
+            "Item",
+            filters={"name": ["in", item_codes]},
+            fields=["name", "is_stock_item", "disabled", "stock_uom", "valuation_rate"],
+        ):
+            stock_details["items"][item_detail.name] = item_detail
+
+        if self.set_warehouse:
+            for bin_data in frappe.get_all(
+                "Bin",
+                filters={"item_code": ["in", item_codes], "warehouse": self.set_warehouse},
+                fields=["item_code", "actual_qty", "reserved_qty", "valuation_rate"],
+            ):
+                stock_details["bins"][bin_data.item_code] = bin_data
+
+        return stock_details
+
+    def validate_items(self, stock_details=None):
         """Validate items table and auto-populate details from Part"""
+        if stock_details is None:
+            stock_details = self.get_stock_details()
+
         for i, item in enumerate(self.items):
             if not item.part:
                 frappe.throw(_("Part is mandatory at row {0}").format(i+1))
@@ -176,21 +224,20 @@ class WorkshopMaterialIssue(Document):
             
             # Auto-fetch item_code and description from Part if not already set
             if not item.item_code or not item.description:
-                part_details = frappe.db.get_value("Part", item.part, ["item", "description"], as_dict=1)
+                part_details = stock_details["parts"].get(item.part)
                 
                 if not part_details:
                     frappe.throw(_("Part {0} does not exist").format(item.part))
                 
-                if not part_details.item:
+                if not part_details.item_code:
                     frappe.throw(_("Part {0} is not linked to any Item. Please link an Item to this Part first.").format(
                         item.part))
                 
-                item.item_code = part_details.item
+                item.item_code = part_details.item_code
                 item.description = part_details.description
             
             # Validate the Item exists and is a stock item
-            item_details = frappe.db.get_value("Item", 
-                item.item_code, ["is_stock_item", "disabled"], as_dict=1)
+            item_details = stock_details["items"].get(item.item_code)
             
             if not item_details:
                 frappe.throw(_("Item Code {0} for Part {1} does not exist").format(
@@ -206,10 +253,10 @@ class WorkshopMaterialIssue(Document):
             
             # Get UOM if not set
             if not item.uom and item.item_code:
-                item.uom = frappe.db.get_value("Item", item.item_code, "stock_uom")
+                item.uom = item_details.stock_uom
             
             # Calculate rate and amount
-            valuation_rate = self.get_item_valuation_rate(item.item_code)
+            valuation_rate = self.get_item_valuation_rate(item.item_code, stock_details)
             item.rate = valuation_rate
             item.amount = flt(item.qty) * flt(item.rate)
     
@@ -222,66 +269,92 @@ class WorkshopMaterialIssue(Document):
                     item.part, i+1))
             parts.append(item.part)
     
-    def get_item_valuation_rate(self, item_code):
+    def get_item_valuation_rate(self, item_code, stock_details=None):
         """Get valuation rate for an item from the specified warehouse"""
         if not item_code or not self.set_warehouse:
             return 0
         
-        bin_data = frappe.db.get_value("Bin", 
-            {"item_code": item_code, "warehouse": self.set_warehouse},
-            "valuation_rate",
-            as_dict=1)
+        if stock_details is not None:
+            bin_data = stock_details["bins"].get(item_code)
+        else:
+            bin_data = frappe.db.get_value("Bin", 
+                {"item_code": item_code, "warehouse": self.set_warehouse},
+                "valuation_rate",
+                as_dict=1)
         
         if bin_data and bin_data.valuation_rate:
             return flt(bin_data.valuation_rate)
         
         # Fall back to item's valuation rate if bin doesn't exist
+        if stock_details is not None:
+            item_details = stock_details["items"].get(item_code)
+            return flt(item_details.valuation_rate) if item_details else 0
         return frappe.db.get_value("Item", item_code, "valuation_rate") or 0
     
     def check_for_duplicates(self):
-        """Check for duplicate issues for the same Part in the same Work Order."""
-        for item in self.items:
-            query = """
-                SELECT wmi.name, wmi.docstatus
-                FROM `tabWorkshop Material Issue` wmi
-                INNER JOIN `tabWorkshop Material Issue Item` wmii
-                    ON wmii.parent = wmi.name
-                WHERE wmii.part = %s
-                    AND wmi.work_order = %s
-                    AND wmi.docstatus < 2
-            """
-            params = [item.part, self.work_order]
+        """
+        Check for other issues of the same Parts in the same Work Order.
+        All conflicting Parts are looked up in one query and reported together.
+        """
+        parts = tuple({item.part for item in self.items if item.part})
+        if not parts:
+            return
+
+        query = """
+            SELECT wmii.part, wmi.name, wmi.docstatus
+            FROM `tabWorkshop Material Issue` wmi
+            INNER JOIN `tabWorkshop Material Issue Item` wmii
+                ON wmii.parent = wmi.name
+            WHERE wmii.part IN %(parts)s
+                AND wmi.work_order = %(work_order)s
+                AND wmi.docstatus < 2
+        """
+        params = {"parts": parts, "work_order": self.work_order}
 
-            if not self.is_new():
-                query += " AND wmi.name != %s"
-                params.append(self.name)
+        if not self.is_new():
+            query += " AND wmi.name != %(name)s"
+            params["name"] = self.name
 
-            existing_issues = frappe.db.sql(query, params, as_dict=1)
+        query += " ORDER BY wmi.docstatus DESC, wmi.creation"
 
-            if existing_issues:
-                duplicate = existing_issues[0]
-                if duplicate.docstatus == 1:
-                    frappe.throw(
-                        _(
-                            "Part {0} has already been issued for Work Order {1} in Material Issue {2}"
-                        ).format(item.part, self.work_order, duplicate.name)
-                    )
-                else:
-                    frappe.throw(
-                        _(
-                            "Part {0} already exists in draft Material Issue {1} for Work Order {2}"
-                        ).format(item.part, duplicate.name, self.work_order)
-                    )
+        # Report the first conflicting issue per Part, submitted issues first
+        conflicts = {}
+        for row in frappe.db.sql(query, params, as_dict=1):
+            conflicts.setdefault(row.part, row)
+
+        if not conflicts:
+            return
+
+        messages = []
+        for item in self.items:
+            duplicate = conflicts.pop(item.part, None)
+            if not duplicate:
+                continue
+
+            if duplicate.docstatus == 1:
+                messages.append(
+                    _(
+                        "Part {0} has already been issued for Work Order {1} in Material Issue {2}"
+                    ).format(item.part, self.work_order, duplicate.name)
+                )
+            else:
+                messages.append(
+                    _(
+                        "Part {0} already exists in draft Material Issue {1} for Work Order {2}"
+                    ).format(item.part, duplicate.name, self.work_order)
+                )
+
+        frappe.throw("<br>".join(messages))
     
-    def validate_stock_availability(self):
+    def validate_stock_availability(self, stock_details=None):
         """Check if there is enough stock for all items in the set warehouse"""
+        if stock_details is None:
+            stock_details = self.get_stock_details()
+
         for item in self.items:
-            bin_data = frappe.db.get_value("Bin", 
-                {"item_code": item.item_code, "warehouse": self.set_warehouse},
-                ["actual_qty", "reserved_qty"],
-                as_dict=1) or {"actual_qty": 0, "reserved_qty": 0}
+            bin_data = stock_details["bins"].get(item.item_code)
             
-            available_qty = flt(bin_data.actual_qty) - flt(bin_data.reserved_qty)
+            available_qty = flt(bin_data.actual_qty) - flt(bin_data.reserved_qty) if bin_data else 0
             
             if flt(item.qty) > available_qty:
                 frappe.throw(_("Insufficient stock for Part {0} (Item {1}) in {2}. Required: {3}, Available: {4}").format(
@@ -354,75 +427,32 @@ class WorkshopMaterialIssue(Document):
     
     def update_work_order(self, cancel=False):
         """
-        Update consumed qty in Work Order
-        If cancel=True, reduce the consumed quantities
+        Record the issued quantities in the Work Order part movement ledger
+        If cancel=True, record the reversal instead
         """
         if not self.work_order:
             return
         
+        from car_workshop.utils.part_movement_ledger import get_part_balances, record_part_movements
+        
         try:
-            work_order = frappe.get_doc("Work Order", self.work_order)
+            changes = record_part_movements(self, "Issue Cancellation" if cancel else "Issue")
+            if not changes:
+                return
             
-            # Track changes for logging
-            changes_made = False
-            updated_items = {}
-
-            for item in self.items:
-                # Find all matching parts in the Work Order
-                for wo_item in work_order.part_detail:
-                    if wo_item.item_code == item.item_code:
-                        previous_qty = flt(getattr(wo_item, "consumed_qty", 0))
-
-                        if cancel:
-                            # Ensure we don't go below zero
-                            wo_item.consumed_qty = max(0, previous_qty - flt(item.qty))
-                        else:
-                            wo_item.consumed_qty = previous_qty + flt(item.qty)
-
-                        # Track if any change was made
-                        if previous_qty != wo_item.consumed_qty:
-                            changes_made = True
-                            if wo_item.item_code not in updated_items:
-                                updated_items[wo_item.item_code] = {
-                                    "item_code": wo_item.item_code,
-                                    "previous_qty": 0,
-                                    "new_qty": 0,
-                                }
-
-                            updated_items[wo_item.item_code]["previous_qty"] += previous_qty
-                            updated_items[wo_item.item_code]["new_qty"] += wo_item.consumed_qty
-
-            # Only update if changes were made
-            if changes_made:
-                # Update Work Order
-                work_order.flags.ignore_validate_update_after_submit = True
-                
-                # Call calculate_total_consumed_qty if it exists
-                if hasattr(work_order, 'calculate_total_consumed_qty'):
-                    work_order.calculate_total_consumed_qty()
-                
-                # Save the changes
-                work_order.save()
-                
-                # Add a comment in the Work Order for audit trail
-                operation = "decreased" if cancel else "increased"
-                comment_text = f"Material consumption {operation} due to {'cancellation of' if cancel else ''} Material Issue: {self.name}"
-                work_order.add_comment('Comment', text=comment_text)
-                
-                # Update Work Order status if the method exists
-                if hasattr(work_order, 'update_status'):
-                    work_order.update_status()
-                
-                # Log the update with details
-                item_details = ", ".join([
-                    f"{item['item_code']}: {item['previous_qty']} → {item['new_qty']}"
-                    for item in updated_items.values()
-                ])
-                
-                frappe.msgprint(_("Consumed quantities updated in Work Order {0}. Items: {1}").format(
-                    frappe.get_desk_link("Work Order", self.work_order),
-                    item_details
-                ))
+            balances = get_part_balances(self.work_order, changes)
+            
+            # Log the update with details
+            item_details = ", ".join([
+                f"{item_code}: {flt(balances[item_code].consumed_qty) - change} → {flt(balances[item_code].consumed_qty)}"
+                for item_code, change in changes.items()
+                if item_code in balances
+            ])
+            
+            frappe.msgprint(_("Consumed quantities updated in Work Order {0}. Items: {1}").format(
+                frappe.get_desk_link("Work Order", self.work_order),
+                item_details
+            ))
                 
         except Exception as e:
             frappe.log_error(
@@ -477,7 +507,10 @@ def get_work_order_parts(work_order):
     if not work_order:
         return []
 
+    from car_workshop.utils.part_movement_ledger import get_part_balances
+
     wo = frappe.get_doc("Work Order", work_order)
+    balances = get_part_balances(work_order)
 
     required_items = []
     for item in getattr(wo, "part_detail", []) or []:
@@ -492,7 +525,8 @@ def get_work_order_parts(work_order):
             as_dict=1,
         ) or {"actual_qty": 0, "reserved_qty": 0, "valuation_rate": 0}
 
-        consumed_qty = flt(getattr(item, "consumed_qty", 0))
+        balance = balances.get(item.item_code)
+        consumed_qty = flt(balance.consumed_qty) if balance else 0
         required_qty = flt(getattr(item, "quantity", 0))
         remaining_qty = required_qty - consumed_qty
 
@@ -1,9 +1,11 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import flt, cint, getdate, now_datetime
+from frappe.utils import flt, cint, getdate, now, now_datetime
 import json
 
+from car_workshop.utils.tax_template_cache import get_template_taxes
+
 class WorkshopPurchaseOrder(Document):
     def validate(self):
         """
@@ -155,20 +157,8 @@ class WorkshopPurchaseOrder(Document):
         Returns:
             list: List of tax details with rates and calculation methods
         """
-        tax_details = []
-        
-        # Get tax template details from Purchase Taxes and Charges Template
-        if tax_template:
-            taxes = frappe.get_all(
-                "Purchase Taxes and Charges",
-                filters={"parent": tax_template},
-                fields=["charge_type", "rate", "account_head", "description"],
-                order_by="idx"
-            )
-            
-            tax_details = taxes
-        
-        return tax_details
+        # Get tax template details from the shared Purchase Taxes and Charges Template cache
+        return get_template_taxes("Purchase Taxes and Charges Template", tax_template)
     
     def _calculate_item_tax_amount(self, amount, tax_details):
         """
@@ -243,56 +233,33 @@ class WorkshopPurchaseOrder(Document):
         """
         if not self.work_order:
             return
-            
+
+        # Check for duplicates only if reference is specified
+        references = {item.reference_doctype for item in self.items if item.reference_doctype}
+        if not references:
+            return
+
+        # Index every conflicting item of other active POs in one query
+        active_items = {}
+        for row in get_active_po_items(self.work_order, references, exclude_po=self.name):
+            key = (row.item_type, row.reference_doctype, cint(row.billable))
+            active_items.setdefault(key, row.purchase_order)
+
         for item in self.items:
-            # Check for duplicates only if reference is specified
             if not item.reference_doctype:
                 continue
-                
-            # Construct filter conditions
-            filters = {
-                "docstatus": 1,  # Submitted
-                "work_order": self.work_order,
-                "status": ["!=", "Cancelled"]
-            }
-            
-            # Check if there's another PO with the same work order and matching items
-            duplicate_pos = frappe.get_all(
-                "Workshop Purchase Order",
-                filters=filters,
-                fields=["name"]
-            )
-            
-            if not duplicate_pos:
-                continue
-                
-            # For each potential duplicate PO, check the items
-            for po in duplicate_pos:
-                if po.name == self.name:
-                    continue  # Skip current document
-                    
-                # Get items from the potential duplicate PO
-                duplicate_items = frappe.get_all(
-                    "Workshop Purchase Order Item",
-                    filters={
-                        "parent": po.name,
-                        "item_type": item.item_type,
-                        "reference_doctype": item.reference_doctype,
-                        "billable": item.billable
-                    },
-                    fields=["name", "parent"]
-                )
-                
-                if duplicate_items:
-                    frappe.throw(_(
-                        "Duplicate item found in Purchase Order {0}. "
-                        "Item Type: {1}, Reference: {2}, Billable: {3}"
-                    ).format(
-                        po.name,
-                        item.item_type,
-                        item.reference_doctype,
-                        "Yes" if cint(item.billable) == 1 else "No"
-                    ))
+
+            duplicate_po = active_items.get((item.item_type, item.reference_doctype, cint(item.billable)))
+            if duplicate_po:
+                frappe.throw(_(
+                    "Duplicate item found in Purchase Order {0}. "
+                    "Item Type: {1}, Reference: {2}, Billable: {3}"
+                ).format(
+                    duplicate_po,
+                    item.item_type,
+                    item.reference_doctype,
+                    "Yes" if cint(item.billable) == 1 else "No"
+                ))
     
     def on_submit(self):
         """
@@ -315,33 +282,14 @@ class WorkshopPurchaseOrder(Document):
         """
         if not self.work_order:
             return
-            
-        work_order = frappe.get_doc("Work Order", self.work_order)
-        
-        # Track if any updates were made
-        updated = False
         
-        if self.purchase_type == "Part":
-            for po_item in self.items:
-                if po_item.item_type == "Part" and po_item.reference_doctype:
-                    for wo_part in work_order.part_detail:
-                        if wo_part.part == po_item.reference_doctype and not wo_part.purchase_order:
-                            wo_part.purchase_order = self.name
-                            wo_part.po_rate = po_item.rate
-                            updated = True
+        # First PO item per reference wins, as rows already linked are skipped
+        rates = {}
+        for po_item in self.items:
+            if po_item.item_type == self.purchase_type and po_item.reference_doctype:
+                rates.setdefault(po_item.reference_doctype, po_item.rate)
         
-        elif self.purchase_type == "OPL":
-            for po_item in self.items:
-                if po_item.item_type == "OPL" and po_item.reference_doctype:
-                    for wo_job in work_order.job_type_detail:
-                        if wo_job.job_type == po_item.reference_doctype and wo_job.is_opl and not wo_job.purchase_order:
-                            wo_job.purchase_order = self.name
-                            wo_job.vendor_rate = po_item.rate
-                            updated = True
-        
-        # Only save if updates were made
-        if updated:
-            work_order.save(ignore_permissions=True)
+        if link_work_order_rows(self.work_order, self.purchase_type, self.name, rates):
             frappe.msgprint(_("Work Order {0} has been updated with Purchase Order details").format(self.work_order))
     
     def create_purchase_invoice(self):
@@ -388,6 +336,14 @@ class WorkshopPurchaseOrder(Document):
             if hasattr(self, 'default_tax_template') and self.default_tax_template:
                 invoice.taxes_and_charges = self.default_tax_template
             
+            # Load the snapshots of all billable Parts in one query
+            from car_workshop.utils.part_snapshot import get_part_snapshots
+            
+            get_part_snapshots(
+                item.reference_doctype for item in self.items
+                if cint(item.billable) == 1 and item.item_type == "Part"
+            )
+            
             # Add items to the invoice
             for item in self.items:
                 if cint(item.billable) != 1:
@@ -421,8 +377,7 @@ class WorkshopPurchaseOrder(Document):
             if hasattr(self, 'default_tax_template') and self.default_tax_template:
                 # This is a simplified approach. For complex scenarios with per-item tax templates,
                 # you might need custom logic to merge tax templates or apply them differently
-                tax_template_doc = frappe.get_doc("Purchase Taxes and Charges Template", self.default_tax_template)
-                for tax in tax_template_doc.taxes:
+                for tax in get_template_taxes("Purchase Taxes and Charges Template", self.default_tax_template):
                     invoice.append("taxes", {
                         "charge_type": tax.charge_type,
                         "account_head": tax.account_head,
@@ -448,8 +403,11 @@ class WorkshopPurchaseOrder(Document):
         """
         try:
             if item.item_type == "Part":
-                # Get the item_code from Part
-                return frappe.db.get_value("Part", item.reference_doctype, "item_code")
+                # Get the item_code from the Part snapshot
+                from car_workshop.utils.part_snapshot import get_part_snapshot
+                
+                part = get_part_snapshot(item.reference_doctype)
+                return part.item_code if part else None
                 
             elif item.item_type == "OPL":
                 # For OPL, we might need a service item
@@ -510,29 +468,8 @@ class WorkshopPurchaseOrder(Document):
         """
         if not self.work_order:
             return
-            
-        work_order = frappe.get_doc("Work Order", self.work_order)
         
-        # Track if any updates were made
-        updated = False
-        
-        if self.purchase_type == "Part":
-            for wo_part in work_order.part_detail:
-                if wo_part.purchase_order == self.name:
-                    wo_part.purchase_order = None
-                    wo_part.po_rate = 0
-                    updated = True
-        
-        elif self.purchase_type == "OPL":
-            for wo_job in work_order.job_type_detail:
-                if wo_job.purchase_order == self.name:
-                    wo_job.purchase_order = None
-                    wo_job.vendor_rate = 0
-                    updated = True
-        
-        # Only save if updates were made
-        if updated:
-            work_order.save(ignore_permissions=True)
+        if unlink_work_order_rows(self.work_order, self.purchase_type, self.name):
             frappe.msgprint(_("Work Order {0} has been updated").format(self.work_order))
     
     def unlink_from_invoices(self):
@@ -624,8 +561,7 @@ def make_purchase_invoice(source_name, target_doc=None):
             target.taxes_and_charges = source.default_tax_template
             
             # Copy taxes from template
-            tax_template_doc = frappe.get_doc("Purchase Taxes and Charges Template", source.default_tax_template)
-            for tax in tax_template_doc.taxes:
+            for tax in get_template_taxes("Purchase Taxes and Charges Template", source.default_tax_template):
                 target.append("taxes", {
                     "charge_type": tax.charge_type,
                     "account_head": tax.account_head,
@@ -638,6 +574,13 @@ def make_purchase_invoice(source_name, target_doc=None):
             item.amount = item.qty * item.rate
             
     def update_item(source_doc, target_doc, source_parent):
+        # Snapshots of all Parts load in one query on the first row, later rows hit the cache
+        from car_workshop.utils.part_snapshot import get_part_snapshots
+        
+        get_part_snapshots(
+            item.reference_doctype for item in source_parent.items if item.item_type == "Part"
+        )
+        
         # Get the Item Code based on the reference
         item_code = get_item_code_for_reference(source_doc)
         if item_code:
@@ -661,8 +604,11 @@ def make_purchase_invoice(source_name, target_doc=None):
         """Get the Item Code from the reference document"""
         try:
             if item.item_type == "Part":
-                # Get the item_code from Part
-                return frappe.db.get_value("Part", item.reference_doctype, "item_code")
+                # Get the item_code from the Part snapshot
+                from car_workshop.utils.part_snapshot import get_part_snapshot
+                
+                part = get_part_snapshot(item.reference_doctype)
+                return part.item_code if part else None
                 
             elif item.item_type == "OPL":
                 # For OPL, we might need a service item
@@ -708,6 +654,176 @@ def make_purchase_invoice(source_name, target_doc=None):
     
     return doclist
 
+# Purchase type -> (Work Order child DocType, parentfield, reference field, rate field)
+WORK_ORDER_PO_TARGETS = {
+    "Part": ("Work Order Part", "part_detail", "part", "po_rate"),
+    "OPL": ("Work Order Job Type", "job_type_detail", "job_type", "vendor_rate"),
+}
+
+def link_work_order_rows(work_order, purchase_type, purchase_order, rates):
+    """
+    Link Work Order rows without a purchase order to a Workshop Purchase Order.
+    Only the matching child rows are locked and written; the Work Order itself
+    is neither loaded nor saved, but its modified timestamp is bumped so a form
+    opened before the link cannot be saved over it.
+    
+    Args:
+        work_order (str): Work Order name
+        purchase_type (str): Part or OPL
+        purchase_order (str): Workshop Purchase Order name
+        rates (dict): PO rate per referenced Part or Job Type
+        
+    Returns:
+        int: Number of rows linked
+    """
+    if purchase_type not in WORK_ORDER_PO_TARGETS or not rates:
+        return 0
+    
+    child_doctype, parentfield, reference_field, rate_field = WORK_ORDER_PO_TARGETS[purchase_type]
+    conditions = " AND is_opl = 1" if purchase_type == "OPL" else ""
+    
+    rows = frappe.db.sql(f"""
+        SELECT name, {reference_field} AS reference
+        FROM `tab{child_doctype}`
+        WHERE parent = %(work_order)s
+            AND parenttype = 'Work Order'
+            AND parentfield = %(parentfield)s
+            AND {reference_field} IN %(references)s
+            AND IFNULL(purchase_order, '') = ''
+            {conditions}
+        FOR UPDATE
+    """, {
+        "work_order": work_order,
+        "parentfield": parentfield,
+        "references": tuple(rates),
+    }, as_dict=True)
+    
+    # Index the locked rows by rate, so each distinct rate is one UPDATE
+    rows_by_rate = {}
+    for row in rows:
+        rows_by_rate.setdefault(flt(rates[row.reference]), []).append(row.name)
+    
+    for rate, names in rows_by_rate.items():
+        frappe.db.sql(f"""
+            UPDATE `tab{child_doctype}`
+            SET purchase_order = %(purchase_order)s, {rate_field} = %(rate)s
+            WHERE name IN %(names)s
+        """, {"purchase_order": purchase_order, "rate": rate, "names": tuple(names)})
+    
+    if rows:
+        adjust_lines_without_po(work_order, -len(rows))
+    
+    return len(rows)
+
+def unlink_work_order_rows(work_order, purchase_type, purchase_order):
+    """
+    Clear the purchase order and rate of Work Order rows linked to a
+    Workshop Purchase Order, writing only those child rows
+    
+    Args:
+        work_order (str): Work Order name
+        purchase_type (str): Part or OPL
+        purchase_order (str): Workshop Purchase Order name
+        
+    Returns:
+        int: Number of rows unlinked
+    """
+    if purchase_type not in WORK_ORDER_PO_TARGETS:
+        return 0
+    
+    child_doctype, parentfield, _reference_field, rate_field = WORK_ORDER_PO_TARGETS[purchase_type]
+    
+    names = frappe.db.sql_list(f"""
+        SELECT name
+        FROM `tab{child_doctype}`
+        WHERE parent = %(work_order)s
+            AND parenttype = 'Work Order'
+            AND parentfield = %(parentfield)s
+            AND purchase_order = %(purchase_order)s
+        FOR UPDATE
+    """, {
+        "work_order": work_order,
+        "parentfield": parentfield,
+        "purchase_order": purchase_order,
+    })
+    
+    if names:
+        frappe.db.sql(f"""
+            UPDATE `tab{child_doctype}`
+            SET purchase_order = '', {rate_field} = 0
+            WHERE name IN %(names)s
+        """, {"names": tuple(names)})
+        adjust_lines_without_po(work_order, len(names))
+    
+    return len(names)
+
+def adjust_lines_without_po(work_order, delta):
+    """
+    Keep the Work Order's lines_without_po aggregate in step with rows linked
+    or unlinked outside a save. The same UPDATE bumps modified, so saving a
+    form opened before the change fails with a timestamp mismatch instead of
+    writing the old purchase order links back.
+    
+    Args:
+        work_order (str): Work Order name
+        delta (int): Change in the number of rows without a purchase order
+    """
+    frappe.db.sql("""
+        UPDATE `tabWork Order`
+        SET lines_without_po = GREATEST(IFNULL(lines_without_po, 0) + %(delta)s, 0),
+            modified = %(modified)s,
+            modified_by = %(user)s
+        WHERE name = %(work_order)s
+    """, {
+        "work_order": work_order,
+        "delta": delta,
+        "modified": now(),
+        "user": frappe.session.user,
+    })
+    frappe.clear_document_cache("Work Order", work_order)
+
+def get_active_po_items(work_order, reference_doctypes=None, exclude_po=None):
+    """
+    Get items of submitted, non-cancelled Workshop Purchase Orders for a Work Order
+    
+    Args:
+        work_order (str): Work Order name
+        reference_doctypes (iterable): Only return items with these references
+        exclude_po (str): Purchase Order to leave out, usually the current one
+        
+    Returns:
+        list: Rows with item_type, reference_doctype, billable and purchase_order
+    """
+    conditions = ""
+    values = {"work_order": work_order}
+
+    if exclude_po:
+        conditions += " AND po.name != %(exclude_po)s"
+        values["exclude_po"] = exclude_po
+
+    if reference_doctypes is not None:
+        reference_doctypes = tuple(reference_doctypes)
+        if not reference_doctypes:
+            return []
+        conditions += " AND poi.reference_doctype IN %(reference_doctypes)s"
+        values["reference_doctypes"] = reference_doctypes
+
+    return frappe.db.sql(
+        f"""
+        SELECT poi.item_type, poi.reference_doctype, poi.billable, po.name AS purchase_order
+        FROM `tabWorkshop Purchase Order` po
+        INNER JOIN `tabWorkshop Purchase Order Item` poi
+            ON poi.parent = po.name AND poi.parenttype = 'Workshop Purchase Order'
+        WHERE po.work_order = %(work_order)s
+            AND po.docstatus = 1
+            AND IFNULL(po.status, '') != 'Cancelled'
+            {conditions}
+        ORDER BY po.creation, poi.idx
+        """,
+        values,
+        as_dict=True,
+    )
+
 @frappe.whitelist()
 def check_duplicate_po(work_order, item_type, reference_doctype, current_po=None):
     """
@@ -716,140 +832,97 @@ def check_duplicate_po(work_order, item_type, reference_doctype, current_po=None
     # Skip for new POs with no name yet
     if current_po == "new":
         current_po = None
-        
-    # Construct filter conditions
-    filters = {
-        "docstatus": 1,  # Submitted
-        "work_order": work_order,
-        "status": ["!=", "Cancelled"]
-    }
-    
-    if current_po:
-        filters["name"] = ["!=", current_po]
-    
-    # Get all active POs for this work order
-    purchase_orders = frappe.get_all(
-        "Workshop Purchase Order",
-        filters=filters,
-        fields=["name"]
-    )
-    
-    # If no POs found, no duplicates
-    if not purchase_orders:
-        return {"exists": False}
-    
-    # For each PO, check for matching items
-    for po in purchase_orders:
-        # Check for matching items
-        item_filters = {
-            "parent": po.name,
-            "item_type": item_type,
-            "reference_doctype": reference_doctype
-        }
-        
-        duplicate_items = frappe.get_all(
-            "Workshop Purchase Order Item",
-            filters=item_filters,
-            fields=["name", "parent"]
-        )
-        
-        if duplicate_items:
+
+    for row in get_active_po_items(work_order, [reference_doctype], exclude_po=current_po):
+        if row.item_type == item_type:
             return {
                 "exists": True,
-                "po_number": po.name
+                "po_number": row.purchase_order
             }
     
     return {"exists": False}
 
+# Result key -> (Work Order child DocType, parentfield, returned fields, text filter fields, extra condition)
+WORK_ORDER_FETCH_SECTIONS = {
+    "parts": ("Work Order Part", "part_detail",
+              ("part", "part_name", "quantity", "rate", "amount"), ("part", "part_name"), ""),
+    "opl_jobs": ("Work Order Job Type", "job_type_detail",
+                 ("job_type", "description", "price"), ("job_type", "description"), "AND is_opl = 1"),
+    "expenses": ("Work Order Expense", "external_expense",
+                 ("expense_type", "description", "amount"), ("expense_type", "description"), ""),
+}
+
 @frappe.whitelist()
 def fetch_work_order_items(work_order, fetch_parts=0, fetch_opl=0, fetch_expenses=0, 
-                          only_without_po=1, filter_text="", current_po=None):
+                          only_without_po=1, filter_text="", current_po=None,
+                          start=0, page_length=0):
     """
-    Fetch items from a work order based on filter criteria
+    Fetch items from a work order based on filter criteria.
+    Each requested section is filtered and paged in SQL; with a page_length,
+    next_start holds the start of the next page of each section (None on the
+    last page).
     """
     if not work_order:
         return {"error": "Work Order is required"}
     
-    # Convert string arguments to boolean/integer
-    fetch_parts = int(fetch_parts)
-    fetch_opl = int(fetch_opl)
-    fetch_expenses = int(fetch_expenses)
-    only_without_po = int(only_without_po)
+    if not frappe.db.exists("Work Order", work_order):
+        return {"error": f"Error fetching Work Order: Work Order {work_order} not found"}
     
-    # Get the work order document
-    try:
-        work_order_doc = frappe.get_doc("Work Order", work_order)
-    except Exception as e:
-        frappe.log_error(f"Error fetching Work Order {work_order}: {str(e)}")
-        return {"error": f"Error fetching Work Order: {str(e)}"}
+    requested = {
+        "parts": cint(fetch_parts),
+        "opl_jobs": cint(fetch_opl),
+        "expenses": cint(fetch_expenses),
+    }
+    start = cint(start)
+    page_length = cint(page_length)
     
     result = {}
-    
-    # Fetch parts if requested
-    if fetch_parts and hasattr(work_order_doc, "part_detail"):
-        parts = []
-        for part in work_order_doc.part_detail:
-            # Skip if filtering by PO and part already has one
-            if only_without_po and part.purchase_order and part.purchase_order != current_po:
-                continue
-                
-            # Apply text filter if provided
-            if filter_text and filter_text.lower() not in (part.part or "").lower() and filter_text.lower() not in (part.part_name or "").lower():
-                continue
-                
-            parts.append({
-                "part": part.part,
-                "part_name": part.part_name,
-                "quantity": part.quantity,
-                "rate": part.rate,
-                "amount": part.amount
-            })
-        
-        result["parts"] = parts
-    
-    # Fetch OPL jobs if requested
-    if fetch_opl and hasattr(work_order_doc, "job_type_detail"):
-        opl_jobs = []
-        for job in work_order_doc.job_type_detail:
-            # Only include OPL jobs
-            if not job.is_opl:
-                continue
-                
-            # Skip if filtering by PO and job already has one
-            if only_without_po and job.purchase_order and job.purchase_order != current_po:
-                continue
-                
-            # Apply text filter if provided
-            if filter_text and filter_text.lower() not in (job.job_type or "").lower() and filter_text.lower() not in (job.description or "").lower():
-                continue
-                
-            opl_jobs.append({
-                "job_type": job.job_type,
-                "description": job.description,
-                "price": job.price
-            })
-        
-        result["opl_jobs"] = opl_jobs
-    
-    # Fetch expenses if requested
-    if fetch_expenses and hasattr(work_order_doc, "external_expense"):
-        expenses = []
-        for expense in work_order_doc.external_expense:
-            # Skip if filtering by PO and expense already has one
-            if only_without_po and expense.purchase_order and expense.purchase_order != current_po:
-                continue
-                
-            # Apply text filter if provided
-            if filter_text and filter_text.lower() not in (expense.expense_type or "").lower() and filter_text.lower() not in (expense.description or "").lower():
-                continue
-                
-            expenses.append({
-                "expense_type": expense.expense_type,
-                "description": expense.description,
-                "amount": expense.amount
-            })
+    if page_length:
+        result["next_start"] = {}
+    
+    for section, (child_doctype, parentfield, fields, text_fields, extra_condition) in WORK_ORDER_FETCH_SECTIONS.items():
+        if not requested[section]:
+            continue
+        
+        conditions = [extra_condition] if extra_condition else []
+        values = {"work_order": work_order, "parentfield": parentfield}
+        
+        # Skip rows that already have another PO
+        if cint(only_without_po):
+            conditions.append("AND (IFNULL(purchase_order, '') = '' OR purchase_order = %(current_po)s)")
+            values["current_po"] = current_po or ""
+        
+        if filter_text:
+            conditions.append("AND ({0})".format(" OR ".join(
+                f"IFNULL({field}, '') LIKE %(filter_text)s" for field in text_fields
+            )))
+            values["filter_text"] = "%{0}%".format(
+                filter_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            )
         
-        result["expenses"] = expenses
+        limit = ""
+        if page_length:
+            # One extra row tells whether another page exists
+            limit = "LIMIT %(limit)s OFFSET %(start)s"
+            values.update(limit=page_length + 1, start=start)
+        
+        rows = frappe.db.sql(f"""
+            SELECT {", ".join(fields)}
+            FROM `tab{child_doctype}`
+            WHERE parent = %(work_order)s
+                AND parenttype = 'Work Order'
+                AND parentfield = %(parentfield)s
+                {" ".join(conditions)}
+            ORDER BY idx
+            {limit}
+        """, values, as_dict=True)
+        
+        if page_length:
+            has_more = len(rows) > page_length
+            rows = rows[:page_length]
+            result["next_start"][section] = start + page_length if has_more else None
+        
+        result[section] = rows
     
     return result
 
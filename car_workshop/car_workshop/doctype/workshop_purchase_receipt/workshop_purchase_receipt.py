@@ -124,33 +124,8 @@ class WorkshopPurchaseReceipt(Document):
         """
         Get quantities already received for each PO item
         """
-        # Find all submitted receipts for this PO excluding the current one
-        previous_receipts = frappe.get_all(
-            "Workshop Purchase Receipt",
-            filters={
-                "purchase_order": self.purchase_order,
-                "docstatus": 1,
-                "name": ["!=", self.name or "new"]
-            },
-            fields=["name"]
-        )
-        
-        # Initialize dict to store received quantities
-        po_item_received_qty = {}
-        
-        # If there are previous receipts, sum up the quantities
-        if previous_receipts:
-            for receipt in previous_receipts:
-                receipt_items = frappe.get_all(
-                    "Workshop Purchase Receipt Item",
-                    filters={"parent": receipt.name},
-                    fields=["po_item", "received_qty"]
-                )
-                
-                for item in receipt_items:
-                    po_item_received_qty[item.po_item] = po_item_received_qty.get(item.po_item, 0) + flt(item.received_qty)
-        
-        return po_item_received_qty
+        # Sum all submitted receipts for this PO excluding the current one
+        return get_po_received_qty(self.purchase_order, exclude_receipt=self.name)
     
     def mark_items_as_received(self):
         """
@@ -191,6 +166,13 @@ class WorkshopPurchaseReceipt(Document):
             
         po_doc = frappe.get_doc("Workshop Purchase Order", self.purchase_order)
         
+        # Quantities received for these items by other receipts
+        other_receipts_qty = get_po_received_qty(
+            self.purchase_order,
+            exclude_receipt=self.name,
+            po_items=[item.po_item for item in self.items]
+        )
+        
         # Track if any updates were made
         updated = False
         
@@ -198,18 +180,7 @@ class WorkshopPurchaseReceipt(Document):
             # Find the corresponding PO item
             for po_item in po_doc.items:
                 if po_item.name == receipt_item.po_item:
-                    # Check if there are other receipts for this item
-                    other_receipts = frappe.db.sql("""
-                        SELECT SUM(wpri.received_qty)
-                        FROM `tabWorkshop Purchase Receipt Item` wpri
-                        INNER JOIN `tabWorkshop Purchase Receipt` wpr ON wpri.parent = wpr.name
-                        WHERE wpr.purchase_order = %s
-                        AND wpri.po_item = %s
-                        AND wpr.docstatus = 1
-                        AND wpr.name != %s
-                    """, (self.purchase_order, receipt_item.po_item, self.name))
-                    
-                    other_qty = flt(other_receipts[0][0]) if other_receipts and other_receipts[0][0] else 0
+                    other_qty = other_receipts_qty.get(receipt_item.po_item, 0)
                     
                     if not hasattr(po_item, 'received_qty'):
                         # For simple received flag
@@ -236,7 +207,7 @@ class WorkshopPurchaseReceipt(Document):
         po_doc = frappe.get_doc("Workshop Purchase Order", self.purchase_order)
         
         # Get total received quantities including this receipt
-        po_item_received_qty = self.get_previously_received_qty()
+        po_item_received_qty = get_po_received_qty(self.purchase_order, exclude_receipt=self.name)
         
         # If this is a submission, add quantities from this receipt
         if self.docstatus == 1:
@@ -376,6 +347,48 @@ class WorkshopPurchaseReceipt(Document):
         }).insert(ignore_permissions=True)
 
 
+def get_po_received_qty(purchase_order, exclude_receipt=None, po_items=None):
+    """
+    PO receipt ledger: total quantity received per Purchase Order item
+    across all submitted Workshop Purchase Receipts, in one aggregate query
+    
+    Args:
+        purchase_order: Workshop Purchase Order name
+        exclude_receipt: Receipt to leave out, usually the one being validated
+        po_items: Only return these Purchase Order items
+        
+    Returns:
+        dict: Received quantity keyed by Purchase Order item name
+    """
+    if not purchase_order:
+        return {}
+    
+    conditions = ""
+    values = {"purchase_order": purchase_order}
+    
+    if exclude_receipt:
+        conditions += " AND wpr.name != %(exclude_receipt)s"
+        values["exclude_receipt"] = exclude_receipt
+    
+    if po_items is not None:
+        po_items = tuple({po_item for po_item in po_items if po_item})
+        if not po_items:
+            return {}
+        conditions += " AND wpri.po_item IN %(po_items)s"
+        values["po_items"] = po_items
+    
+    ledger = frappe.db.sql("""
+        SELECT wpri.po_item, SUM(wpri.received_qty) AS received_qty
+        FROM `tabWorkshop Purchase Receipt Item` wpri
+        INNER JOIN `tabWorkshop Purchase Receipt` wpr ON wpri.parent = wpr.name
+        WHERE wpr.purchase_order = %(purchase_order)s
+            AND wpr.docstatus = 1
+            {conditions}
+        GROUP BY wpri.po_item
+    """.format(conditions=conditions), values, as_dict=True)
+    
+    return {row.po_item: flt(row.received_qty) for row in ledger}
+
 @frappe.whitelist()
 def make_purchase_receipt_from_po(source_name):
     """
@@ -394,26 +407,7 @@ def make_purchase_receipt_from_po(source_name):
     receipt.warehouse = frappe.db.get_single_value("Stock Settings", "default_warehouse")
     
     # Get already received quantities
-    po_item_received_qty = {}
-    previous_receipts = frappe.get_all(
-        "Workshop Purchase Receipt",
-        filters={
-            "purchase_order": po.name,
-            "docstatus": 1
-        },
-        fields=["name"]
-    )
-    
-    if previous_receipts:
-        for receipt_doc in previous_receipts:
-            receipt_items = frappe.get_all(
-                "Workshop Purchase Receipt Item",
-                filters={"parent": receipt_doc.name},
-                fields=["po_item", "received_qty"]
-            )
-            
-            for item in receipt_items:
-                po_item_received_qty[item.po_item] = po_item_received_qty.get(item.po_item, 0) + flt(item.received_qty)
+    po_item_received_qty = get_po_received_qty(po.name)
     
     # Add items with remaining quantities to receive
     for po_item in po.items:
@@ -95,6 +95,50 @@ doc_events = {
     "Stock Entry": {
         "on_cancel": "car_workshop.car_workshop.doctype.workshop_material_issue.workshop_material_issue.on_stock_entry_cancel"
     },
+    "Part": {
+        "on_update": [
+            "car_workshop.utils.barcode_index.clear_barcode_index",
+            "car_workshop.utils.part_snapshot.clear_part_snapshot",
+        ],
+        "on_trash": [
+            "car_workshop.utils.barcode_index.clear_barcode_index",
+            "car_workshop.utils.part_snapshot.clear_part_snapshot",
+        ],
+        "after_rename": "car_workshop.utils.part_snapshot.clear_part_snapshot"
+    },
+    "Item": {
+        "on_update": "car_workshop.utils.barcode_index.clear_barcode_index",
+        "on_trash": "car_workshop.utils.barcode_index.clear_barcode_index"
+    },
+    "Service Price List": {
+        "on_update": "car_workshop.utils.price_cache.on_service_price_list_change",
+        "on_trash": "car_workshop.utils.price_cache.on_service_price_list_change"
+    },
+    "Item Price": {
+        "on_update": "car_workshop.utils.price_cache.on_item_price_change",
+        "on_trash": "car_workshop.utils.price_cache.on_item_price_change"
+    },
+    "Sales Taxes and Charges Template": {
+        "on_update": "car_workshop.utils.tax_template_cache.clear_tax_template_cache",
+        "on_trash": "car_workshop.utils.tax_template_cache.clear_tax_template_cache"
+    },
+    "Purchase Taxes and Charges Template": {
+        "on_update": "car_workshop.utils.tax_template_cache.clear_tax_template_cache",
+        "on_trash": "car_workshop.utils.tax_template_cache.clear_tax_template_cache"
+    },
+    "Employee": {
+        "on_update": "car_workshop.utils.employee_cache.clear_user_employee_cache",
+        "on_trash": "car_workshop.utils.employee_cache.clear_user_employee_cache",
+        "after_rename": "car_workshop.utils.employee_cache.clear_user_employee_cache"
+    },
+    "Custom Field": {
+        "on_update": "car_workshop.utils.validator_plans.clear_validator_plans",
+        "on_trash": "car_workshop.utils.validator_plans.clear_validator_plans"
+    },
+    "Property Setter": {
+        "on_update": "car_workshop.utils.validator_plans.clear_validator_plans",
+        "on_trash": "car_workshop.utils.validator_plans.clear_validator_plans"
+    },
     "Work Order Billing": {
         "validate": "car_workshop.car_workshop.doctype.work_order_billing.work_order_billing.validate",
         "on_submit": [
@@ -105,6 +149,17 @@ doc_events = {
     }
 }
 
+# DocTypes skipped by the global validate_mandatory_fields hook. ERPNext
+# transactions enforce their own mandatory fields and may carry negative
+# amounts (returns, debit/credit notes).
+validate_mandatory_fields_exclude = [
+    "Stock Entry",
+    "Sales Invoice",
+    "Purchase Invoice",
+    "Journal Entry",
+    "Payment Entry",
+]
+
 # Data fixtures
 fixtures = [
     {
@@ -1,25 +1,45 @@
 # Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
 # For license information, please see license.txt
 
-from typing import Dict, Optional, Any, Union
+from typing import Dict, Optional, Any, Tuple, Union
 
 import frappe
 from frappe import _
-from frappe.model.mapper import get_mapped_doc
+from frappe.model.document import Document
+from frappe.model.mapper import map_doc
 from frappe.utils import flt
 
 
-def map_to_sales_invoice(wob_name: str) -> str:
+SALES_INVOICE_MAP = {
+    "doctype": "Sales Invoice",
+    "field_map": {
+        "name": "work_order_billing",
+        "work_order": "work_order",
+        "customer_vehicle": "customer_vehicle",
+        "transaction_date": "posting_date",
+        "due_date": "due_date"
+    },
+}
+
+
+def map_to_sales_invoice(
+    wob_name: str,
+    prefetched: Optional[Dict[str, Any]] = None,
+    source_doc: Optional[Document] = None
+) -> str:
     """
     Map Work Order Billing to Sales Invoice
     
     Args:
         wob_name: Work Order Billing document name
+        prefetched: Output of prefetch_mapping_data covering this billing, if already loaded
+        source_doc: The Work Order Billing, if already loaded
         
     Returns:
         str: The created Sales Invoice name
     """
-    source_doc = frappe.get_doc("Work Order Billing", wob_name)
+    if source_doc is None:
+        source_doc = frappe.get_doc("Work Order Billing", wob_name)
     
     # Validate the source document
     if source_doc.docstatus != 1:
@@ -29,29 +49,15 @@ def map_to_sales_invoice(wob_name: str) -> str:
         frappe.throw(_("Sales Invoice {0} already exists for this Work Order Billing").format(
             source_doc.sales_invoice
         ))
+
+    if prefetched is None:
+        prefetched = prefetch_mapping_data([source_doc])
     
-    doc = get_mapped_doc(
-        "Work Order Billing", 
-        wob_name,
-        {
-            "Work Order Billing": {
-                "doctype": "Sales Invoice",
-                "field_map": {
-                    "name": "work_order_billing",
-                    "work_order": "work_order",
-                    "customer_vehicle": "customer_vehicle",
-                    "transaction_date": "posting_date",
-                    "due_date": "due_date"
-                },
-                "validation": {
-                    "docstatus": ["=", 1]
-                },
-                "postprocess": add_item_rows
-            }
-        }, 
-        None, 
-        set_missing_values
-    )
+    # Same steps as get_mapped_doc, on the already loaded billing
+    doc = frappe.new_doc("Sales Invoice")
+    map_doc(source_doc, doc, SALES_INVOICE_MAP)
+    add_item_rows(source_doc, doc, prefetched=prefetched)
+    set_missing_values(source_doc, doc)
     
     doc.save()
     
@@ -86,18 +92,79 @@ def set_missing_values(source: Dict, target: Dict) -> None:
         target.run_method("set_missing_values")
 
 
-def add_item_rows(source: Dict, target: Dict, source_parent: Dict) -> None:
+# Billing child tables whose rows map to the Item linked on another DocType
+ITEM_CODE_SOURCES = (
+    ("job_type_items", "Job Type", "job_type"),
+    ("service_package_items", "Service Package", "service_package"),
+    ("part_items", "Part", "part"),
+)
+
+
+def prefetch_mapping_data(billings: list) -> Dict[str, Any]:
+    """
+    Load everything add_item_rows needs for the given billings in bulk
+    
+    Args:
+        billings: Work Order Billing documents that will be mapped
+        
+    Returns:
+        Dict: item_codes keyed by (doctype, name) and the default external
+        service item
+    """
+    names_by_doctype: Dict[str, set] = {}
+    has_external_services = False
+    for billing in billings:
+        for table, doctype, link_field in ITEM_CODE_SOURCES:
+            for item in billing.get(table) or []:
+                if item.get(link_field):
+                    names_by_doctype.setdefault(doctype, set()).add(item.get(link_field))
+        has_external_services = has_external_services or bool(billing.get("external_service_items"))
+
+    item_codes: Dict[Tuple[str, str], str] = {}
+    for doctype, names in names_by_doctype.items():
+        for row in frappe.get_all(
+            doctype,
+            filters={"name": ["in", list(names)]},
+            fields=["name", "item"],
+        ):
+            if row.item:
+                item_codes[(doctype, row.name)] = row.item
+
+    default_service_item = None
+    if has_external_services:
+        default_service_item = frappe.db.get_single_value(
+            "Car Workshop Settings", "default_external_service_item"
+        )
+
+    return {
+        "item_codes": item_codes,
+        "default_external_service_item": default_service_item,
+    }
+
+
+def add_item_rows(
+    source: Dict,
+    target: Dict,
+    source_parent: Optional[Dict] = None,
+    prefetched: Optional[Dict[str, Any]] = None
+) -> None:
     """
     Add all billable items to the Sales Invoice
     
     Args:
         source: Source document
         target: Target document
-        source_parent: Parent document
+        source_parent: Parent document (defaults to source)
+        prefetched: Output of prefetch_mapping_data, loaded here if not given
     """
+    source_parent = source_parent or source
+    if prefetched is None:
+        prefetched = prefetch_mapping_data([source_parent])
+    item_codes = prefetched["item_codes"]
+
     # Add job type items
     for item in source_parent.get("job_type_items", []):
-        item_code = frappe.db.get_value("Job Type", item.job_type, "item")
+        item_code = item_codes.get(("Job Type", item.job_type))
         if not item_code:
             continue
             
@@ -110,7 +177,7 @@ def add_item_rows(source: Dict, target: Dict, source_parent: Dict) -> None:
         
     # Add service package items
     for item in source_parent.get("service_package_items", []):
-        item_code = frappe.db.get_value("Service Package", item.service_package, "item")
+        item_code = item_codes.get(("Service Package", item.service_package))
         if not item_code:
             continue
             
@@ -123,7 +190,7 @@ def add_item_rows(source: Dict, target: Dict, source_parent: Dict) -> None:
         
     # Add part items
     for item in source_parent.get("part_items", []):
-        item_code = frappe.db.get_value("Part", item.part, "item")
+        item_code = item_codes.get(("Part", item.part))
         if not item_code:
             continue
             
@@ -135,13 +202,12 @@ def add_item_rows(source: Dict, target: Dict, source_parent: Dict) -> None:
         si_item.description = f"Part: {item.part_name}"
         
     # Add external service items
-    for item in source_parent.get("external_service_items", []):
-        default_service_item = frappe.db.get_single_value(
-            "Car Workshop Settings", "default_external_service_item"
-        )
-        if not default_service_item:
-            frappe.throw(_("Please set Default External Service Item in Car Workshop Settings"))
-            
+    external_service_items = source_parent.get("external_service_items", [])
+    default_service_item = prefetched["default_external_service_item"]
+    if external_service_items and not default_service_item:
+        frappe.throw(_("Please set Default External Service Item in Car Workshop Settings"))
+
+    for item in external_service_items:
         si_item = target.append("items", {})
         si_item.item_code = default_service_item
         si_item.qty = 1
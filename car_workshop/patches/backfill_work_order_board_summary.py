@@ -0,0 +1,49 @@
+import frappe
+
+
+def execute():
+    frappe.reload_doc("car_workshop", "doctype", "work_order")
+
+    # Fill the board aggregates of existing work orders in place, as
+    # WorkOrder.update_board_summary would on their next save
+    frappe.db.sql("""
+        UPDATE `tabWork Order` wo
+        SET
+            wo.part_count = (
+                SELECT COUNT(*) FROM `tabWork Order Part` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.job_type_count = (
+                SELECT COUNT(*) FROM `tabWork Order Job Type` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.service_package_count = (
+                SELECT COUNT(*) FROM `tabWork Order Service Package` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.expense_count = (
+                SELECT COUNT(*) FROM `tabWork Order Expense` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.total_parts_amount = (
+                SELECT IFNULL(SUM(c.amount), 0) FROM `tabWork Order Part` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.total_labor_amount = (
+                SELECT IFNULL(SUM(c.price), 0) FROM `tabWork Order Job Type` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.total_package_amount = (
+                SELECT IFNULL(SUM(c.total_price), 0) FROM `tabWork Order Service Package` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.total_external_amount = (
+                SELECT IFNULL(SUM(c.amount), 0) FROM `tabWork Order Expense` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.required_part_qty = (
+                SELECT IFNULL(SUM(c.quantity), 0) FROM `tabWork Order Part` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'),
+            wo.lines_without_po = (
+                SELECT COUNT(*) FROM `tabWork Order Part` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'
+                    AND IFNULL(c.purchase_order, '') = '')
+                + (SELECT COUNT(*) FROM `tabWork Order Job Type` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'
+                    AND c.is_opl = 1 AND IFNULL(c.purchase_order, '') = '')
+                + (SELECT COUNT(*) FROM `tabWork Order Expense` c
+                WHERE c.parent = wo.name AND c.parenttype = 'Work Order'
+                    AND IFNULL(c.purchase_order, '') = '')
+    """)
@@ -0,0 +1,22 @@
+import frappe
+
+from car_workshop.utils.part_movement_ledger import record_part_movements
+
+
+def execute():
+    frappe.reload_doc("car_workshop", "doctype", "work_order_part_movement")
+    frappe.reload_doc("car_workshop", "doctype", "work_order_part_balance")
+    frappe.reload_doc("car_workshop", "doctype", "work_order_part")
+
+    # Rebuild balances of existing work orders from their submitted vouchers
+    for doctype, movement_type in (
+        ("Workshop Material Issue", "Issue"),
+        ("Return Material", "Return"),
+    ):
+        for name in frappe.get_all(
+            doctype,
+            filters={"docstatus": 1, "work_order": ["is", "set"]},
+            pluck="name",
+            order_by="creation asc",
+        ):
+            record_part_movements(frappe.get_doc(doctype, name), movement_type)
@@ -18,17 +18,26 @@ def validate_mandatory_fields(doc, method: str | None = None) -> None:
     - Ensures mandatory fields are not empty.
     - Prevents negative values for numeric fields.
     - Bumps the document version to help track changes.
+
+    Only the fields listed in the DocType's compiled plan are checked, see
+    car_workshop.utils.validator_plans.
     """
+    from car_workshop.utils.validator_plans import get_validator_plan
 
-    for df in doc.meta.get("fields", []):
-        value = doc.get(df.fieldname)
+    plan = get_validator_plan(doc.meta)
+    if not plan.enabled:
+        return
 
-        if df.get("reqd") and (value is None or value == ""):
-            frappe.throw(_("{0} is mandatory").format(df.label))
+    for fieldname, label in plan.mandatory:
+        value = doc.get(fieldname)
+        if value is None or value == "":
+            frappe.throw(_("{0} is mandatory").format(label))
 
-        if df.fieldtype in {"Currency", "Int", "Float"} and value is not None and float(value) < 0:
-            frappe.throw(_("{0} cannot be negative").format(df.label))
+    for fieldname, label in plan.numeric:
+        value = doc.get(fieldname)
+        if value is not None and float(value) < 0:
+            frappe.throw(_("{0} cannot be negative").format(label))
 
     # Increment document version for change tracking
-    current_version = frappe.utils.cint(doc.get("version"))
-    doc.version = current_version + 1
+    if plan.track_version:
+        doc.version = frappe.utils.cint(doc.get("version")) + 1
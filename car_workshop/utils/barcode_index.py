@@ -0,0 +1,118 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Shared barcode -> Part index used by stock count scanners.
+
+The index covers Item Barcode rows of the Part's Item and, where the field
+exists, Part.barcode. It is built in one pass on the first lookup and kept in
+a Redis hash so all workers share it. Saving or deleting a Part or an Item
+drops the whole index once the transaction commits; the next scan rebuilds
+it. The hash also expires after BARCODE_INDEX_TTL as a safety net.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+
+from car_workshop.utils.cache_utils import (
+    delete_hash_values,
+    get_hash_values,
+    run_after_commit,
+    set_hash_values,
+)
+
+BARCODE_INDEX_KEY = "car_workshop:part_barcodes"
+
+# Hash field marking a fully built index, so unknown barcodes need no query
+READY_FIELD = "__ready__"
+
+DEFAULT_UOM = "Pcs"
+
+BARCODE_INDEX_TTL = 6 * 60 * 60
+
+
+def get_part_by_barcode(barcode: str) -> Dict[str, Any]:
+    """
+    Look up a single barcode
+
+    Args:
+        barcode: Scanned barcode
+
+    Returns:
+        Dict: part, part_name and uom, or an empty dict if unknown
+    """
+    if not barcode:
+        return {}
+    return get_parts_by_barcodes([barcode]).get(barcode, {})
+
+
+def get_parts_by_barcodes(barcodes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up many barcodes against the shared index
+
+    Args:
+        barcodes: Scanned barcodes
+
+    Returns:
+        Dict: Mapping of each barcode to its part details (empty dict if unknown)
+    """
+    barcodes = [barcode for barcode in dict.fromkeys(barcodes) if barcode]
+    if not barcodes:
+        return {}
+
+    cached = get_hash_values(BARCODE_INDEX_KEY, [READY_FIELD] + barcodes)
+    if not cached.get(READY_FIELD):
+        cached = warm_barcode_index()
+
+    return {barcode: dict(cached.get(barcode) or {}) for barcode in barcodes}
+
+
+def warm_barcode_index() -> Dict[str, Dict[str, Any]]:
+    """
+    Build the barcode index from the database and store it in the shared cache
+
+    Returns:
+        Dict: The index, barcode to part details
+    """
+    meta = frappe.get_meta("Part")
+    uom_column = "part.uom" if meta.has_field("uom") else "NULL"
+
+    index: Dict[str, Dict[str, Any]] = {}
+
+    # Item Barcode rows take precedence over barcodes stored on the Part
+    for row in frappe.db.sql(f"""
+        SELECT ib.barcode, part.name, part.part_name, {uom_column} AS uom
+        FROM `tabItem Barcode` ib
+        INNER JOIN `tabPart` part ON part.item_code = ib.parent
+        WHERE ib.parenttype = 'Item' AND IFNULL(ib.barcode, '') != ''
+        ORDER BY part.name
+    """, as_dict=True):
+        index.setdefault(row.barcode, _entry(row))
+
+    if meta.has_field("barcode"):
+        for row in frappe.db.sql(f"""
+            SELECT part.barcode, part.name, part.part_name, {uom_column} AS uom
+            FROM `tabPart` part
+            WHERE IFNULL(part.barcode, '') != ''
+            ORDER BY part.name
+        """, as_dict=True):
+            index.setdefault(row.barcode, _entry(row))
+
+    set_hash_values(BARCODE_INDEX_KEY, {**index, READY_FIELD: 1}, BARCODE_INDEX_TTL)
+
+    return index
+
+
+def clear_barcode_index(doc=None, method: Optional[str] = None) -> None:
+    """doc_events handler for Part and Item writes"""
+    run_after_commit(lambda: delete_hash_values(BARCODE_INDEX_KEY))
+
+
+def _entry(row) -> Dict[str, Any]:
+    return {
+        "part": row.name,
+        "part_name": row.part_name,
+        "uom": row.uom or DEFAULT_UOM,
+    }
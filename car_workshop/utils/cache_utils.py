@@ -0,0 +1,105 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Helpers shared by the app's caches.
+
+The hash helpers talk to Redis directly rather than through the wrapper's
+per-field hget/hset, so many fields cost one round trip. Values are pickled
+like the wrapper does. Hashes expire ``ttl`` seconds after they are created,
+so an entry missed by an invalidation cannot live forever.
+"""
+
+from __future__ import annotations
+
+import pickle
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import frappe
+
+
+def run_after_commit(callback: Callable[[], None]) -> None:
+    """
+    Run a cache invalidation once the current transaction commits
+
+    Clearing a shared cache from a doc_events handler runs before commit, so
+    another worker can re-warm it from the old rows in the meantime and keep
+    them cached. Deferring the clear until after commit closes that window.
+    Frappe versions without commit callbacks run the callback right away.
+
+    Args:
+        callback: Function called without arguments
+    """
+    after_commit = getattr(frappe.db, "after_commit", None)
+    if after_commit is None:
+        callback()
+        return
+    after_commit.add(callback)
+
+
+def get_hash_values(name: str, fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Read many fields of a shared hash with one HMGET
+
+    Args:
+        name: Hash name, without the site prefix
+        fields: Fields to read
+
+    Returns:
+        Dict: Values of the fields present in the hash
+    """
+    fields = list(fields)
+    if not fields:
+        return {}
+
+    cache = frappe.cache()
+    values = cache.hmget(cache.make_key(name), fields)
+    return {
+        field: pickle.loads(value)
+        for field, value in zip(fields, values)
+        if value is not None
+    }
+
+
+def set_hash_values(name: str, mapping: Dict[str, Any], ttl: int) -> None:
+    """
+    Write many fields of a shared hash in one round trip
+
+    Args:
+        name: Hash name, without the site prefix
+        mapping: Values by field
+        ttl: Seconds the hash lives after it is created
+    """
+    if not mapping:
+        return
+
+    cache = frappe.cache()
+    key = cache.make_key(name)
+    pipeline = cache.pipeline()
+    pipeline.hset(key, mapping={field: pickle.dumps(value) for field, value in mapping.items()})
+    pipeline.ttl(key)
+    _, remaining = pipeline.execute()
+
+    # Only a new hash has no expiry; later writes must not extend it
+    if remaining is not None and remaining < 0:
+        cache.expire(key, ttl)
+
+
+def delete_hash_values(name: str, fields: Optional[Iterable[str]] = None) -> None:
+    """
+    Drop fields of a shared hash, or the whole hash when no fields are given
+
+    Args:
+        name: Hash name, without the site prefix
+        fields: Fields to drop
+    """
+    cache = frappe.cache()
+    if fields is None:
+        cache.delete_value(name)
+        return
+
+    fields = list(fields)
+    if fields:
+        # The wrapper's hdel takes one field; a pipeline sends them together
+        pipeline = cache.pipeline()
+        pipeline.hdel(cache.make_key(name), *fields)
+        pipeline.execute()
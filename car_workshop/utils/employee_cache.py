@@ -0,0 +1,52 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Shared cache of the Employee linked to each User.
+
+The mapping is kept in a Redis hash keyed by user, including users without an
+Employee, so repeated lookups cost no query. Any Employee write drops the
+whole hash once the transaction commits, since it may move a user from one
+Employee to another; the hash also expires after USER_EMPLOYEE_TTL.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import frappe
+
+from car_workshop.utils.cache_utils import (
+    delete_hash_values,
+    get_hash_values,
+    run_after_commit,
+    set_hash_values,
+)
+
+USER_EMPLOYEE_KEY = "car_workshop:user_employee"
+
+USER_EMPLOYEE_TTL = 6 * 60 * 60
+
+
+def get_user_employee(user: Optional[str] = None) -> Optional[str]:
+    """
+    Get the Employee linked to a User
+
+    Args:
+        user: User name, defaults to the session user
+
+    Returns:
+        str: Employee name, or None if the User has no Employee
+    """
+    user = user or frappe.session.user
+
+    employee = get_hash_values(USER_EMPLOYEE_KEY, [user]).get(user)
+    if employee is None:
+        employee = frappe.db.get_value("Employee", {"user_id": user}, "name") or ""
+        set_hash_values(USER_EMPLOYEE_KEY, {user: employee}, USER_EMPLOYEE_TTL)
+
+    return employee or None
+
+
+def clear_user_employee_cache(doc=None, method: Optional[str] = None, *args) -> None:
+    """doc_events handler for Employee writes"""
+    run_after_commit(lambda: delete_hash_values(USER_EMPLOYEE_KEY))
@@ -0,0 +1,167 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Per-work-order part movement ledger.
+
+Every submitted or cancelled Workshop Material Issue and Return Material
+appends its rows to Work Order Part Movement and adds the net effect to the
+matching Work Order Part Balance row (one per work order and item code) with
+a single upsert. Issued, returned and consumed quantities are read from the
+balance table, so neither path loads nor saves the Work Order; the consumed
+quantity is also copied onto the Work Order Part rows of the item with one
+UPDATE. A unique key on voucher row and movement type makes a retried or
+concurrent write of the same voucher fail instead of counting it twice.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+from frappe.utils import flt, now
+
+LEDGER_DOCTYPE = "Work Order Part Movement"
+BALANCE_DOCTYPE = "Work Order Part Balance"
+
+# Movement type -> balance column it changes and the sign of the change
+MOVEMENT_EFFECTS = {
+    "Issue": ("issued_qty", 1),
+    "Issue Cancellation": ("issued_qty", -1),
+    "Return": ("returned_qty", 1),
+    "Return Cancellation": ("returned_qty", -1),
+}
+
+LEDGER_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "work_order", "part", "item_code", "work_order_item",
+    "movement_type", "qty", "voucher_type", "voucher_no", "voucher_detail_no",
+)
+
+
+def record_part_movements(voucher, movement_type: str) -> Dict[str, float]:
+    """
+    Append the items of a voucher to the ledger and update the balances
+
+    Args:
+        voucher: Workshop Material Issue or Return Material document
+        movement_type: Issue, Return, Issue Cancellation or Return Cancellation
+
+    Returns:
+        Dict: Mapping of item code to the signed change of its balance; empty
+        if the voucher had no items or was already recorded for this movement
+    """
+    column, sign = MOVEMENT_EFFECTS[movement_type]
+    if not voucher.work_order:
+        return {}
+
+    timestamp = now()
+    user = frappe.session.user
+    ledger_rows = []
+    deltas: Dict[str, Dict[str, Any]] = {}
+
+    for item in voucher.items:
+        if not item.item_code or not flt(item.qty):
+            continue
+
+        ledger_rows.append((
+            frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+            voucher.work_order, item.part, item.item_code,
+            getattr(item, "work_order_item", None),
+            movement_type, flt(item.qty), voucher.doctype, voucher.name, item.name,
+        ))
+
+        delta = deltas.setdefault(item.item_code, {"part": item.part, "qty": 0})
+        delta["qty"] += sign * flt(item.qty)
+
+    if not ledger_rows:
+        return {}
+
+    # Background jobs may be retried; the unique key rejects a voucher that
+    # is already recorded, also while its first write is not yet committed
+    try:
+        frappe.db.bulk_insert(LEDGER_DOCTYPE, LEDGER_FIELDS, ledger_rows)
+    except Exception as e:
+        if not frappe.db.is_duplicate_entry(e):
+            raise
+        return {}
+
+    _upsert_balances(voucher.work_order, column, deltas, timestamp, user)
+    _update_consumed_qty(voucher.work_order, list(deltas))
+
+    return {item_code: delta["qty"] for item_code, delta in deltas.items()}
+
+
+def get_part_balances(work_order: str, item_codes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Read the balances of a work order
+
+    Args:
+        work_order: Work Order name
+        item_codes: Only return these item codes
+
+    Returns:
+        Dict: Mapping of item code to part, issued_qty, returned_qty and
+        consumed_qty (issued less returned)
+    """
+    if not work_order:
+        return {}
+
+    filters = {"work_order": work_order}
+    if item_codes is not None:
+        item_codes = list({code for code in item_codes if code})
+        if not item_codes:
+            return {}
+        filters["item_code"] = ["in", item_codes]
+
+    balances = {}
+    for row in frappe.get_all(
+        BALANCE_DOCTYPE,
+        filters=filters,
+        fields=["item_code", "part", "issued_qty", "returned_qty"],
+    ):
+        row.consumed_qty = flt(row.issued_qty) - flt(row.returned_qty)
+        balances[row.item_code] = row
+
+    return balances
+
+
+def get_balance_name(work_order: str, item_code: str) -> str:
+    """Balance rows are named after their key so that writes can upsert"""
+    return f"{work_order}::{item_code}"
+
+
+def _upsert_balances(work_order, column, deltas, timestamp, user):
+    placeholders = []
+    values = []
+    for item_code, delta in deltas.items():
+        placeholders.append("(%s, %s, %s, %s, %s, 0, %s, %s, %s, %s)")
+        values.extend([
+            get_balance_name(work_order, item_code), timestamp, timestamp, user, user,
+            work_order, item_code, delta["part"], delta["qty"],
+        ])
+
+    # column comes from MOVEMENT_EFFECTS, never from user input
+    frappe.db.sql(f"""
+        INSERT INTO `tab{BALANCE_DOCTYPE}`
+            (name, creation, modified, owner, modified_by, docstatus,
+             work_order, item_code, part, {column})
+        VALUES {", ".join(placeholders)}
+        ON DUPLICATE KEY UPDATE
+            {column} = IFNULL({column}, 0) + VALUES({column}),
+            part = IFNULL(VALUES(part), part),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """, values)
+
+
+def _update_consumed_qty(work_order, item_codes):
+    """Copy issued less returned onto the Work Order Part rows of the items"""
+    frappe.db.sql(f"""
+        UPDATE `tabWork Order Part` wop
+        INNER JOIN `tab{BALANCE_DOCTYPE}` bal
+            ON bal.work_order = wop.parent AND bal.item_code = wop.item_code
+        SET wop.consumed_qty = IFNULL(bal.issued_qty, 0) - IFNULL(bal.returned_qty, 0)
+        WHERE wop.parent = %(work_order)s
+            AND wop.parenttype = 'Work Order'
+            AND wop.item_code IN %(item_codes)s
+    """, {"work_order": work_order, "item_codes": tuple(item_codes)})
@@ -0,0 +1,125 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Lightweight Part snapshots shared by work order and stock documents.
+
+A snapshot holds the few Part fields copied onto transaction rows, so callers
+never load the full Part document and its compatibility table. Snapshots are
+kept for the current request in ``frappe.local`` and across workers in a Redis
+hash; a whole table is read from the hash with one HMGET and its misses are
+loaded with one query and written back in one round trip. Saving or deleting
+a Part drops its snapshot once the transaction commits, and the hash expires
+after PART_SNAPSHOT_TTL.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+
+from car_workshop.utils.cache_utils import (
+    delete_hash_values,
+    get_hash_values,
+    run_after_commit,
+    set_hash_values,
+)
+
+PART_SNAPSHOT_KEY = "car_workshop:part_snapshots"
+
+PART_SNAPSHOT_TTL = 6 * 60 * 60
+
+SNAPSHOT_FIELDS = (
+    "part_number", "part_name", "item_code", "brand", "category",
+    "current_price", "description",
+)
+
+
+def get_part_snapshot(part: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the snapshot of a single Part
+
+    Args:
+        part: Part name
+
+    Returns:
+        Dict: Snapshot fields, or None if the Part does not exist
+    """
+    if not part:
+        return None
+    return get_part_snapshots([part]).get(part)
+
+
+def get_part_snapshots(parts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the snapshots of many Parts, loading all cache misses in one query
+
+    Args:
+        parts: Part names
+
+    Returns:
+        Dict: Mapping of Part name to its snapshot; unknown Parts are left out
+    """
+    parts = {part for part in parts if part}
+    if not parts:
+        return {}
+
+    local_snapshots = _get_request_cache()
+    snapshots = {part: local_snapshots[part] for part in parts if part in local_snapshots}
+
+    shared = get_hash_values(PART_SNAPSHOT_KEY, parts - snapshots.keys())
+    local_snapshots.update(shared)
+    snapshots.update(shared)
+
+    missing = parts - snapshots.keys()
+    if missing:
+        loaded = {
+            row.name: {field: row.get(field) for field in SNAPSHOT_FIELDS}
+            for row in frappe.get_all(
+                "Part",
+                filters={"name": ["in", list(missing)]},
+                fields=["name"] + list(SNAPSHOT_FIELDS),
+            )
+        }
+        set_hash_values(PART_SNAPSHOT_KEY, loaded, PART_SNAPSHOT_TTL)
+        local_snapshots.update(loaded)
+        snapshots.update(loaded)
+
+    return {part: frappe._dict(snapshot) for part, snapshot in snapshots.items()}
+
+
+def get_part_item_codes(parts: Iterable[str]) -> Dict[str, str]:
+    """
+    Get the Item linked to each Part
+
+    Args:
+        parts: Part names
+
+    Returns:
+        Dict: Mapping of Part name to item code, for Parts linked to an Item
+    """
+    return {
+        part: snapshot.item_code
+        for part, snapshot in get_part_snapshots(parts).items()
+        if snapshot.item_code
+    }
+
+
+def clear_part_snapshot(doc, method: Optional[str] = None, *args) -> None:
+    """doc_events handler for Part writes; after_rename also passes the old name"""
+    names = {doc.name}
+    if args:
+        names.add(args[0])
+
+    local_snapshots = _get_request_cache()
+    for name in names:
+        local_snapshots.pop(name, None)
+
+    # Other workers keep the old snapshot until the change is committed
+    run_after_commit(lambda: delete_hash_values(PART_SNAPSHOT_KEY, names))
+
+
+def _get_request_cache() -> Dict[str, Dict[str, Any]]:
+    if getattr(frappe.local, "part_snapshots", None) is None:
+        frappe.local.part_snapshots = {}
+    return frappe.local.part_snapshots
@@ -0,0 +1,241 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Process-local TTL + LRU cache for price lookups.
+
+Entries are keyed by (namespace, reference_type, reference_name, price_list,
+date bucket). Writes to Service Price List and Item Price invalidate the local
+entries and bump a generation counter in the shared cache so that other worker
+processes drop their copies on their next lookup. Invalidation waits for the
+writing transaction to commit, so no worker caches a price that is about to
+change.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+import frappe
+from frappe.utils import getdate
+
+from car_workshop.utils.cache_utils import run_after_commit
+
+DEFAULT_TTL = 300
+DEFAULT_MAXSIZE = 4096
+GENERATION_KEY = "car_workshop:price_cache_generation"
+
+MISSING = object()
+
+
+class PriceCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: int = DEFAULT_TTL, maxsize: int = DEFAULT_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._generation: Any = MISSING
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for key or ``MISSING``"""
+        self._sync_generation()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value for key, evicting the least recently used entries"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(
+        self,
+        reference_type: Optional[str] = None,
+        reference_name: Optional[str] = None,
+        price_list: Optional[str] = None
+    ) -> None:
+        """
+        Drop entries matching all given criteria (everything if none given)
+        and tell other processes to drop theirs.
+        """
+        with self._lock:
+            if not (reference_type or reference_name or price_list):
+                self._data.clear()
+            else:
+                for key in list(self._data):
+                    _, key_type, key_name, key_price_list, _ = key
+                    if reference_type and key_type != reference_type:
+                        continue
+                    if reference_name and key_name != reference_name:
+                        continue
+                    if price_list and key_price_list != price_list:
+                        continue
+                    del self._data[key]
+            self.invalidations += 1
+
+        self._bump_generation()
+
+    def clear(self) -> None:
+        """Drop all local entries and reset counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _sync_generation(self) -> None:
+        """Clear local entries if another process invalidated prices"""
+        generation = _get_shared_generation()
+        if generation == self._generation:
+            return
+
+        with self._lock:
+            if self._generation is not MISSING:
+                self._data.clear()
+            self._generation = generation
+
+    def _bump_generation(self) -> None:
+        shared_cache = _get_shared_cache()
+        if not shared_cache:
+            return
+
+        generation = shared_cache.incr(shared_cache.make_key(GENERATION_KEY))
+        with self._lock:
+            self._generation = generation
+
+
+def _get_shared_cache():
+    get_cache = getattr(frappe, "cache", None)
+    return get_cache() if get_cache else None
+
+
+def _get_shared_generation() -> Optional[int]:
+    shared_cache = _get_shared_cache()
+    if not shared_cache:
+        return None
+    # Stored as a raw counter, so bypass get_value() which unpickles
+    generation = shared_cache.get(shared_cache.make_key(GENERATION_KEY))
+    return int(generation) if generation is not None else None
+
+
+price_cache = PriceCache()
+
+
+def make_key(
+    namespace: str,
+    reference_type: str,
+    reference_name: str,
+    price_list: str,
+    posting_date: Union[str, date]
+) -> Tuple[str, str, str, str, str]:
+    """
+    Build a cache key, bucketing the posting date by day
+
+    Args:
+        namespace: Name of the cached lookup
+        reference_type: Type of reference (Job Type, Part, Service Package)
+        reference_name: Name of the reference
+        price_list: Price list being checked
+        posting_date: Date the price must be valid on
+
+    Returns:
+        Tuple: Cache key
+    """
+    return (namespace, reference_type, reference_name, price_list, str(getdate(posting_date)))
+
+
+def cached_price(namespace: str, reference_type: str, reference_name: str,
+                 price_list: str, posting_date: Union[str, date], loader) -> Any:
+    """
+    Return the cached price for the given reference, calling loader on a miss.
+    Dict results are copied so callers cannot mutate the cached entry.
+
+    Args:
+        namespace: Name of the cached lookup
+        reference_type: Type of reference (Job Type, Part, Service Package)
+        reference_name: Name of the reference
+        price_list: Price list being checked
+        posting_date: Date the price must be valid on
+        loader: Callable returning the uncached value
+
+    Returns:
+        Any: The price data returned by loader
+    """
+    key = make_key(namespace, reference_type, reference_name, price_list, posting_date)
+    value = price_cache.get(key)
+    if value is MISSING:
+        value = loader()
+        price_cache.set(key, value)
+
+    return dict(value) if isinstance(value, dict) else value
+
+
+def on_service_price_list_change(doc, method: Optional[str] = None) -> None:
+    """doc_events handler for Service Price List writes"""
+    references = {(doc.reference_type, doc.reference_name)}
+
+    before = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if before:
+        references.add((before.reference_type, before.reference_name))
+
+    def invalidate():
+        for reference_type, reference_name in references:
+            price_cache.invalidate(reference_type=reference_type, reference_name=reference_name)
+
+    run_after_commit(invalidate)
+
+
+def on_item_price_change(doc, method: Optional[str] = None) -> None:
+    """doc_events handler for Item Price writes"""
+    price_lists = {doc.price_list}
+
+    before = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if before:
+        price_lists.add(before.price_list)
+
+    def invalidate():
+        for price_list in price_lists:
+            price_cache.invalidate(price_list=price_list)
+
+    run_after_commit(invalidate)
+
+
+@frappe.whitelist()
+def get_price_cache_stats() -> Dict[str, Any]:
+    """Expose price cache hit/miss counters for this worker process"""
+    frappe.only_for("System Manager")
+    return price_cache.stats()
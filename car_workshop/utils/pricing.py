@@ -1,7 +1,7 @@
 # Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
 # For license information, please see license.txt
 
-from typing import Dict, Optional, Any, Union
+from typing import Dict, Iterable, List, Optional, Any, Tuple, Union
 from datetime import date
 import frappe
 from frappe.utils import flt, getdate
@@ -78,3 +78,197 @@ def resolve_rate(
 
     return None
 
+
+
+def resolve_rates_bulk(
+    references: Iterable[Tuple[str, str]],
+    price_list: str,
+    posting_date: Optional[Union[str, date]] = None
+) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+    """
+    Resolve rates for many references at once using the same priority as
+    ``resolve_rate``, with a fixed number of queries regardless of how many
+    references are passed.
+
+    Args:
+        references: Iterable of (reference_type, reference_name) pairs
+        price_list: Price list to check
+        posting_date: Date for validity check (defaults to today)
+
+    Returns:
+        Dict: Mapping of (reference_type, reference_name) to the same dict
+        ``resolve_rate`` would return for that pair, or None if no price found
+    """
+    if not posting_date:
+        posting_date = getdate()
+
+    keys = list(dict.fromkeys(
+        (reference_type, reference_name)
+        for reference_type, reference_name in references or []
+        if reference_type and reference_name
+    ))
+    result: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {key: None for key in keys}
+
+    if not keys or not price_list:
+        return result
+
+    # Linked Items, one query per reference type
+    names_by_type: Dict[str, List[str]] = {}
+    for reference_type, reference_name in keys:
+        names_by_type.setdefault(reference_type, []).append(reference_name)
+
+    item_by_key: Dict[Tuple[str, str], str] = {}
+    for reference_type, names in names_by_type.items():
+        for row in frappe.get_all(
+            reference_type,
+            filters={"name": ["in", names]},
+            fields=["name", "item"],
+        ):
+            if row.item:
+                item_by_key[(reference_type, row.name)] = row.item
+
+    # Item Prices and default tax templates for all linked Items
+    item_prices = get_item_prices_bulk(set(item_by_key.values()), price_list, posting_date)
+    tax_templates = get_default_item_tax_templates(list(item_prices))
+
+    for key, item_code in item_by_key.items():
+        item_price = item_prices.get(item_code)
+        if item_price:
+            result[key] = {
+                "rate": flt(item_price.price_list_rate),
+                "currency": item_price.currency,
+                "tax_template": tax_templates.get(item_code),
+                "source": "Item Price",
+            }
+
+    # Fallback to Service Price List for whatever is still unresolved
+    pending = [key for key in keys if result[key] is None]
+    service_prices = get_service_prices_bulk(pending, price_list, posting_date)
+    for key in pending:
+        service_price = service_prices.get(key)
+        if service_price:
+            result[key] = {
+                "rate": flt(service_price.rate),
+                "currency": service_price.currency,
+                "source": "Service Price List",
+                "tax_template": service_price.tax_template,
+                "found": True,
+            }
+
+    return result
+
+
+def get_item_prices_bulk(
+    item_codes: Iterable[str],
+    price_list: str,
+    posting_date: Union[str, date]
+) -> Dict[str, Any]:
+    """
+    Get the selling Item Price valid on posting_date for each item code
+
+    Args:
+        item_codes: Item codes to look up
+        price_list: Price list to check
+        posting_date: Date for validity check
+
+    Returns:
+        Dict: Mapping of item code to its Item Price row (price_list_rate, currency)
+    """
+    item_codes = [code for code in item_codes if code]
+    if not item_codes:
+        return {}
+
+    rows = frappe.get_all(
+        "Item Price",
+        filters={
+            "item_code": ["in", item_codes],
+            "price_list": price_list,
+            "selling": 1,
+        },
+        or_filters=[
+            {"valid_from": ["<=", posting_date], "valid_upto": [">=", posting_date]},
+            {"valid_from": ["<=", posting_date], "valid_upto": ["is", "null"]},
+            {"valid_from": ["is", "null"], "valid_upto": [">=", posting_date]},
+            {"valid_from": ["is", "null"], "valid_upto": ["is", "null"]},
+        ],
+        fields=["item_code", "price_list_rate", "currency"],
+        order_by="valid_from desc, creation desc",
+    )
+
+    # Rows are ordered by priority, keep the first one per item
+    prices: Dict[str, Any] = {}
+    for row in rows:
+        prices.setdefault(row.item_code, row)
+    return prices
+
+
+def get_default_item_tax_templates(item_codes: Iterable[str]) -> Dict[str, str]:
+    """
+    Get the default Item Tax Template for each item code
+
+    Args:
+        item_codes: Item codes to look up
+
+    Returns:
+        Dict: Mapping of item code to its default tax template
+    """
+    item_codes = [code for code in item_codes if code]
+    if not item_codes:
+        return {}
+
+    templates: Dict[str, str] = {}
+    for row in frappe.get_all(
+        "Item Tax Template Item",
+        filters={"parent": ["in", item_codes], "is_default": 1},
+        fields=["parent", "item_tax_template"],
+    ):
+        if row.item_tax_template:
+            templates.setdefault(row.parent, row.item_tax_template)
+    return templates
+
+
+def get_service_prices_bulk(
+    references: Iterable[Tuple[str, str]],
+    price_list: str,
+    posting_date: Union[str, date]
+) -> Dict[Tuple[str, str], Any]:
+    """
+    Get the active Service Price List entry valid on posting_date for each reference
+
+    Args:
+        references: (reference_type, reference_name) pairs to look up
+        price_list: Price list to check
+        posting_date: Date for validity check
+
+    Returns:
+        Dict: Mapping of (reference_type, reference_name) to its Service Price List row
+    """
+    references = set(references)
+    if not references:
+        return {}
+
+    rows = frappe.get_all(
+        "Service Price List",
+        filters={
+            "reference_type": ["in", list({ref[0] for ref in references})],
+            "reference_name": ["in", list({ref[1] for ref in references})],
+            "price_list": price_list,
+            "is_active": 1,
+        },
+        or_filters=[
+            {"valid_from": ["is", "null"], "valid_upto": ["is", "null"]},
+            {"valid_from": ["<=", posting_date], "valid_upto": ["is", "null"]},
+            {"valid_from": ["is", "null"], "valid_upto": [">=", posting_date]},
+            {"valid_from": ["<=", posting_date], "valid_upto": [">=", posting_date]},
+        ],
+        fields=["reference_type", "reference_name", "rate", "currency", "tax_template"],
+        order_by="valid_from desc, creation desc",
+    )
+
+    prices: Dict[Tuple[str, str], Any] = {}
+    for row in rows:
+        key = (row.reference_type, row.reference_name)
+        # The IN filters are a cross product, drop pairs that were not requested
+        if key in references:
+            prices.setdefault(key, row)
+    return prices
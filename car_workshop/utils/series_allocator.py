@@ -0,0 +1,245 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Naming series numbers handed out from blocks reserved per worker process.
+
+``make_autoname`` locks the ``tabSeries`` row of a series for every insert
+until the transaction commits, so concurrent inserts queue on it. With a block
+size configured, a worker instead reserves ``block_size`` numbers at once from
+a counter in the shared cache and hands them out locally. The counter is
+seeded from ``tabSeries`` and the highest existing name.
+
+The first insert from a block raises ``tabSeries.current`` to the end of the
+block in its own transaction, so the series row is locked once per block
+rather than once per insert. If the cache is flushed while workers hold
+blocks, the counter is reseeded past every block handed out: the seed reads
+``tabSeries`` with ``FOR UPDATE`` and waits for raises not yet committed, and
+a raise that rolls back is made again by the next insert from its block.
+
+A block size of 1 calls ``make_autoname`` after raising ``tabSeries.current``
+to the counter, to switch a series back from blocks. A block size of 0 leaves
+the shared cache out and only calls ``make_autoname``.
+
+Gaps: a number whose transaction rolls back is returned to the worker and
+handed out again before the rest of its block. Every block a worker holds is
+recorded in a shared hash of open blocks. A worker that exits normally pushes
+the numbers it did not use to a shared list of free ranges, which the next
+reservation takes before growing the counter. Blocks of a worker that was
+killed stay in the open blocks hash, the record of ranges that may have been
+skipped.
+"""
+
+from __future__ import annotations
+
+import atexit
+import heapq
+import os
+import socket
+import threading
+from typing import Any, Dict, List, Tuple
+
+import frappe
+from frappe.model.naming import make_autoname, parse_naming_series
+
+COUNTER_KEY = "car_workshop:series_counter"
+FREE_RANGES_KEY = "car_workshop:series_free_ranges"
+OPEN_BLOCKS_KEY = "car_workshop:series_open_blocks"
+
+# A worker may serve several sites, so state is kept per site and prefix
+# (site, prefix) -> block held by this process
+_blocks: Dict[Tuple[str, str], Dict[str, Any]] = {}
+# (site, prefix) -> heap of numbers released by rolled back transactions
+_released: Dict[Tuple[str, str], List[int]] = {}
+# (site, prefix) -> counter value tabSeries was last raised to by this process
+_synced: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+
+def make_series_name(doctype: str, series: str, digits: int = 4, block_size: int = 0) -> str:
+    """
+    Get the next name of a naming series
+
+    Args:
+        doctype: DocType named by the series, used to seed the counter
+        series: Series without the counter, e.g. "WO-.YYYY.-."
+        digits: Zero padding of the counter
+        block_size: Numbers reserved per worker; 1 uses make_autoname after
+            catching tabSeries up with the counter, 0 uses make_autoname only
+
+    Returns:
+        str: Document name
+    """
+    digits = max(digits, 1)
+    if block_size <= 0:
+        return make_autoname(series + "#" * digits)
+
+    prefix = parse_naming_series(series)
+    if block_size == 1:
+        _sync_series(doctype, prefix)
+        return make_autoname(series + "#" * digits)
+
+    number, last = _next_number(doctype, prefix, block_size)
+    _raise_series(prefix, last)
+    _release_on_rollback(prefix, number)
+    return f"{prefix}{number:0{digits}d}"
+
+
+def _next_number(doctype: str, prefix: str, block_size: int) -> Tuple[int, int]:
+    """Next number of this process and the end of the block it came from"""
+    slot = (frappe.local.site, prefix)
+    with _lock:
+        block = _blocks.get(slot)
+        released = _released.get(slot)
+        if released:
+            number = heapq.heappop(released)
+            return number, block["last"] if block else number
+
+        if not block or block["next"] > block["last"]:
+            if block:
+                _close_block(block)
+            block = _blocks[slot] = _reserve_block(doctype, prefix, block_size)
+
+        number = block["next"]
+        block["next"] += 1
+        return number, block["last"]
+
+
+def _reserve_block(doctype: str, prefix: str, block_size: int) -> Dict[str, Any]:
+    """Reserve a free range or the next block_size numbers of a series for this process"""
+    cache = frappe.cache()
+    counter_key = cache.make_key(f"{COUNTER_KEY}:{prefix}")
+    free_key = cache.make_key(f"{FREE_RANGES_KEY}:{prefix}")
+    open_key = cache.make_key(f"{OPEN_BLOCKS_KEY}:{prefix}")
+
+    # The wrapper's list commands prefix the key again; a pipeline is raw
+    pipeline = cache.pipeline()
+    pipeline.lpop(free_key)
+    (free_range,) = pipeline.execute()
+
+    if free_range:
+        first, last = _parse_range(free_range)
+    else:
+        if cache.get(counter_key) is None:
+            # Only the first worker to get here seeds the counter
+            cache.set(counter_key, _get_high_watermark(doctype, prefix), nx=True)
+        last = cache.incrby(counter_key, block_size)
+        first = last - block_size + 1
+
+    block = {
+        "next": first,
+        "last": last,
+        "free_key": free_key,
+        "open_key": open_key,
+        "field": f"{socket.gethostname()}:{os.getpid()}:{first}",
+    }
+    pipeline = cache.pipeline()
+    pipeline.hset(open_key, block["field"], f"{first}-{last}")
+    pipeline.execute()
+    return block
+
+
+def _close_block(block: Dict[str, Any]) -> None:
+    """Drop the open block record of a block that was used up"""
+    pipeline = frappe.cache().pipeline()
+    pipeline.hdel(block["open_key"], block["field"])
+    pipeline.execute()
+
+
+def _sync_series(doctype: str, prefix: str) -> None:
+    """Raise tabSeries past every number the counter handed out before make_autoname continues"""
+    cache = frappe.cache()
+    counter = cache.get(cache.make_key(f"{COUNTER_KEY}:{prefix}"))
+
+    if counter is None:
+        # No blocks were reserved since the cache was cleared; check the names once
+        if (frappe.local.site, prefix) in _synced:
+            return
+        current = _get_high_watermark(doctype, prefix)
+    else:
+        current = int(counter)
+
+    _raise_series(prefix, current)
+
+
+def _raise_series(prefix: str, current: int) -> None:
+    """Raise tabSeries.current to a number, once per number and process"""
+    slot = (frappe.local.site, prefix)
+    if _synced.get(slot, -1) >= current:
+        return
+
+    frappe.db.sql("""
+        INSERT INTO `tabSeries` (name, current)
+        VALUES (%(prefix)s, %(current)s)
+        ON DUPLICATE KEY UPDATE current = GREATEST(current, VALUES(current))
+    """, {"prefix": prefix, "current": current})
+    _synced[slot] = current
+
+    # The raise is part of the caller's transaction; redo it after a rollback
+    after_rollback = getattr(frappe.db, "after_rollback", None)
+    if after_rollback is not None:
+        after_rollback.add(lambda: _synced.pop(slot, None))
+
+
+def _get_high_watermark(doctype: str, prefix: str) -> int:
+    """Highest number of a series already used, by the counter or by a name"""
+    # Waits for blocks whose tabSeries raise has not committed yet
+    current = frappe.db.sql(
+        "SELECT current FROM `tabSeries` WHERE name = %(prefix)s FOR UPDATE", {"prefix": prefix}
+    )
+    used = frappe.db.sql(f"""
+        SELECT MAX(CAST(SUBSTRING(name, %(start)s) AS UNSIGNED))
+        FROM `tab{doctype}`
+        WHERE name LIKE %(pattern)s
+    """, {
+        "start": len(prefix) + 1,
+        "pattern": prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+    })
+    return max(
+        int(current[0][0] or 0) if current else 0,
+        int(used[0][0] or 0) if used else 0,
+    )
+
+
+def _release_on_rollback(prefix: str, number: int) -> None:
+    after_rollback = getattr(frappe.db, "after_rollback", None)
+    if after_rollback is None:
+        return
+
+    slot = (frappe.local.site, prefix)
+
+    def release():
+        with _lock:
+            heapq.heappush(_released.setdefault(slot, []), number)
+
+    after_rollback.add(release)
+
+
+def _parse_range(value) -> Tuple[int, int]:
+    if isinstance(value, bytes):
+        value = value.decode()
+    first, last = value.split("-")
+    return int(first), int(last)
+
+
+@atexit.register
+def _return_unused_numbers() -> None:
+    """Push the numbers this process did not hand out to the shared free ranges"""
+    with _lock:
+        if not _blocks:
+            return
+
+        try:
+            pipeline = frappe.cache().pipeline()
+            for slot, block in _blocks.items():
+                for number in _released.get(slot, []):
+                    pipeline.rpush(block["free_key"], f"{number}-{number}")
+                if block["next"] <= block["last"]:
+                    pipeline.rpush(block["free_key"], f"{block['next']}-{block['last']}")
+                pipeline.hdel(block["open_key"], block["field"])
+            pipeline.execute()
+        except Exception:
+            # The blocks stay listed in the open blocks hash
+            return
+
+        _blocks.clear()
+        _released.clear()
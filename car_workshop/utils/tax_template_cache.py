@@ -0,0 +1,120 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Shared cache of Sales/Purchase Taxes and Charges Template rows.
+
+Tax rows are stored in a Redis hash keyed by template DocType and name, so all
+workers share one copy. Saving or deleting a template drops its entry once the
+write commits, and the hash expires after TAX_TEMPLATE_CACHE_TTL seconds.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import frappe
+
+from car_workshop.utils.cache_utils import (
+    delete_hash_values,
+    get_hash_values,
+    run_after_commit,
+    set_hash_values,
+)
+
+TAX_TEMPLATE_CACHE_KEY = "car_workshop:tax_templates"
+TAX_TEMPLATE_CACHE_TTL = 6 * 60 * 60
+
+# Template DocType -> child DocType holding its tax rows
+TAX_CHILD_DOCTYPES = {
+    "Sales Taxes and Charges Template": "Sales Taxes and Charges",
+    "Purchase Taxes and Charges Template": "Purchase Taxes and Charges",
+}
+
+TAX_FIELDS = [
+    "charge_type", "row_id", "account_head", "description",
+    "included_in_print_rate", "cost_center", "rate",
+]
+
+PURCHASE_TAX_FIELDS = TAX_FIELDS + ["category", "add_deduct_tax"]
+
+
+def get_template_taxes(template_doctype: str, template_name: str) -> List[Dict[str, Any]]:
+    """
+    Get the tax rows of a single template
+
+    Args:
+        template_doctype: Sales or Purchase Taxes and Charges Template
+        template_name: Name of the template
+
+    Returns:
+        List: Tax rows in template order, safe for the caller to modify
+    """
+    if not template_name:
+        return []
+    return get_templates_taxes(template_doctype, [template_name]).get(template_name, [])
+
+
+def get_templates_taxes(
+    template_doctype: str,
+    template_names: Iterable[str]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get the tax rows of many templates, loading all cache misses in one query
+
+    Args:
+        template_doctype: Sales or Purchase Taxes and Charges Template
+        template_names: Names of the templates
+
+    Returns:
+        Dict: Mapping of template name to its tax rows
+    """
+    template_names = {name for name in template_names if name}
+    if not template_names:
+        return {}
+
+    cached = get_hash_values(
+        TAX_TEMPLATE_CACHE_KEY, [_cache_field(template_doctype, name) for name in template_names]
+    )
+    taxes: Dict[str, List[Dict[str, Any]]] = {}
+    missing = []
+
+    for name in template_names:
+        rows = cached.get(_cache_field(template_doctype, name))
+        if rows is None:
+            missing.append(name)
+        else:
+            taxes[name] = rows
+
+    if missing:
+        loaded: Dict[str, List[Dict[str, Any]]] = {name: [] for name in missing}
+        fields = PURCHASE_TAX_FIELDS if template_doctype.startswith("Purchase") else TAX_FIELDS
+        for tax in frappe.get_all(
+            TAX_CHILD_DOCTYPES[template_doctype],
+            filters={"parent": ["in", missing], "parenttype": template_doctype},
+            fields=["parent"] + fields,
+            order_by="idx asc",
+        ):
+            parent = tax.pop("parent")
+            loaded[parent].append(dict(tax))
+
+        set_hash_values(
+            TAX_TEMPLATE_CACHE_KEY,
+            {_cache_field(template_doctype, name): rows for name, rows in loaded.items()},
+            TAX_TEMPLATE_CACHE_TTL,
+        )
+        taxes.update(loaded)
+
+    return {
+        name: [frappe._dict(row) for row in rows]
+        for name, rows in taxes.items()
+    }
+
+
+def clear_tax_template_cache(doc, method: Optional[str] = None) -> None:
+    """doc_events handler for tax template writes; clears once the write commits"""
+    field = _cache_field(doc.doctype, doc.name)
+    run_after_commit(lambda: delete_hash_values(TAX_TEMPLATE_CACHE_KEY, [field]))
+
+
+def _cache_field(template_doctype: str, template_name: str) -> str:
+    return f"{template_doctype}::{template_name}"
@@ -0,0 +1,133 @@
+# Copyright (c) 2023, PT. Innovasi Terbaik Bangsa and contributors
+# For license information, please see license.txt
+
+"""Compiled per-DocType plans for the global validate_mandatory_fields hook.
+
+A plan lists only the mandatory and numeric fields of a DocType and whether
+the DocType is validated at all, so the hook does not walk every field of
+every document. Plans are kept per worker process and site and rebuilt when
+the DocType's meta changes. Customisations (Custom Field, Property Setter) do
+not change the meta's modified time, so once they commit they bump a
+generation counter in the site's cache and every worker drops its plans.
+
+DocTypes are opted out through the ``validate_mandatory_fields_exclude`` hook.
+An app may restrict validation to a set of DocTypes through the
+``validate_mandatory_fields_include`` hook; when no app sets it, every
+DocType not excluded is validated.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import frappe
+
+from car_workshop.utils.cache_utils import run_after_commit
+
+GENERATION_KEY = "car_workshop:validator_plan_generation"
+
+NUMERIC_FIELDTYPES = frozenset({"Currency", "Int", "Float"})
+
+
+class ValidatorPlan:
+    """Fields of one DocType checked by validate_mandatory_fields"""
+
+    __slots__ = ("enabled", "mandatory", "numeric", "track_version")
+
+    def __init__(self, enabled=True, mandatory=(), numeric=(), track_version=False):
+        self.enabled = enabled
+        # (fieldname, label) pairs
+        self.mandatory: Tuple[Tuple[str, str], ...] = tuple(mandatory)
+        self.numeric: Tuple[Tuple[str, str], ...] = tuple(numeric)
+        self.track_version = track_version
+
+    @classmethod
+    def compile(cls, meta) -> "ValidatorPlan":
+        """Build the plan of a DocType from its meta"""
+        if not is_validated_doctype(meta.name):
+            return cls(enabled=False)
+
+        mandatory = []
+        numeric = []
+        for df in meta.get("fields", []):
+            if df.get("reqd"):
+                mandatory.append((df.fieldname, df.label))
+            if df.fieldtype in NUMERIC_FIELDTYPES:
+                numeric.append((df.fieldname, df.label))
+
+        return cls(
+            mandatory=mandatory,
+            numeric=numeric,
+            track_version=any(df.fieldname == "version" for df in meta.get("fields", [])),
+        )
+
+
+# A worker may serve several sites, so plans are kept per site
+# site -> DocType -> (meta signature, plan)
+_plans: Dict[str, Dict[str, Tuple[Tuple[Any, ...], ValidatorPlan]]] = {}
+# site -> generation the site's plans were compiled under
+_generations: Dict[str, Any] = {}
+
+
+def get_validator_plan(meta) -> ValidatorPlan:
+    """
+    Get the compiled plan of a DocType, compiling it on first use
+
+    Args:
+        meta: Meta of the DocType being validated
+
+    Returns:
+        ValidatorPlan: Plan for the DocType
+    """
+    _sync_generation()
+
+    plans = _plans.setdefault(frappe.local.site, {})
+    signature = (meta.get("modified"), len(meta.get("fields", [])))
+    cached = plans.get(meta.name)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    plan = ValidatorPlan.compile(meta)
+    plans[meta.name] = (signature, plan)
+    return plan
+
+
+def is_validated_doctype(doctype: str) -> bool:
+    """Whether validate_mandatory_fields applies to a DocType"""
+    if doctype in frappe.get_hooks("validate_mandatory_fields_exclude"):
+        return False
+
+    include = frappe.get_hooks("validate_mandatory_fields_include")
+    return not include or doctype in include
+
+
+def clear_validator_plans(doc=None, method: Optional[str] = None) -> None:
+    """doc_events handler for Custom Field and Property Setter writes"""
+    site = frappe.local.site
+    _plans.pop(site, None)
+
+    def bump_generation():
+        # Plans compiled before the commit still see the old meta
+        _plans.pop(site, None)
+        cache = frappe.cache()
+        _generations[site] = cache.incr(cache.make_key(GENERATION_KEY))
+
+    run_after_commit(bump_generation)
+
+
+def _sync_generation() -> None:
+    """Drop local plans if another process cleared them, once per request"""
+    if getattr(frappe.local, "validator_plan_generation_checked", False):
+        return
+
+    cache = frappe.cache()
+    # Stored as a raw counter, so bypass get_value() which unpickles
+    generation = cache.get(cache.make_key(GENERATION_KEY))
+    generation = int(generation) if generation is not None else None
+
+    site = frappe.local.site
+    if generation != _generations.get(site):
+        _plans.pop(site, None)
+        _generations[site] = generation
+
+    frappe.local.validator_plan_generation_checked = True
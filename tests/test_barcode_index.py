@@ -0,0 +1,164 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+class FakeRedis:
+    """Minimal stand-in for the raw hash commands used on frappe.cache()."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+        self.round_trips = 0
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def hmget(self, key, fields):
+        self.round_trips += 1
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def expire(self, key, ttl):
+        self.round_trips += 1
+        self.expiry[key] = ttl
+
+    def delete_value(self, name):
+        self.round_trips += 1
+        self.hashes.pop(self.make_key(name), None)
+        self.expiry.pop(self.make_key(name), None)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping):
+        self.commands.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def ttl(self, key):
+        self.commands.append(lambda: self.redis.expiry.get(key, -1))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [command() for command in self.commands]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+def setup_frappe_stub(part_fields=("barcode",)):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+    frappe.redis = FakeRedis()
+    frappe.cache = lambda: frappe.redis
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(
+        has_field=lambda fieldname: fieldname in part_fields
+    )
+
+    def sql(query, *args, **kwargs):
+        frappe.queries.append(query)
+        if "tabItem Barcode" in query:
+            return [
+                AttrDict(barcode="111", name="PART-A", part_name="Oil Filter", uom=None),
+                AttrDict(barcode="222", name="PART-B", part_name="Air Filter", uom=None),
+            ]
+        return [
+            AttrDict(barcode="222", name="PART-C", part_name="Shadowed", uom=None),
+            AttrDict(barcode="333", name="PART-C", part_name="Spark Plug", uom=None),
+        ]
+
+    frappe.db = types.SimpleNamespace(sql=sql, after_commit=CallbackManager())
+
+    utils = types.ModuleType("frappe.utils")
+    utils.fmt_money = lambda value, precision, symbol="": f"{symbol}{value}"
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    return frappe
+
+
+def import_barcode_index():
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.barcode_index", None)
+    return importlib.import_module("car_workshop.utils.barcode_index")
+
+
+def test_index_is_built_once_and_shared_across_lookups():
+    frappe = setup_frappe_stub()
+    module = import_barcode_index()
+
+    assert module.get_part_by_barcode("111") == {
+        "part": "PART-A", "part_name": "Oil Filter", "uom": "Pcs"
+    }
+    assert len(frappe.queries) == 2
+
+    results = module.get_parts_by_barcodes(["222", "333", "999", "222"])
+    assert results["222"]["part"] == "PART-B"
+    assert results["333"]["part"] == "PART-C"
+    assert results["999"] == {}
+    assert len(results) == 3
+    assert len(frappe.queries) == 2
+
+
+def test_part_barcode_lookup_skipped_without_field():
+    frappe = setup_frappe_stub(part_fields=())
+    module = import_barcode_index()
+
+    assert module.get_part_by_barcode("333") == {}
+    assert len(frappe.queries) == 1
+
+
+def test_clear_barcode_index_forces_rebuild():
+    frappe = setup_frappe_stub()
+    module = import_barcode_index()
+
+    module.get_part_by_barcode("111")
+    module.clear_barcode_index(types.SimpleNamespace(doctype="Item", name="ITEM-A"))
+
+    # The index survives until the transaction commits
+    module.get_part_by_barcode("111")
+    assert len(frappe.queries) == 2
+
+    frappe.db.after_commit.run()
+    module.get_part_by_barcode("111")
+
+    assert len(frappe.queries) == 4
+
+
+def test_lookup_reads_all_barcodes_in_one_round_trip_and_sets_expiry():
+    frappe = setup_frappe_stub()
+    module = import_barcode_index()
+    module.warm_barcode_index()
+
+    key = frappe.redis.make_key(module.BARCODE_INDEX_KEY)
+    assert frappe.redis.expiry[key] == module.BARCODE_INDEX_TTL
+
+    frappe.redis.round_trips = 0
+    results = module.get_parts_by_barcodes(["111", "222", "333", "999"])
+
+    assert frappe.redis.round_trips == 1
+    assert results["333"]["part"] == "PART-C"
+    assert results["999"] == {}
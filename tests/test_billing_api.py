@@ -1,3 +1,4 @@
+import re
 import sys
 import types
 from pathlib import Path
@@ -13,25 +14,51 @@ def identity_decorator(*args, **kwargs):
     return wrapper
 
 
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
 def build_frappe_stub():
     PermissionError = type("PermissionError", (Exception,), {})
 
-    utils = types.SimpleNamespace(flt=float, nowdate=lambda: "2024-01-01")
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda value: float(value or 0)
+    utils.nowdate = lambda: "2024-01-01"
+    utils.getdate = lambda value=None: value or "2024-01-01"
+    utils.fmt_money = lambda value, precision, symbol="": f"{symbol}{value}"
 
     def throw(msg, exc=None):
         raise (exc or Exception)(msg)
 
-    frappe_stub = types.SimpleNamespace(
-        db=types.SimpleNamespace(get_value=lambda *a, **k: None),
-        get_all=lambda *a, **k: [],
-        get_doc=lambda *a, **k: types.SimpleNamespace(),
-        has_permission=lambda *a, **k: True,
-        whitelist=identity_decorator,
-        _=lambda m: m,
-        throw=throw,
-        PermissionError=PermissionError,
-        utils=utils,
+    frappe_stub = types.ModuleType("frappe")
+    frappe_stub.db = types.SimpleNamespace(
+        get_value=lambda *a, **k: None,
+        sql=lambda *a, **k: [],
     )
+    frappe_stub.get_all = lambda *a, **k: []
+    frappe_stub.get_doc = lambda *a, **k: types.SimpleNamespace()
+    frappe_stub.has_permission = lambda *a, **k: True
+    frappe_stub.whitelist = identity_decorator
+    frappe_stub._ = lambda m: m
+    frappe_stub.throw = throw
+    frappe_stub.PermissionError = PermissionError
+    frappe_stub.utils = utils
+
+    mapper = types.ModuleType("frappe.model.mapper")
+    mapper.get_mapped_doc = lambda *a, **k: None
+    mapper.map_doc = lambda *a, **k: None
+    document = types.ModuleType("frappe.model.document")
+    document.Document = object
+    model = types.ModuleType("frappe.model")
+    model.mapper = mapper
+    model.document = document
+    frappe_stub.model = model
+
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.mapper"] = mapper
+    sys.modules["frappe.model.document"] = document
     return frappe_stub
 
 
@@ -40,36 +67,95 @@ def setup_module(module):
     sys.modules['frappe'] = frappe_stub
     module.frappe_stub = frappe_stub
 
+    for name in ("car_workshop.utils", "car_workshop.utils.pricing", "car_workshop.api.billing_api"):
+        sys.modules.pop(name, None)
     from car_workshop.api import billing_api
 
     module.api = billing_api
 
 
-def test_get_work_order_billing_source_returns_items():
-    class WorkOrderDoc:
-        status = "Completed"
-        billing_status = "Unbilled"
-        posting_date = "2024-03-01"
+class WorkOrderDoc:
+    status = "Completed"
+    billing_status = "Unbilled"
+    posting_date = "2024-03-01"
 
-        def check_permission(self, perm):
-            return None
+    def check_permission(self, perm):
+        return None
 
-    frappe_stub.get_doc = lambda *a, **k: WorkOrderDoc()
-    frappe_stub.has_permission = lambda *a, **k: True
+
+def install_work_order(rows_by_doctype, linked_items=None):
+    """Serve the given child rows and record every query issued."""
+    queries = []
 
     def db_get_value(doctype, name, fieldname=None):
+        queries.append(("get_value", doctype))
         if doctype == "Selling Settings":
             return "Standard Selling"
-        return "ITEM-001"
+        return None
 
+    def db_sql(query, values=None, as_dict=False):
+        child_doctype = re.search(r"FROM `tab(.+?)` child", query).group(1)
+        queries.append(("sql", child_doctype))
+        # Rows are filtered on the linked Item in SQL, not returned with it
+        assert "SELECT child." in query and "link.item AS" not in query
+        return [AttrDict(row) for row in rows_by_doctype.get(child_doctype, [])]
+
+    def get_all(doctype, *args, **kwargs):
+        queries.append(("get_all", doctype))
+        if doctype in rows_by_doctype:
+            return [AttrDict(row) for row in rows_by_doctype[doctype]]
+        if doctype in ("Job Type", "Service Package", "Part"):
+            names = kwargs["filters"]["name"][1]
+            return [AttrDict(name=name, item=f"ITEM-{name}") for name in names]
+        if doctype == "Service Price List":
+            return [
+                AttrDict(
+                    reference_type="Part",
+                    reference_name=name,
+                    rate=25,
+                    currency="IDR",
+                    tax_template=None,
+                )
+                for name in kwargs["filters"]["reference_name"][1]
+            ]
+        return []
+
+    frappe_stub.get_doc = lambda *a, **k: WorkOrderDoc()
+    frappe_stub.has_permission = lambda *a, **k: True
     frappe_stub.db.get_value = db_get_value
+    frappe_stub.db.sql = db_sql
+    frappe_stub.get_all = get_all
+    return queries
+
 
-    frappe_stub.get_all = lambda doctype, *a, **k: {
-        "Work Order Job Type": [types.SimpleNamespace(job_type="JT", job_type_name="Job", hours=2, rate=100, amount=0)],
-        "Work Order Service Package": [types.SimpleNamespace(service_package="SP", service_package_name="Pack", quantity=1, rate=200, amount=0)],
-        "Work Order Part": [types.SimpleNamespace(part="PT", part_name="Part", quantity=2, rate=50, amount=0)],
-        "Work Order External Service": [types.SimpleNamespace(service_name="Cleaning", provider="Vendor", rate=30, amount=0)],
-    }[doctype]
+def build_rows(count, rate=100):
+    return {
+        "Work Order Job Type": [
+            dict(job_type=f"JT-{i}", job_type_name="Job", hours=2, rate=rate, amount=0)
+            for i in range(count)
+        ],
+        "Work Order Service Package": [
+            dict(service_package=f"SP-{i}", service_package_name="Pack", quantity=1, rate=rate, amount=0)
+            for i in range(count)
+        ],
+        "Work Order Part": [
+            dict(part=f"PT-{i}", part_name="Part", quantity=2, rate=rate, amount=0)
+            for i in range(count)
+        ],
+        "Work Order External Service": [
+            dict(service_name="Cleaning", provider="Vendor", rate=30, amount=0)
+            for i in range(count)
+        ],
+    }
+
+
+def test_get_work_order_billing_source_returns_items():
+    install_work_order({
+        "Work Order Job Type": [dict(job_type="JT", job_type_name="Job", hours=2, rate=100, amount=0)],
+        "Work Order Service Package": [dict(service_package="SP", service_package_name="Pack", quantity=1, rate=200, amount=0)],
+        "Work Order Part": [dict(part="PT", part_name="Part", quantity=2, rate=50, amount=0)],
+        "Work Order External Service": [dict(service_name="Cleaning", provider="Vendor", rate=30, amount=0)],
+    })
 
     data = api.get_work_order_billing_source("WO-1")
     assert set(data.keys()) == {"job_types", "service_packages", "parts", "external_services"}
@@ -77,6 +163,29 @@ def test_get_work_order_billing_source_returns_items():
     assert data["service_packages"][0].amount == 200
     assert data["parts"][0].amount == 100
     assert data["external_services"][0].amount == 30
+    assert set(data["parts"][0]) == {"part", "part_name", "quantity", "rate", "amount"}
+
+
+def test_get_work_order_billing_source_resolves_missing_rates():
+    install_work_order({
+        "Work Order Part": [dict(part="PT", part_name="Part", quantity=2, rate=0, amount=0)],
+    })
+
+    data = api.get_work_order_billing_source("WO-1")
+    assert data["parts"][0].rate == 25
+    assert data["parts"][0].amount == 50
+
+
+@pytest.mark.parametrize("rate", [100, 0])
+def test_get_work_order_billing_source_query_count_is_constant(rate):
+    small_queries = install_work_order(build_rows(1, rate))
+    api.get_work_order_billing_source("WO-1")
+
+    large_queries = install_work_order(build_rows(60, rate))
+    data = api.get_work_order_billing_source("WO-1")
+
+    assert len(data["parts"]) == 60
+    assert len(large_queries) == len(small_queries)
 
 
 def test_get_work_order_billing_source_requires_sales_invoice_create_permission():
@@ -87,16 +196,103 @@ def test_get_work_order_billing_source_requires_sales_invoice_create_permission(
 
 
 def test_get_work_order_billing_source_requires_work_order_read_permission():
-    class WorkOrderDoc:
-        status = "Completed"
-        billing_status = "Unbilled"
-        posting_date = "2024-03-01"
-
+    class NoReadWorkOrderDoc(WorkOrderDoc):
         def check_permission(self, perm):
             raise frappe_stub.PermissionError("no read")
 
-    frappe_stub.get_doc = lambda *a, **k: WorkOrderDoc()
+    frappe_stub.get_doc = lambda *a, **k: NoReadWorkOrderDoc()
     frappe_stub.has_permission = lambda *a, **k: True
 
     with pytest.raises(frappe_stub.PermissionError):
         api.get_work_order_billing_source("WO-1")
+
+
+def test_process_sales_invoices_bulk_chunks_and_reports_failures(monkeypatch):
+    events = []
+
+    class BillingDoc:
+        def __init__(self, name):
+            self.name = name
+
+        def check_permission(self, perm):
+            return None
+
+    loads = []
+
+    def get_doc(doctype, name):
+        loads.append(name)
+        return BillingDoc(name)
+
+    frappe_stub.get_doc = get_doc
+    frappe_stub.db.savepoint = lambda name: events.append("savepoint")
+    frappe_stub.db.rollback = lambda save_point=None: events.append("rollback")
+    frappe_stub.db.commit = lambda: events.append("commit")
+    frappe_stub.publish_progress = lambda percent, **kwargs: events.append(("progress", percent))
+    frappe_stub.publish_realtime = lambda *args, **kwargs: None
+    frappe_stub.log_error = lambda *args, **kwargs: None
+    frappe_stub.get_traceback = lambda: ""
+
+    prefetch_calls = []
+
+    def fake_prefetch(billings):
+        prefetch_calls.append([b.name for b in billings])
+        return {"shared": True}
+
+    def fake_map(name, prefetched, source_doc):
+        assert prefetched == {"shared": True}
+        assert source_doc.name == name
+        if name == "WOB-2":
+            raise Exception("already invoiced")
+        return f"SINV-{name}"
+
+    monkeypatch.setattr(api, "prefetch_mapping_data", fake_prefetch)
+    monkeypatch.setattr(api, "map_to_sales_invoice", fake_map)
+
+    summary = api.process_sales_invoices_bulk(
+        ["WOB-1", "WOB-2", "WOB-3"], user="cashier@example.com", chunk_size=2
+    )
+
+    assert prefetch_calls == [["WOB-1", "WOB-2"], ["WOB-3"]]
+    assert summary["created"] == [
+        {"name": "WOB-1", "sales_invoice": "SINV-WOB-1"},
+        {"name": "WOB-3", "sales_invoice": "SINV-WOB-3"},
+    ]
+    assert summary["failed"] == [{"name": "WOB-2", "error": "already invoiced"}]
+    assert events.count("commit") == 2
+    assert events.count("rollback") == 1
+    assert events[-1] == ("progress", 100)
+    # Each billing is loaded once and handed to the mapping
+    assert loads == ["WOB-1", "WOB-2", "WOB-3"]
+
+
+def test_process_sales_invoices_bulk_fails_only_the_chunk_whose_prefetch_fails(monkeypatch):
+    class BillingDoc:
+        def __init__(self, name):
+            self.name = name
+
+        def check_permission(self, perm):
+            return None
+
+    frappe_stub.get_doc = lambda doctype, name: BillingDoc(name)
+    frappe_stub.db.savepoint = lambda name: None
+    frappe_stub.db.commit = lambda: None
+    frappe_stub.publish_progress = lambda *args, **kwargs: None
+    frappe_stub.publish_realtime = lambda *args, **kwargs: None
+    frappe_stub.log_error = lambda *args, **kwargs: None
+    frappe_stub.get_traceback = lambda: ""
+
+    def fake_prefetch(billings):
+        if billings[0].name == "WOB-1":
+            raise Exception("template missing")
+        return {}
+
+    monkeypatch.setattr(api, "prefetch_mapping_data", fake_prefetch)
+    monkeypatch.setattr(api, "map_to_sales_invoice", lambda name, prefetched, doc: f"SINV-{name}")
+
+    summary = api.process_sales_invoices_bulk(["WOB-1", "WOB-2", "WOB-3"], chunk_size=2)
+
+    assert summary["failed"] == [
+        {"name": "WOB-1", "error": "template missing"},
+        {"name": "WOB-2", "error": "template missing"},
+    ]
+    assert summary["created"] == [{"name": "WOB-3", "sales_invoice": "SINV-WOB-3"}]
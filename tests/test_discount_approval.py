@@ -17,6 +17,7 @@ frappe_utils_stub = types.SimpleNamespace(
     nowdate=lambda: "2024-01-01",
     add_days=lambda date, days: date,
     get_datetime=lambda: "2024-01-01 00:00:00",
+    fmt_money=lambda value, *args, **kwargs: str(value),
 )
 
 def _throw(msg):
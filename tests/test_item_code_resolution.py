@@ -7,6 +7,10 @@ import types
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
 def setup_frappe_stub():
     """Create a minimal frappe stub with tracking for db.get_value calls."""
     frappe = types.ModuleType("frappe")
@@ -41,10 +45,21 @@ def setup_frappe_stub():
     utils.now_datetime = lambda: types.SimpleNamespace(strftime=lambda fmt: "00:00:00")
     utils.nowdate = lambda: "2024-01-01"
     utils.nowtime = lambda: "00:00:00"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
     frappe.utils = utils
+    frappe._dict = AttrDict
+    frappe.local = types.SimpleNamespace()
+    frappe.cache = lambda: types.SimpleNamespace(
+        make_key=lambda key: key,
+        hmget=lambda key, fields: [None] * len(fields),
+        pipeline=lambda: types.SimpleNamespace(
+            hset=lambda *args, **kwargs: None, ttl=lambda key: None, execute=lambda: [None, 1]
+        ),
+    )
 
     background_jobs = types.ModuleType("frappe.utils.background_jobs")
     background_jobs.enqueue = lambda *args, **kwargs: None
+    background_jobs.is_job_enqueued = lambda job_id: False
     sys.modules["frappe.utils.background_jobs"] = background_jobs
 
     model = types.ModuleType("frappe.model")
@@ -73,9 +88,17 @@ def setup_frappe_stub():
         return types.SimpleNamespace()
 
     frappe.get_doc = get_doc
+    frappe.get_all_calls = []
+
     def get_all(doctype, filters=None, fields=None, *args, **kwargs):
+        frappe.get_all_calls.append((doctype, filters))
         if doctype == "Bin":
             return [types.SimpleNamespace(item_code="ITEM-001", actual_qty=0, valuation_rate=0)]
+        if doctype == "Part":
+            return [
+                AttrDict(name=name, item_code="ITEM-001")
+                for name in filters["name"][1]
+            ]
         return []
 
     frappe.get_all = get_all
@@ -91,6 +114,9 @@ def setup_frappe_stub():
 
 
 def import_doctype(module_name):
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.part_snapshot", None)
     sys.modules.pop(module_name, None)
     return importlib.import_module(module_name)
 
@@ -101,11 +127,20 @@ def test_part_stock_opname_item_code():
         "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
     )
     opname = module.PartStockOpname()
-    opname.opname_items = [types.SimpleNamespace(part="PART-001", qty_counted=1, uom="Nos")]
+    opname.opname_items = [
+        types.SimpleNamespace(part=part, qty_counted=1, uom="Nos")
+        for part in ("PART-001", "PART-002", "PART-001", "PART-003")
+    ]
     opname.warehouse = "WH"
     module.frappe = frappe
     opname.store_system_quantities()
-    assert frappe.db.calls[0] == ("Part", "PART-001", "item_code")
+
+    # All new Parts are resolved with one query, not one get_value per row
+    part_queries = [call for call in frappe.get_all_calls if call[0] == "Part"]
+    assert part_queries == [("Part", {"name": ["in", ["PART-001", "PART-002", "PART-003"]]})]
+    assert frappe.db.calls == []
+    snapshot = module.SystemQuantitySnapshot.loads(opname.system_quantities_cache)
+    assert snapshot.parts == ["PART-001", "PART-002", "PART-003"]
 
 
 def test_part_stock_opname_system_quantities_cached():
@@ -119,9 +154,76 @@ def test_part_stock_opname_system_quantities_cached():
     module.frappe = frappe
     opname.store_system_quantities()
     cache = json.loads(opname.system_quantities_cache)
-    assert cache["PART-001"]["item_code"] == "ITEM-001"
-    assert cache["PART-001"]["actual_qty"] == 0
-    assert cache["PART-001"]["valuation_rate"] == 0
+    assert cache["parts"] == ["PART-001"]
+    snapshot = module.SystemQuantitySnapshot.loads(opname.system_quantities_cache)
+    assert snapshot.get("PART-001") == ("ITEM-001", 0, 0)
+
+
+def test_part_stock_opname_snapshot_written_once():
+    frappe = setup_frappe_stub()
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    opname = module.PartStockOpname()
+    opname.opname_items = [types.SimpleNamespace(part="PART-001", qty_counted=3, uom="Nos")]
+    opname.warehouse = "WH"
+    module.frappe = frappe
+    opname.store_system_quantities()
+    first = opname.system_quantities_cache
+
+    # Saving again does not re-read stock for parts already snapshotted
+    opname.store_system_quantities()
+    assert opname.system_quantities_cache == first
+    assert len([call for call in frappe.get_all_calls if call[0] == "Part"]) == 1
+
+    # New rows are appended to the existing snapshot
+    opname.opname_items.append(types.SimpleNamespace(part="PART-002", qty_counted=1, uom="Nos"))
+    opname.store_system_quantities()
+    snapshot = module.SystemQuantitySnapshot.loads(opname.system_quantities_cache)
+    assert snapshot.parts == ["PART-001", "PART-002"]
+
+    differences = list(snapshot.iter_differences(opname.opname_items))
+    assert [(d[0].part, d[4]) for d in differences] == [("PART-001", 3), ("PART-002", 1)]
+
+
+def test_part_stock_opname_reads_legacy_snapshot():
+    setup_frappe_stub()
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    legacy = json.dumps({"PART-001": {"item_code": "ITEM-001", "actual_qty": 5, "valuation_rate": 2}})
+    snapshot = module.SystemQuantitySnapshot.loads(legacy)
+    assert snapshot.get("PART-001") == ("ITEM-001", 5, 2)
+    assert "PART-002" not in snapshot
+
+
+def test_part_stock_opname_snapshot_parsed_on_first_access():
+    setup_frappe_stub()
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    stored = json.dumps({
+        "version": 2, "parts": ["PART-001"], "item_codes": ["ITEM-001"],
+        "actual_qty": [5], "valuation_rate": [2],
+    })
+
+    parsed = []
+    original_loads = module.json.loads
+    module.json = types.SimpleNamespace(
+        loads=lambda value: parsed.append(value) or original_loads(value),
+        dumps=json.dumps,
+    )
+    try:
+        snapshot = module.SystemQuantitySnapshot.loads(stored)
+        # An untouched snapshot is written back without parsing it
+        assert snapshot.dumps() == stored
+        assert parsed == []
+
+        assert snapshot.get("PART-001") == ("ITEM-001", 5, 2)
+        assert "PART-002" not in snapshot
+        assert len(parsed) == 1
+    finally:
+        module.json = json
 
 
 def test_return_material_item_code():
@@ -144,9 +246,28 @@ def test_return_material_item_code():
     ]
     rm.name = "RM-001"
     rm.is_new = lambda: True
+    queries = []
+
+    def sql(query, values, as_dict=False):
+        queries.append(values)
+        return [
+            types.SimpleNamespace(
+                work_order_item="WO_ITEM",
+                part="PART-001",
+                item_code="ITEM-001",
+                rate=1,
+                consumed_qty=1,
+                returned_qty=0,
+            )
+        ]
+
+    frappe.db.sql = sql
     module.frappe = frappe
     rm.validate_qty_against_work_order()
-    assert frappe.db.calls[0][2] == "item_code"
+    assert queries == [{"work_order": "WO-001"}]
+    assert rm.items[0].item_code == "ITEM-001"
+    assert rm.items[0].work_order_item == "WO_ITEM"
+    assert frappe.db.calls == []
 
 
 def test_part_stock_adjustment_item_code():
@@ -154,9 +275,20 @@ def test_part_stock_adjustment_item_code():
     module = import_doctype(
         "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
     )
+    calls = []
+
+    def get_all(doctype, filters=None, fields=None, *args, **kwargs):
+        calls.append((doctype, fields))
+        if doctype == "Part":
+            return [AttrDict(name="PART-001", item_code="ITEM-001")]
+        return []
+
+    frappe.get_all = get_all
     psa = module.PartStockAdjustment()
     psa.adjustment_items = [types.SimpleNamespace(part="PART-001", item_code=None, difference=0)]
     module.frappe = frappe
     psa.make_stock_entries()
-    assert frappe.db.calls[0][2] == "item_code"
+    assert calls[0][0] == "Part"
+    assert "item_code" in calls[0][1]
+    assert psa.adjustment_items[0].item_code == "ITEM-001"
 
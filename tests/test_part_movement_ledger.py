@@ -0,0 +1,123 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+class DuplicateEntry(Exception):
+    pass
+
+
+def setup_frappe_stub(recorded=False, balances=None):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe._dict = AttrDict
+    frappe.inserted = []
+    frappe.queries = []
+    frappe.filters = []
+
+    def sql(query, values=None, **kwargs):
+        frappe.queries.append((query, values))
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.filters.append(filters)
+        return [AttrDict(row) for row in balances or []]
+
+    def bulk_insert(doctype, fields, values):
+        if recorded:
+            raise DuplicateEntry("Duplicate entry for key 'unique_voucher_movement'")
+        frappe.inserted.extend(dict(zip(fields, row)) for row in values)
+
+    frappe.db = types.SimpleNamespace(
+        bulk_insert=bulk_insert,
+        is_duplicate_entry=lambda e: isinstance(e, DuplicateEntry),
+        sql=sql,
+    )
+    frappe.get_all = get_all
+    frappe.session = types.SimpleNamespace(user="test@example.com")
+    frappe.generate_hash = lambda length=10: "HASH"
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, **kwargs: str(value)
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    return frappe
+
+
+def import_ledger():
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.part_movement_ledger", None)
+    return importlib.import_module("car_workshop.utils.part_movement_ledger")
+
+
+def make_voucher(*items):
+    return types.SimpleNamespace(
+        doctype="Return Material",
+        name="RM-001",
+        work_order="WO-001",
+        items=[
+            types.SimpleNamespace(
+                name=f"ROW-{idx}", part=part, item_code=item_code, qty=qty, work_order_item=None
+            )
+            for idx, (part, item_code, qty) in enumerate(items, 1)
+        ],
+    )
+
+
+def test_cancellation_appends_rows_and_upserts_signed_balances():
+    frappe = setup_frappe_stub()
+    ledger = import_ledger()
+
+    changes = ledger.record_part_movements(
+        make_voucher(("P1", "I1", 2), ("P1", "I1", 1), ("P2", "I2", 4), ("P3", None, 1)),
+        "Return Cancellation",
+    )
+
+    assert changes == {"I1": -3.0, "I2": -4.0}
+    assert [row["qty"] for row in frappe.inserted] == [2.0, 1.0, 4.0]
+    assert [row["voucher_detail_no"] for row in frappe.inserted] == ["ROW-1", "ROW-2", "ROW-3"]
+    assert {row["movement_type"] for row in frappe.inserted} == {"Return Cancellation"}
+
+    assert len(frappe.queries) == 2
+    query, values = frappe.queries[0]
+    assert "returned_qty = IFNULL(returned_qty, 0) + VALUES(returned_qty)" in query
+    assert values[0] == "WO-001::I1"
+    assert values[-4:] == ["WO-001", "I2", "P2", -4.0]
+
+    # Work Order Part rows get the new consumed quantity without loading the Work Order
+    query, values = frappe.queries[1]
+    assert "UPDATE `tabWork Order Part`" in query
+    assert values == {"work_order": "WO-001", "item_codes": ("I1", "I2")}
+
+
+def test_voucher_is_recorded_once():
+    frappe = setup_frappe_stub(recorded=True)
+    ledger = import_ledger()
+
+    # The unique key rejects the rows, so the balances are left alone
+    assert ledger.record_part_movements(make_voucher(("P1", "I1", 2)), "Return") == {}
+    assert frappe.inserted == []
+    assert frappe.queries == []
+
+
+def test_balances_report_consumed_qty():
+    frappe = setup_frappe_stub(balances=[
+        {"item_code": "I1", "part": "P1", "issued_qty": 5, "returned_qty": 2},
+    ])
+    ledger = import_ledger()
+
+    balances = ledger.get_part_balances("WO-001", ["I1", None])
+
+    assert balances["I1"].consumed_qty == 3
+    assert frappe.filters == [{"work_order": "WO-001", "item_code": ["in", ["I1"]]}]
@@ -0,0 +1,197 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+class FakeRedis:
+    """Minimal stand-in for the raw hash commands used on frappe.cache()."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+        self.round_trips = 0
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def hmget(self, key, fields):
+        self.round_trips += 1
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def expire(self, key, ttl):
+        self.round_trips += 1
+        self.expiry[key] = ttl
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping):
+        self.commands.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def ttl(self, key):
+        self.commands.append(lambda: self.redis.expiry.get(key, -1))
+
+    def hdel(self, key, *fields):
+        self.commands.append(lambda: [self.redis.hashes.get(key, {}).pop(f, None) for f in fields])
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [command() for command in self.commands]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+PARTS = {
+    "P1": {"part_number": "PN-1", "part_name": "Oil Filter", "item_code": "ITEM-1",
+           "brand": "B", "category": "Filter", "current_price": 50, "description": "Filter"},
+    "P2": {"part_number": "PN-2", "part_name": "Brake Pad", "item_code": None,
+           "brand": "B", "category": "Brake", "current_price": 0, "description": ""},
+}
+
+
+def setup_frappe_stub():
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe._dict = AttrDict
+    frappe.local = types.SimpleNamespace()
+    frappe.redis = FakeRedis()
+    frappe.cache = lambda: frappe.redis
+    frappe.db = types.SimpleNamespace(after_commit=CallbackManager())
+    frappe.queries = []
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.queries.append((doctype, sorted(filters["name"][1])))
+        return [
+            AttrDict(name=name, **PARTS[name])
+            for name in filters["name"][1] if name in PARTS
+        ]
+
+    def get_doc(*args, **kwargs):
+        raise AssertionError("Part documents should not be loaded")
+
+    frappe.get_all = get_all
+    frappe.get_doc = get_doc
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        def get(self, key):
+            return getattr(self, key, None)
+
+        def set(self, key, value):
+            setattr(self, key, value)
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_module(module_name):
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.part_snapshot", None)
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+def test_misses_load_in_one_query_and_are_shared_across_requests():
+    frappe = setup_frappe_stub()
+    snapshots = import_module("car_workshop.utils.part_snapshot")
+
+    assert snapshots.get_part_item_codes(["P1", "P2", "P3", None]) == {"P1": "ITEM-1"}
+    assert frappe.queries == [("Part", ["P1", "P2", "P3"])]
+
+    # Same request: served from frappe.local
+    assert snapshots.get_part_snapshot("P1").part_name == "Oil Filter"
+
+    key = frappe.redis.make_key(snapshots.PART_SNAPSHOT_KEY)
+    assert frappe.redis.expiry[key] == snapshots.PART_SNAPSHOT_TTL
+
+    # Next request: served from the shared cache with one HMGET
+    frappe.local = types.SimpleNamespace()
+    frappe.redis.round_trips = 0
+    assert snapshots.get_part_item_codes(["P1", "P2"]) == {"P1": "ITEM-1"}
+    assert frappe.redis.round_trips == 1
+    assert snapshots.get_part_snapshot("P2").part_number == "PN-2"
+    assert frappe.queries == [("Part", ["P1", "P2", "P3"])]
+
+    # Callers get copies
+    snapshots.get_part_snapshot("P1")["part_name"] = "changed"
+    assert snapshots.get_part_snapshot("P1").part_name == "Oil Filter"
+
+
+def test_part_writes_and_renames_drop_snapshots():
+    frappe = setup_frappe_stub()
+    snapshots = import_module("car_workshop.utils.part_snapshot")
+    snapshots.get_part_snapshots(["P1", "P2"])
+
+    snapshots.clear_part_snapshot(types.SimpleNamespace(name="P1"), "on_update")
+    snapshots.clear_part_snapshot(types.SimpleNamespace(name="P9"), "after_rename", "P2", "P9", False)
+
+    # Other requests keep the shared snapshots until the commit
+    frappe.local = types.SimpleNamespace()
+    snapshots.get_part_snapshots(["P1", "P2"])
+    assert len(frappe.queries) == 1
+
+    frappe.db.after_commit.run()
+    frappe.local = types.SimpleNamespace()
+    snapshots.get_part_snapshots(["P1", "P2"])
+
+    assert frappe.queries[-1] == ("Part", ["P1", "P2"])
+
+
+def test_work_order_part_prefetches_all_rows_of_the_parent():
+    frappe = setup_frappe_stub()
+    module = import_module("car_workshop.car_workshop.doctype.work_order_part.work_order_part")
+
+    rows = []
+    for part in ("P1", "P2"):
+        row = module.WorkOrderPart()
+        row.part = part
+        row.rate = 0
+        rows.append(row)
+    parent = AttrDict(part_detail=rows)
+    for row in rows:
+        row.parent_doc = parent
+        row.fetch_part_details()
+
+    assert frappe.queries == [("Part", ["P1", "P2"])]
+    assert rows[0].item_code == "ITEM-1"
+    assert rows[0].rate == 50
+    assert rows[1].part_name == "Brake Pad"
+    assert rows[1].get("item_code") is None
+    assert rows[1].rate == 0
@@ -0,0 +1,140 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(stock_entries, journal_linked=(), later_movements=(), closed_years=()):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+
+    def throw(msg):
+        raise Exception(msg)
+
+    frappe.throw = throw
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.queries.append(doctype)
+        if doctype == "Stock Entry":
+            names = filters["name"][1]
+            return [AttrDict(entry) for entry in stock_entries if entry["name"] in names]
+        if doctype == "Fiscal Year":
+            return [AttrDict(year) for year in closed_years]
+        return []
+
+    def sql_list(query, values):
+        frappe.queries.append("sql")
+        frappe.sql_queries.append(" ".join(query.split()))
+        linked = journal_linked if "GL Entry" in query else later_movements
+        return [name for name in values["names"] if name in linked]
+
+    frappe.sql_queries = []
+    frappe.get_all = get_all
+    frappe.db = types.SimpleNamespace(sql_list=sql_list)
+    frappe.get_hooks = lambda hook: {}
+    frappe.get_doc = lambda *args, **kwargs: pytest.fail("Stock Entry should not be loaded")
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.__path__ = []
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.nowdate = lambda: "2024-01-01"
+    utils.now_datetime = lambda: None
+    frappe.utils = utils
+
+    jinja = types.ModuleType("frappe.utils.jinja")
+    jinja.get_jenv = lambda: types.SimpleNamespace(get_template=lambda path: None)
+    background_jobs = types.ModuleType("frappe.utils.background_jobs")
+    background_jobs.enqueue = lambda *args, **kwargs: None
+    background_jobs.is_job_enqueued = lambda job_id: False
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        pass
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.utils.jinja"] = jinja
+    sys.modules["frappe.utils.background_jobs"] = background_jobs
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def make_adjustment(frappe, entry_names):
+    module_name = "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    sys.modules.pop(module_name, None)
+    module = importlib.import_module(module_name)
+    psa = module.PartStockAdjustment()
+    psa.name = "PSA-001"
+    psa.doctype = "Part Stock Adjustment"
+    psa.stock_entry_logs = [
+        types.SimpleNamespace(stock_entry=name, entry_type="Material Issue") for name in entry_names
+    ]
+    return psa
+
+
+def stock_entry(name, docstatus=1, posting_date="2024-03-01"):
+    return {
+        "name": name,
+        "docstatus": docstatus,
+        "stock_entry_type": "Material Issue",
+        "posting_date": posting_date,
+        "creation": posting_date + " 10:00:00",
+    }
+
+
+def test_batch_status_uses_fixed_number_of_queries():
+    names = [f"SE-{i:03d}" for i in range(40)]
+    frappe = setup_frappe_stub(
+        [stock_entry(name) for name in names[:-1]] + [stock_entry(names[-1], docstatus=2)],
+        journal_linked={"SE-001"},
+        later_movements={"SE-001", "SE-002"},
+        closed_years=[{"year_start_date": "2023-01-01", "year_end_date": "2023-12-31"}],
+    )
+    psa = make_adjustment(frappe, names)
+    statuses = psa.check_stock_entries_status(names + ["SE-MISSING"])
+
+    assert frappe.queries == ["Stock Entry", "sql", "sql", "Fiscal Year"]
+    # Later movements are probed by item and warehouse, not by date
+    movements = frappe.sql_queries[1]
+    assert "ON sle.item_code = sed.item_code AND sle.warehouse IN (sed.s_warehouse, sed.t_warehouse)" in movements
+    assert "EXISTS" not in movements
+    assert statuses["SE-000"] == {
+        "can_cancel": True, "reason": "", "docstatus": 1, "stock_entry_type": "Material Issue"
+    }
+    assert statuses["SE-001"]["reason"] == "Has linked Journal Entries"
+    assert statuses["SE-002"]["reason"] == "Has subsequent inventory movements"
+    assert statuses["SE-039"]["can_cancel"] and statuses["SE-039"]["docstatus"] == 2
+    assert not statuses["SE-MISSING"]["can_cancel"]
+
+
+def test_closed_fiscal_year_blocks_cancellation():
+    frappe = setup_frappe_stub(
+        [stock_entry("SE-OLD", posting_date="2023-06-01"), stock_entry("SE-NEW")],
+        closed_years=[{"year_start_date": "2023-01-01", "year_end_date": "2023-12-31"}],
+    )
+    psa = make_adjustment(frappe, ["SE-OLD", "SE-NEW"])
+
+    with pytest.raises(Exception) as exc:
+        psa.validate_stock_entries_cancellation()
+
+    assert "SE-OLD" in str(exc.value)
+    assert "Created in a closed fiscal year" in str(exc.value)
+    assert "SE-NEW" not in str(exc.value)
@@ -0,0 +1,219 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+def setup_frappe_stub():
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe._dict = AttrDict
+    frappe.commits = 0
+    frappe.progress = []
+    frappe.inserted_logs = []
+    # Stock Entry Log rows as committed in the database
+    frappe.log_rows = []
+    frappe.locks = 0
+    frappe.enqueued = []
+    frappe.running_jobs = set()
+
+    def throw(msg):
+        raise Exception(msg)
+
+    def commit():
+        frappe.commits += 1
+
+    frappe.throw = throw
+    def sql(query, values=None):
+        assert "FOR UPDATE" in query
+        frappe.locks += 1
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        assert doctype == "Stock Entry Log" and filters["parent"] == "PSA-001"
+        return [AttrDict(row) for row in frappe.log_rows if row.get("stock_entry")]
+
+    frappe.db = types.SimpleNamespace(commit=commit, sql=sql)
+    frappe.session = types.SimpleNamespace(user="test@example.com")
+    frappe.msgprint = lambda *args, **kwargs: None
+    frappe.publish_progress = lambda percent, **kwargs: frappe.progress.append(percent)
+    frappe.get_all = get_all
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.__path__ = []
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.nowdate = lambda: "2024-01-01"
+    utils.now_datetime = lambda: "2024-01-01 00:00:00"
+    frappe.utils = utils
+
+    background_jobs = types.ModuleType("frappe.utils.background_jobs")
+    background_jobs.enqueue = lambda *args, **kwargs: frappe.enqueued.append(kwargs)
+    background_jobs.is_job_enqueued = lambda job_id: job_id in frappe.running_jobs
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        def append(self, table, values):
+            row = AttrDict(values)
+            def db_insert():
+                frappe.inserted_logs.append(row)
+                frappe.log_rows.append(row)
+
+            row.db_insert = db_insert
+            getattr(self, table).append(row)
+            return row
+
+        def db_set(self, fieldname, value):
+            setattr(self, fieldname, value)
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.utils.background_jobs"] = background_jobs
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def make_adjustment(receipts, issues, logs=None):
+    module_name = "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    sys.modules.pop(module_name, None)
+    module = importlib.import_module(module_name)
+
+    psa = module.PartStockAdjustment()
+    psa.name = "PSA-001"
+    psa.doctype = "Part Stock Adjustment"
+    psa.adjustment_items = [
+        types.SimpleNamespace(part=f"P{i}", item_code=f"ITEM-{i}", difference=1)
+        for i in range(receipts)
+    ] + [
+        types.SimpleNamespace(part=f"N{i}", item_code=f"ITEM-N{i}", difference=-1)
+        for i in range(issues)
+    ]
+    psa.stock_entry_logs = list(logs or [])
+    sys.modules["frappe"].log_rows.extend(logs or [])
+
+    created = []
+
+    def create_stock_entry(items, entry_type):
+        entry = types.SimpleNamespace(
+            name=f"SE-{len(created) + 1}",
+            stock_entry_type=entry_type,
+            posting_date="2024-01-01",
+            items=items,
+        )
+        created.append(entry)
+        return entry
+
+    psa.create_stock_entry = create_stock_entry
+    return psa, created, module
+
+
+def test_stock_entries_are_chunked_and_logged():
+    frappe = setup_frappe_stub()
+    psa, created, _ = make_adjustment(receipts=5, issues=3)
+
+    psa.make_stock_entries(chunk_size=2, commit=True)
+
+    assert [(e.stock_entry_type, len(e.items)) for e in created] == [
+        ("Material Receipt", 2), ("Material Receipt", 2), ("Material Receipt", 1),
+        ("Material Issue", 2), ("Material Issue", 1),
+    ]
+    assert [(log.entry_type, log.chunk_index, log.item_count) for log in frappe.inserted_logs] == [
+        ("Material Receipt", 0, 2), ("Material Receipt", 1, 2), ("Material Receipt", 2, 1),
+        ("Material Issue", 0, 2), ("Material Issue", 1, 1),
+    ]
+    assert frappe.commits == 5
+    assert frappe.locks == 5
+    assert frappe.progress[-1] == 100
+    assert "SE-5" in psa.stock_entries_html
+
+
+def test_resume_skips_committed_chunks():
+    frappe = setup_frappe_stub()
+    logs = [
+        AttrDict(stock_entry="SE-OLD-1", entry_type="Material Receipt", chunk_index=0),
+        AttrDict(stock_entry="SE-OLD-2", entry_type="Material Receipt", chunk_index=1),
+    ]
+    psa, created, _ = make_adjustment(receipts=5, issues=3, logs=logs)
+
+    psa.make_stock_entries(chunk_size=2, commit=True)
+
+    assert [(e.stock_entry_type, [i.part for i in e.items]) for e in created] == [
+        ("Material Receipt", ["P4"]),
+        ("Material Issue", ["N0", "N1"]),
+        ("Material Issue", ["N2"]),
+    ]
+    assert len(psa.stock_entry_logs) == 5
+    assert "SE-OLD-1" in psa.stock_entries_html
+
+
+def test_failed_chunk_keeps_earlier_chunks_committed():
+    frappe = setup_frappe_stub()
+    psa, created, _ = make_adjustment(receipts=4, issues=0)
+    create_stock_entry = psa.create_stock_entry
+
+    def failing_create(items, entry_type):
+        if len(created) == 1:
+            raise Exception("lock wait timeout")
+        return create_stock_entry(items, entry_type)
+
+    psa.create_stock_entry = failing_create
+
+    with pytest.raises(Exception):
+        psa.make_stock_entries(chunk_size=2, commit=True)
+
+    assert frappe.commits == 1
+    assert [log.chunk_index for log in psa.stock_entry_logs] == [0]
+
+    psa.create_stock_entry = create_stock_entry
+    psa.make_stock_entries(chunk_size=2, commit=True)
+
+    assert [[i.part for i in e.items] for e in created] == [["P0", "P1"], ["P2", "P3"]]
+
+
+def test_chunks_committed_by_another_run_are_not_posted_again():
+    frappe = setup_frappe_stub()
+    psa, created, _ = make_adjustment(receipts=4, issues=0)
+    create_stock_entry = psa.create_stock_entry
+
+    def create_after_other_run(items, entry_type):
+        # A second job posted chunk 1 while this one worked on chunk 0
+        frappe.log_rows.append(AttrDict(stock_entry="SE-OTHER", entry_type="Material Receipt", chunk_index=1))
+        return create_stock_entry(items, entry_type)
+
+    psa.create_stock_entry = create_after_other_run
+    psa.make_stock_entries(chunk_size=2, commit=True)
+
+    assert [[i.part for i in e.items] for e in created] == [["P0", "P1"]]
+
+
+def test_resume_is_refused_while_the_job_runs():
+    frappe = setup_frappe_stub()
+    psa, _, module = make_adjustment(receipts=1, issues=0)
+    psa.docstatus = 1
+    psa.check_permission = lambda perm: None
+    frappe.get_doc = lambda doctype, name: psa
+
+    module.resume_stock_entries("PSA-001")
+    assert frappe.enqueued[0]["job_id"] == module.get_stock_entries_job_id("PSA-001")
+    assert frappe.enqueued[0]["deduplicate"] is True
+
+    frappe.running_jobs.add(module.get_stock_entries_job_id("PSA-001"))
+    with pytest.raises(Exception, match="still running"):
+        module.resume_stock_entries("PSA-001")
+    assert len(frappe.enqueued) == 1
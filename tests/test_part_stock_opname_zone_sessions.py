@@ -0,0 +1,248 @@
+import importlib
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def snapshot(rows):
+    return json.dumps({
+        "version": 2,
+        "parts": [row[0] for row in rows],
+        "item_codes": [row[1] for row in rows],
+        "actual_qty": [row[2] for row in rows],
+        "valuation_rate": [row[3] for row in rows],
+    })
+
+
+def setup_frappe_stub(sessions=(), session_items=()):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+
+    def throw(msg):
+        raise Exception(msg)
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.queries.append(doctype)
+        if doctype == "Part Stock Opname":
+            return [AttrDict(session) for session in sessions]
+        if doctype == "Part Stock Opname Item":
+            return [AttrDict(item) for item in session_items]
+        return []
+
+    frappe.throw = throw
+    frappe.get_all = get_all
+    frappe.db = types.SimpleNamespace(sql=None)
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.__path__ = []
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.nowdate = lambda: "2024-01-01"
+    utils.now_datetime = lambda: None
+    frappe.utils = utils
+
+    background_jobs = types.ModuleType("frappe.utils.background_jobs")
+    background_jobs.enqueue = lambda *args, **kwargs: None
+    background_jobs.is_job_enqueued = lambda job_id: False
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        def is_new(self):
+            return False
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.utils.background_jobs"] = background_jobs
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_doctype(module_name):
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+class Adjustment:
+    def __init__(self):
+        self.adjustment_items = []
+
+    def append(self, table, values):
+        getattr(self, table).append(values)
+
+
+def test_zone_sessions_merge_into_one_adjustment():
+    frappe = setup_frappe_stub(
+        sessions=[
+            {"name": "OPN-A", "zone": "A", "docstatus": 1, "status": "Submitted",
+             "system_quantities_cache": snapshot([("P1", "I1", 5, 10), ("P2", "I2", 3, 4)])},
+            {"name": "OPN-B", "zone": "B", "docstatus": 1, "status": "Submitted",
+             "system_quantities_cache": snapshot([("P3", "I3", 2, 7)])},
+        ],
+        session_items=[
+            {"parent": "OPN-A", "part": "P1", "qty_counted": 4, "uom": "Nos"},
+            {"parent": "OPN-A", "part": "P2", "qty_counted": 3, "uom": "Nos"},
+            {"parent": "OPN-B", "part": "P3", "qty_counted": 6, "uom": "Nos"},
+        ],
+    )
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    )
+    adjustment = Adjustment()
+
+    sessions, has_differences = module.append_zone_session_differences(adjustment, "OPN-GROUP")
+
+    assert sessions == ["OPN-A", "OPN-B"]
+    assert has_differences
+    assert [(row["part"], row["difference"], row["adjustment_amount"]) for row in adjustment.adjustment_items] == [
+        ("P1", -1, -10), ("P3", 4, 28),
+    ]
+    assert frappe.queries == ["Part Stock Opname", "Part Stock Opname Item"]
+
+
+def test_merge_requires_submitted_sessions_without_overlap():
+    setup_frappe_stub(
+        sessions=[
+            {"name": "OPN-A", "docstatus": 1, "status": "Submitted"},
+            {"name": "OPN-B", "docstatus": 0, "status": "Draft"},
+        ],
+    )
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    )
+    with pytest.raises(Exception, match="OPN-B"):
+        module.append_zone_session_differences(Adjustment(), "OPN-GROUP")
+
+    setup_frappe_stub(
+        sessions=[
+            {"name": "OPN-A", "docstatus": 1, "status": "Submitted"},
+            {"name": "OPN-B", "docstatus": 1, "status": "Submitted"},
+        ],
+        session_items=[
+            {"parent": "OPN-A", "part": "P1", "qty_counted": 1},
+            {"parent": "OPN-B", "part": "P1", "qty_counted": 1},
+        ],
+    )
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    )
+    with pytest.raises(Exception, match="Part P1 is counted in both OPN-A and OPN-B"):
+        module.append_zone_session_differences(Adjustment(), "OPN-GROUP")
+
+
+def test_session_reports_parts_counted_in_other_sessions():
+    frappe = setup_frappe_stub()
+    calls = []
+
+    def sql(query, params, as_dict=False):
+        calls.append(params)
+        return [
+            AttrDict(part="P1", name="OPN-A", zone="A"),
+            AttrDict(part="P3", name="OPN-C", zone=None),
+        ]
+
+    frappe.db.sql = sql
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    opname = module.PartStockOpname()
+    opname.name = "OPN-B"
+    opname.parent_opname = "OPN-GROUP"
+    opname.opname_items = [types.SimpleNamespace(part=f"P{i}") for i in range(1, 5)]
+
+    with pytest.raises(Exception) as exc:
+        opname.check_parts_in_other_sessions()
+
+    assert len(calls) == 1
+    assert set(calls[0]["parts"]) == {"P1", "P2", "P3", "P4"}
+    assert "Part P1 is already counted in zone session OPN-A (A)" in str(exc.value)
+    assert "Part P3 is already counted in zone session OPN-C (no zone)" in str(exc.value)
+
+
+def test_validate_items_detects_duplicate_parts():
+    setup_frappe_stub()
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    opname = module.PartStockOpname()
+    opname.opname_items = [
+        types.SimpleNamespace(part=f"P{i}", qty_counted=1) for i in range(1000)
+    ] + [types.SimpleNamespace(part="P10", qty_counted=1)]
+
+    with pytest.raises(Exception, match="Duplicate Part P10 at row 1001"):
+        opname.validate_items()
+
+
+def test_adjustment_rejects_zone_session():
+    frappe = setup_frappe_stub()
+    frappe.get_doc = lambda doctype, name: AttrDict(
+        name=name, parent_opname="OPN-GROUP", docstatus=1, status="Submitted"
+    )
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment"
+    )
+
+    with pytest.raises(Exception, match="OPN-A is a zone session of OPN-GROUP"):
+        module.create_adjustment_from_opname("OPN-A")
+
+
+def test_make_stock_adjustment_merges_group_sessions():
+    frappe = setup_frappe_stub(
+        sessions=[
+            {"name": "OPN-A", "zone": "A", "docstatus": 1, "status": "Submitted",
+             "system_quantities_cache": snapshot([("P1", "I1", 5, 10)])},
+        ],
+        session_items=[
+            {"parent": "OPN-A", "part": "P1", "qty_counted": 4, "uom": "Nos"},
+        ],
+    )
+    inserted = []
+    adjusted = []
+
+    class NewAdjustment(Adjustment):
+        def insert(self, ignore_permissions=False):
+            inserted.append(self)
+
+    utils = sys.modules["frappe.utils"]
+    utils.now_datetime = lambda: types.SimpleNamespace(strftime=lambda fmt: "00:00:00")
+    frappe.new_doc = lambda doctype: NewAdjustment()
+    frappe.db.set_value = lambda doctype, name, field, value: adjusted.append((name, value))
+
+    sys.modules.pop("car_workshop.car_workshop.doctype.part_stock_adjustment.part_stock_adjustment", None)
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.part_stock_opname.part_stock_opname"
+    )
+    group = module.PartStockOpname()
+    group.name = "OPN-GROUP"
+    group.is_group = 1
+    group.parent_opname = None
+    group.docstatus = 1
+    group.status = "Submitted"
+    group.warehouse = "WH"
+    group.get = lambda field: getattr(group, field, None)
+    group.db_set = lambda field, value: adjusted.append((group.name, value))
+    frappe.get_doc = lambda doctype, name: group
+
+    adjustment = module.make_stock_adjustment("OPN-GROUP")
+
+    assert inserted == [adjustment]
+    assert adjustment.reference_opname == "OPN-GROUP"
+    assert [(row["part"], row["difference"]) for row in adjustment.adjustment_items] == [("P1", -1)]
+    assert adjusted == [("OPN-GROUP", "Adjusted"), ("OPN-A", "Adjusted")]
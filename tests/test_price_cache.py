@@ -0,0 +1,156 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class SharedCache:
+    """Minimal stand-in for the redis wrapper returned by frappe.cache()."""
+
+    def __init__(self):
+        self.data = {}
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+def import_price_cache(shared_cache=None):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.db = types.SimpleNamespace(after_commit=CallbackManager())
+    utils = types.ModuleType("frappe.utils")
+    utils.getdate = lambda value: value
+    utils.fmt_money = lambda value, precision, symbol="": f"{symbol}{value}"
+    frappe.utils = utils
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    if shared_cache:
+        frappe.cache = lambda: shared_cache
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.price_cache", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    return importlib.import_module("car_workshop.utils.price_cache")
+
+
+def test_cached_price_counts_hits_and_misses():
+    module = import_price_cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"rate": 100}
+
+    first = module.cached_price("item_price", "Part", "PART-001", "Standard", "2024-01-01", loader)
+    second = module.cached_price("item_price", "Part", "PART-001", "Standard", "2024-01-01", loader)
+    first["rate"] = 0
+
+    assert second == {"rate": 100}
+    assert len(calls) == 1
+    stats = module.price_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_cached_price_caches_missing_prices():
+    module = import_price_cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    for _ in range(3):
+        assert module.cached_price("active_rate", "Part", "P", "Standard", "2024-01-01", loader) is None
+    assert len(calls) == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    module = import_price_cache()
+    cache = module.PriceCache(ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+
+    cache.set("key", 1)
+    assert cache.get("key") == 1
+    now[0] += 11
+    assert cache.get("key") is module.MISSING
+
+
+def test_least_recently_used_entry_is_evicted():
+    module = import_price_cache()
+    cache = module.PriceCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is module.MISSING
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_service_price_list_change_invalidates_reference_only():
+    module = import_price_cache()
+    module.cached_price("active_rate", "Part", "P1", "Standard", "2024-01-01", lambda: 1)
+    module.cached_price("active_rate", "Part", "P2", "Standard", "2024-01-01", lambda: 2)
+
+    doc = types.SimpleNamespace(reference_type="Part", reference_name="P1")
+    module.on_service_price_list_change(doc)
+
+    key_p1 = module.make_key("active_rate", "Part", "P1", "Standard", "2024-01-01")
+    key_p2 = module.make_key("active_rate", "Part", "P2", "Standard", "2024-01-01")
+    # Nothing is dropped until the write commits
+    assert module.price_cache.get(key_p1) == 1
+
+    module.frappe.db.after_commit.run()
+    assert module.price_cache.get(key_p1) is module.MISSING
+    assert module.price_cache.get(key_p2) == 2
+
+
+def test_item_price_change_invalidates_price_list():
+    module = import_price_cache()
+    module.cached_price("item_price", "Part", "P1", "Standard", "2024-01-01", lambda: 1)
+    module.cached_price("item_price", "Part", "P1", "Wholesale", "2024-01-01", lambda: 2)
+
+    module.on_item_price_change(types.SimpleNamespace(price_list="Standard"))
+    module.frappe.db.after_commit.run()
+
+    assert module.price_cache.get(module.make_key("item_price", "Part", "P1", "Standard", "2024-01-01")) is module.MISSING
+    assert module.price_cache.get(module.make_key("item_price", "Part", "P1", "Wholesale", "2024-01-01")) == 2
+
+
+def test_invalidation_in_other_process_clears_local_entries():
+    shared_cache = SharedCache()
+    module = import_price_cache(shared_cache)
+    module.cached_price("item_price", "Part", "P1", "Standard", "2024-01-01", lambda: 1)
+
+    # Another worker invalidates through the shared generation counter
+    other_worker = module.PriceCache()
+    other_worker.invalidate(price_list="Standard")
+
+    key = module.make_key("item_price", "Part", "P1", "Standard", "2024-01-01")
+    assert module.price_cache.get(key) is module.MISSING
@@ -89,3 +89,83 @@ def test_resolve_rate_falls_back_to_service_price_list():
     assert called is True
     assert result["rate"] == 300
     assert result["source"] == "Service Price List"
+
+
+def setup_bulk_pricing_module(part_count):
+    """Import pricing with a stub that serves `part_count` Parts and records queries."""
+    module = import_pricing_module([])
+    frappe = sys.modules["frappe"]
+    queries = []
+
+    parts = {f"PART-{i:03d}": f"ITEM-{i:03d}" for i in range(part_count)}
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        queries.append(doctype)
+        if doctype == "Part":
+            return [
+                types.SimpleNamespace(name=name, item=parts[name])
+                for name in filters["name"][1]
+                if name in parts
+            ]
+        if doctype == "Item Price":
+            # Even items have an Item Price, odd ones fall back
+            return [
+                types.SimpleNamespace(item_code=code, price_list_rate=100, currency="IDR")
+                for code in filters["item_code"][1]
+                if int(code[-3:]) % 2 == 0
+            ]
+        if doctype == "Item Tax Template Item":
+            return [
+                types.SimpleNamespace(parent=code, item_tax_template="PPN")
+                for code in filters["parent"][1]
+            ]
+        if doctype == "Service Price List":
+            return [
+                types.SimpleNamespace(
+                    reference_type="Part",
+                    reference_name=name,
+                    rate=75,
+                    currency="IDR",
+                    tax_template=None,
+                )
+                for name in filters["reference_name"][1]
+            ]
+        return []
+
+    frappe.get_all = get_all
+    module.frappe = frappe
+    return module, list(parts), queries
+
+
+def test_resolve_rates_bulk_matches_resolve_rate_shape():
+    module, names, _ = setup_bulk_pricing_module(2)
+    result = module.resolve_rates_bulk(
+        [("Part", name) for name in names], "Standard", "2024-01-01"
+    )
+
+    assert result[("Part", "PART-000")] == {
+        "rate": 100,
+        "currency": "IDR",
+        "tax_template": "PPN",
+        "source": "Item Price",
+    }
+    assert result[("Part", "PART-001")] == {
+        "rate": 75,
+        "currency": "IDR",
+        "source": "Service Price List",
+        "tax_template": None,
+        "found": True,
+    }
+
+
+def test_resolve_rates_bulk_query_count_is_constant():
+    module, names, small_queries = setup_bulk_pricing_module(3)
+    module.resolve_rates_bulk([("Part", name) for name in names], "Standard", "2024-01-01")
+
+    module, names, large_queries = setup_bulk_pricing_module(200)
+    result = module.resolve_rates_bulk(
+        [("Part", name) for name in names], "Standard", "2024-01-01"
+    )
+
+    assert len(result) == 200
+    assert len(large_queries) == len(small_queries) == 4
@@ -0,0 +1,150 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(balances):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+    frappe.permission_checks = []
+    frappe.denied = set()
+
+    def throw(msg):
+        raise Exception(msg)
+
+    def sql(query, values, as_dict=False):
+        frappe.queries.append(values)
+        return [AttrDict(row) for row in balances]
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.queries.append(doctype)
+        if doctype == "Item":
+            return [
+                AttrDict(name=code, item_name=f"Item {code}", stock_uom="Nos", valuation_rate=5)
+                for code in filters["name"][1]
+            ]
+        return []
+
+    def get_doc(*args, **kwargs):
+        raise AssertionError("documents should not be loaded")
+
+    def has_permission(doctype, ptype="read", doc=None, throw=False):
+        frappe.permission_checks.append((doctype, ptype, doc))
+        if doc in frappe.denied and throw:
+            raise Exception("Not permitted")
+        return doc not in frappe.denied
+
+    frappe.throw = throw
+    frappe.db = types.SimpleNamespace(sql=sql)
+    frappe.get_all = get_all
+    frappe.get_doc = get_doc
+    frappe.has_permission = has_permission
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.__path__ = []
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.nowdate = lambda: "2024-01-01"
+    utils.nowtime = lambda: "00:00:00"
+    frappe.utils = utils
+
+    background_jobs = types.ModuleType("frappe.utils.background_jobs")
+    background_jobs.enqueue = lambda *args, **kwargs: None
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        pass
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.utils.background_jobs"] = background_jobs
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_return_material():
+    module_name = "car_workshop.car_workshop.doctype.return_material.return_material"
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+BALANCES = [
+    {"work_order_item": "WOP-1", "part": "P1", "item_code": "I1", "rate": 3, "consumed_qty": 3, "returned_qty": 1},
+    {"work_order_item": "WOP-2", "part": "P2", "item_code": "I2", "rate": 3, "consumed_qty": 0, "returned_qty": 2},
+    {"work_order_item": "WOP-3", "part": "P3", "item_code": "I3", "rate": 3, "consumed_qty": 0, "returned_qty": 0},
+]
+
+
+def test_returnable_items_use_aggregate_balances():
+    frappe = setup_frappe_stub(BALANCES)
+    module = import_return_material()
+
+    items = module.get_returnable_items("WO-001")
+
+    assert frappe.queries == [{"work_order": "WO-001"}, "Item"]
+    assert len(items) == 1
+    assert items[0]["work_order_item"] == "WOP-1"
+    assert items[0]["qty"] == 3
+    assert items[0]["already_returned"] == 1
+    assert items[0]["amount"] == 15
+
+
+def test_validation_reads_net_balances_once():
+    frappe = setup_frappe_stub(BALANCES)
+    module = import_return_material()
+
+    rm = module.ReturnMaterial()
+    rm.name = "RM-002"
+    rm.work_order = "WO-001"
+    rm.items = [
+        types.SimpleNamespace(part="P1", item_code=None, qty=2, work_order_item=None, amount=None, valuation_rate=3),
+        types.SimpleNamespace(part="P1", item_code="I1", qty=2, work_order_item=None, amount=None, valuation_rate=3),
+    ]
+
+    with pytest.raises(Exception, match="exceeds available quantity 1"):
+        rm.validate_qty_against_work_order()
+
+    assert frappe.queries == [{"work_order": "WO-001"}]
+    assert rm.items[0].item_code == "I1"
+
+
+def test_return_balance_matches_work_order_item_first():
+    frappe = setup_frappe_stub(BALANCES + [
+        {"work_order_item": "WOP-4", "part": "P1", "item_code": "I1", "rate": 3, "consumed_qty": 1, "returned_qty": 0},
+    ])
+    module = import_return_material()
+
+    assert module.get_return_balance("WO-001", "I1") == {
+        "work_order_item": "WOP-1", "consumed_qty": 3, "returned_qty": 1,
+    }
+    assert module.get_return_balance("WO-001", "I1", "WOP-4")["consumed_qty"] == 1
+    assert module.get_return_balance("WO-001", "I9") is None
+    assert frappe.permission_checks[0] == ("Work Order", "read", "WO-001")
+
+
+def test_return_balance_requires_work_order_read_permission():
+    frappe = setup_frappe_stub(BALANCES)
+    frappe.denied.add("WO-001")
+    module = import_return_material()
+
+    with pytest.raises(Exception, match="Not permitted"):
+        module.get_return_balance("WO-001", "I1")
+    assert frappe.queries == []
@@ -0,0 +1,158 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+class Target:
+    def __init__(self):
+        self.items = []
+        self.taxes_and_charges = None
+        self.customer = None
+        self.due_date = None
+        self.name = "SINV-0001"
+        self.saved = False
+
+    def save(self):
+        self.saved = True
+
+    def append(self, table, values):
+        row = types.SimpleNamespace(**values)
+        getattr(self, table).append(row)
+        return row
+
+
+def setup_mapping_module(default_service_item="EXT-SERVICE"):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.throw = lambda msg: (_ for _ in ()).throw(Exception(msg))
+    queries = []
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        queries.append(doctype)
+        return [AttrDict(name=name, item=f"ITEM-{name}") for name in filters["name"][1]]
+
+    def get_single_value(doctype, fieldname):
+        queries.append(doctype)
+        return default_service_item
+
+    def get_value(*args, **kwargs):
+        queries.append(args[0])
+        return None
+
+    frappe.get_all = get_all
+    frappe.db = types.SimpleNamespace(get_single_value=get_single_value, get_value=get_value)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda value: float(value or 0)
+    utils.fmt_money = lambda value, precision, symbol="": f"{symbol}{value}"
+    frappe.get_doc = lambda *args, **kwargs: (_ for _ in ()).throw(
+        AssertionError("Work Order Billing should not be reloaded")
+    )
+    frappe.new_doc = lambda doctype: Target()
+    frappe.db.set_value = lambda *args: queries.append(args[0])
+
+    mapper = types.ModuleType("frappe.model.mapper")
+
+    def map_doc(source, target, table_map):
+        for source_field, target_field in table_map["field_map"].items():
+            setattr(target, target_field, source.get(source_field))
+
+    mapper.map_doc = map_doc
+    document = types.ModuleType("frappe.model.document")
+    document.Document = object
+    model = types.ModuleType("frappe.model")
+    model.mapper = mapper
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.mapper"] = mapper
+    sys.modules["frappe.model.document"] = document
+    for name in ("car_workshop.utils", "car_workshop.utils.tax_template_cache",
+                 "car_workshop.mapping.work_order_billing_to_sales_invoice"):
+        sys.modules.pop(name, None)
+    module = importlib.import_module("car_workshop.mapping.work_order_billing_to_sales_invoice")
+    return module, queries
+
+
+def build_billing(count):
+    return AttrDict(
+        job_type_items=[
+            AttrDict(job_type=f"JT-{i}", job_type_name="Job", hours=1, rate=10, amount=10)
+            for i in range(count)
+        ],
+        service_package_items=[
+            AttrDict(service_package=f"SP-{i}", service_package_name="Pack", quantity=1, rate=10, amount=10)
+            for i in range(count)
+        ],
+        part_items=[
+            AttrDict(part=f"PT-{i}", part_name="Part", quantity=1, rate=10, amount=10)
+            for i in range(count)
+        ],
+        external_service_items=[
+            AttrDict(service_name="Towing", rate=10, amount=10) for i in range(count)
+        ],
+        taxes_and_charges=None,
+        discount_amount=0,
+    )
+
+
+def test_add_item_rows_maps_all_sections():
+    module, _ = setup_mapping_module()
+    target = Target()
+    module.add_item_rows(build_billing(1), target)
+
+    assert [row.item_code for row in target.items] == [
+        "ITEM-JT-0", "ITEM-SP-0", "ITEM-PT-0", "EXT-SERVICE"
+    ]
+
+
+def test_add_item_rows_query_count_is_constant():
+    module, small_queries = setup_mapping_module()
+    module.add_item_rows(build_billing(1), Target())
+
+    module, large_queries = setup_mapping_module()
+    target = Target()
+    module.add_item_rows(build_billing(50), target)
+
+    assert len(target.items) == 200
+    assert len(large_queries) == len(small_queries) == 4
+
+
+def test_add_item_rows_requires_default_external_service_item():
+    module, _ = setup_mapping_module(default_service_item=None)
+
+    with pytest.raises(Exception):
+        module.add_item_rows(build_billing(1), Target())
+
+
+def test_map_to_sales_invoice_uses_the_loaded_billing():
+    module, queries = setup_mapping_module()
+    billing = build_billing(1)
+    billing.update(name="WOB-1", docstatus=1, sales_invoice=None, work_order="WO-1",
+                   customer="CUST-1", customer_name="Customer", due_date="2024-02-01")
+
+    assert module.map_to_sales_invoice("WOB-1", source_doc=billing) == "SINV-0001"
+    assert queries[-1] == "Work Order Billing"
+
+
+def test_add_item_rows_leaves_taxes_to_the_template():
+    module, queries = setup_mapping_module()
+    billing = build_billing(1)
+    billing.taxes_and_charges = "PPN 11%"
+    target = Target()
+    module.add_item_rows(billing, target)
+
+    assert target.taxes_and_charges == "PPN 11%"
+    assert not hasattr(target, "taxes")
+    assert "Sales Taxes and Charges" not in queries
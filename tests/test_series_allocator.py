@@ -0,0 +1,254 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class Cache:
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+        self.hashes = {}
+
+    def make_key(self, key):
+        return key
+
+    def get(self, key):
+        value = self.values.get(key)
+        return None if value is None else str(value).encode()
+
+    def set(self, key, value, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = int(value)
+        return True
+
+    def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, cache):
+        self.cache = cache
+        self.commands = []
+
+    def lpop(self, key):
+        self.commands.append(lambda: (self.cache.lists.get(key) or [None]).pop(0))
+
+    def rpush(self, key, value):
+        self.commands.append(lambda: self.cache.lists.setdefault(key, []).append(value.encode()))
+
+    def hset(self, key, field, value):
+        self.commands.append(lambda: self.cache.hashes.setdefault(key, {}).__setitem__(field, value))
+
+    def hdel(self, key, field):
+        self.commands.append(lambda: self.cache.hashes.get(key, {}).pop(field, None))
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+    def reset(self):
+        self.callbacks = []
+
+
+def setup_frappe_stub(series_current=None, max_used=None):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.shared_cache = Cache()
+    frappe.cache = lambda: frappe.shared_cache
+    frappe.local = types.SimpleNamespace(site="site1.local")
+    frappe.queries = []
+    frappe.autonamed = []
+    frappe.series = {}
+
+    def sql(query, values=None):
+        frappe.queries.append((" ".join(query.split()), values))
+        if "INSERT INTO `tabSeries`" in query:
+            current = max(frappe.series.get(values["prefix"], 0), values["current"])
+            frappe.series[values["prefix"]] = current
+        if "SELECT current FROM `tabSeries`" in query:
+            current = frappe.series.get(values["prefix"], series_current)
+            return [(current,)] if current is not None else []
+        if "SELECT MAX" in query:
+            return [(max_used,)]
+        return []
+
+    frappe.db = types.SimpleNamespace(sql=sql, after_rollback=CallbackManager())
+
+    naming = types.ModuleType("frappe.model.naming")
+
+    def make_autoname(pattern):
+        frappe.autonamed.append(pattern)
+        return pattern
+
+    naming.make_autoname = make_autoname
+    naming.parse_naming_series = lambda series: series.replace(".YYYY.", "2026").rstrip(".")
+
+    model = types.ModuleType("frappe.model")
+    model.naming = naming
+
+    utils = types.ModuleType("frappe.utils")
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.naming"] = naming
+    return frappe
+
+
+def import_allocator():
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.series_allocator", None)
+    return importlib.import_module("car_workshop.utils.series_allocator")
+
+
+def series_writes(frappe):
+    return [values for query, values in frappe.queries if "INSERT INTO `tabSeries`" in query]
+
+
+def test_numbers_come_from_blocks_seeded_past_existing_names():
+    frappe = setup_frappe_stub(series_current=7, max_used=12)
+    allocator = import_allocator()
+
+    names = [allocator.make_series_name("Work Order", "WO-.YYYY.-.", 6, 3) for _ in range(4)]
+
+    assert names == ["WO-2026-000013", "WO-2026-000014", "WO-2026-000015", "WO-2026-000016"]
+    assert frappe.shared_cache.values["car_workshop:series_counter:WO-2026-"] == 18
+    # tabSeries is raised to the end of each block once
+    assert series_writes(frappe) == [
+        {"prefix": "WO-2026-", "current": 15},
+        {"prefix": "WO-2026-", "current": 18},
+    ]
+    assert frappe.autonamed == []
+
+
+def test_counter_lost_with_the_cache_is_reseeded_past_handed_out_blocks():
+    frappe = setup_frappe_stub()
+    first_worker = import_allocator()
+    assert first_worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0001"
+
+    frappe.shared_cache.values.clear()
+    second_worker = import_allocator()
+
+    assert second_worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0011"
+    seeds = [query for query, values in frappe.queries if "SELECT current" in query]
+    assert all(query.endswith("FOR UPDATE") for query in seeds)
+
+
+def test_block_size_zero_leaves_the_cache_out():
+    frappe = setup_frappe_stub()
+    frappe.cache = lambda: (_ for _ in ()).throw(AssertionError("cache should not be used"))
+    allocator = import_allocator()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 0) == "WO-.YYYY.-.####"
+    assert frappe.queries == []
+
+
+def test_workers_share_the_counter_without_overlap():
+    frappe = setup_frappe_stub()
+    first_worker = import_allocator()
+    first = first_worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 5)
+
+    # A second process has its own blocks but the same shared counter
+    second_worker = import_allocator()
+    second = second_worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 5)
+
+    assert (first, second) == ("WO-2026-0001", "WO-2026-0006")
+    assert frappe.shared_cache.values["car_workshop:series_counter:WO-2026-"] == 10
+
+
+def test_sites_served_by_one_worker_get_their_own_blocks():
+    frappe = setup_frappe_stub()
+    allocator = import_allocator()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 5) == "WO-2026-0001"
+    # The other site has its own database and cache keys
+    frappe.local.site = "site2.local"
+    frappe.shared_cache.values.clear()
+    frappe.series.clear()
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 5) == "WO-2026-0001"
+
+
+def test_rolled_back_numbers_are_reused():
+    frappe = setup_frappe_stub()
+    allocator = import_allocator()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0001"
+    frappe.db.after_rollback.run()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0001"
+    frappe.db.after_rollback.reset()
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0002"
+    # The rolled back raise of the block was made again
+    assert len(series_writes(frappe)) == 2
+
+
+def test_unused_numbers_are_returned_on_exit_and_reused():
+    frappe = setup_frappe_stub()
+    worker = import_allocator()
+    worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10)
+    worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10)
+
+    open_blocks = frappe.shared_cache.hashes["car_workshop:series_open_blocks:WO-2026-"]
+    assert list(open_blocks.values()) == ["1-10"]
+
+    worker._return_unused_numbers()
+
+    assert frappe.shared_cache.lists["car_workshop:series_free_ranges:WO-2026-"] == [b"3-10"]
+    assert open_blocks == {}
+
+    # The next worker takes the free range before growing the counter
+    next_worker = import_allocator()
+    assert next_worker.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10) == "WO-2026-0003"
+    assert frappe.shared_cache.values["car_workshop:series_counter:WO-2026-"] == 10
+    assert list(open_blocks.values()) == ["3-10"]
+
+
+def test_fallback_raises_series_past_the_counter():
+    frappe = setup_frappe_stub()
+    allocator = import_allocator()
+    allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 10)
+
+    # Another worker reserved the next block
+    frappe.shared_cache.incrby("car_workshop:series_counter:WO-2026-", 10)
+    frappe.db.after_rollback.reset()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 1) == "WO-.YYYY.-.####"
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 1) == "WO-.YYYY.-.####"
+    assert series_writes(frappe)[1:] == [{"prefix": "WO-2026-", "current": 20}]
+
+    # A rolled back raise is made again
+    frappe.db.after_rollback.run()
+    allocator.make_series_name("Work Order", "WO-.YYYY.-.", 4, 1)
+    assert len(series_writes(frappe)) == 3
+
+
+def test_fallback_without_counter_checks_existing_names_once():
+    frappe = setup_frappe_stub(series_current=3, max_used=12)
+    allocator = import_allocator()
+
+    assert allocator.make_series_name("Work Order", "WO-.YYYY.-.", 5, 1) == "WO-.YYYY.-.#####"
+    allocator.make_series_name("Work Order", "WO-.YYYY.-.", 5, 1)
+
+    assert series_writes(frappe) == [{"prefix": "WO-2026-", "current": 12}]
+    assert frappe.autonamed == ["WO-.YYYY.-.#####", "WO-.YYYY.-.#####"]
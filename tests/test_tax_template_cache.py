@@ -0,0 +1,144 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+class FakeRedis:
+    """Minimal stand-in for the raw hash commands used on frappe.cache()."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+        self.round_trips = 0
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def hmget(self, key, fields):
+        self.round_trips += 1
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def expire(self, key, ttl):
+        self.round_trips += 1
+        self.expiry[key] = ttl
+
+    def delete_value(self, name):
+        self.round_trips += 1
+        self.hashes.pop(self.make_key(name), None)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping):
+        self.commands.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def ttl(self, key):
+        self.commands.append(lambda: self.redis.expiry.get(key, -1))
+
+    def hdel(self, key, *fields):
+        self.commands.append(lambda: [self.redis.hashes.get(key, {}).pop(f, None) for f in fields])
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [command() for command in self.commands]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+def setup_module_under_test(template_rows):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe._dict = AttrDict
+    frappe.queries = []
+    frappe.redis = FakeRedis()
+    frappe.cache = lambda: frappe.redis
+    frappe.db = types.SimpleNamespace(after_commit=CallbackManager())
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        frappe.queries.append((doctype, sorted(filters["parent"][1])))
+        return [
+            AttrDict(parent=parent, **row)
+            for parent in filters["parent"][1]
+            for row in template_rows.get(parent, [])
+        ]
+
+    frappe.get_all = get_all
+    utils = types.ModuleType("frappe.utils")
+    utils.fmt_money = lambda value, precision, symbol="": f"{symbol}{value}"
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.tax_template_cache", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    return importlib.import_module("car_workshop.utils.tax_template_cache"), frappe
+
+
+def test_templates_are_loaded_once_and_shared():
+    module, frappe = setup_module_under_test({
+        "PPN 11%": [{"charge_type": "On Net Total", "rate": 11}],
+    })
+
+    first = module.get_template_taxes("Sales Taxes and Charges Template", "PPN 11%")
+    first[0]["rate"] = 0
+    second = module.get_template_taxes("Sales Taxes and Charges Template", "PPN 11%")
+
+    assert second[0].rate == 11
+    assert frappe.queries == [("Sales Taxes and Charges", ["PPN 11%"])]
+
+
+def test_bulk_lookup_loads_only_missing_templates_in_one_query():
+    module, frappe = setup_module_under_test({
+        "A": [{"charge_type": "On Net Total", "rate": 10}],
+        "B": [{"charge_type": "Actual", "rate": 0}],
+    })
+    module.get_template_taxes("Purchase Taxes and Charges Template", "A")
+
+    taxes = module.get_templates_taxes("Purchase Taxes and Charges Template", ["A", "B", "C"])
+
+    assert taxes["B"][0].charge_type == "Actual"
+    assert taxes["C"] == []
+    assert frappe.queries[-1] == ("Purchase Taxes and Charges", ["B", "C"])
+    assert len(frappe.queries) == 2
+    # Both new entries go out in one write; the hash gets an expiry once
+    assert frappe.redis.expiry == {"site|car_workshop:tax_templates": module.TAX_TEMPLATE_CACHE_TTL}
+
+
+def test_template_change_clears_cached_rows():
+    rows = {"PPN": [{"charge_type": "On Net Total", "rate": 10}]}
+    module, frappe = setup_module_under_test(rows)
+    module.get_template_taxes("Sales Taxes and Charges Template", "PPN")
+
+    rows["PPN"] = [{"charge_type": "On Net Total", "rate": 12}]
+    module.clear_tax_template_cache(
+        types.SimpleNamespace(doctype="Sales Taxes and Charges Template", name="PPN")
+    )
+    # Cleared only once the template write commits
+    assert module.get_template_taxes("Sales Taxes and Charges Template", "PPN")[0].rate == 10
+
+    frappe.db.after_commit.run()
+    assert module.get_template_taxes("Sales Taxes and Charges Template", "PPN")[0].rate == 12
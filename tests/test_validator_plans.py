@@ -0,0 +1,201 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+class Cache:
+    def __init__(self):
+        self.values = {}
+
+    def make_key(self, key):
+        return key
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+        return self.values[key]
+
+
+def setup_frappe_stub(hooks=None):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.local = types.SimpleNamespace(site="site1")
+    frappe.db = types.SimpleNamespace()
+    frappe.shared_cache = Cache()
+    frappe.cache = lambda: frappe.shared_cache
+    frappe.get_hooks = lambda name: (hooks or {}).get(name, [])
+
+    def throw(msg):
+        raise Exception(msg)
+
+    frappe.throw = throw
+
+    utils = types.ModuleType("frappe.utils")
+    utils.cint = lambda v: int(v or 0)
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    return frappe
+
+
+def import_utils():
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.validator_plans", None)
+    return importlib.import_module("car_workshop.utils")
+
+
+class CountingFields(list):
+    """Field list that counts how often it is walked"""
+
+    walks = 0
+
+    def __iter__(self):
+        CountingFields.walks += 1
+        return super().__iter__()
+
+
+def make_meta(name="Work Order", modified="2024-01-01", extra_fields=()):
+    return AttrDict(
+        name=name,
+        modified=modified,
+        fields=CountingFields([
+            AttrDict(fieldname="customer", label="Customer", fieldtype="Link", reqd=1),
+            AttrDict(fieldname="remarks", label="Remarks", fieldtype="Small Text"),
+            AttrDict(fieldname="total", label="Total", fieldtype="Currency"),
+            AttrDict(fieldname="version", label="Version", fieldtype="Int"),
+            *extra_fields,
+        ]),
+    )
+
+
+class Doc:
+    def __init__(self, meta, **values):
+        self.meta = meta
+        self.values = values
+
+    def get(self, fieldname):
+        return self.values.get(fieldname)
+
+    def __setattr__(self, key, value):
+        if key in ("meta", "values"):
+            object.__setattr__(self, key, value)
+        else:
+            self.values[key] = value
+
+
+def test_plan_is_compiled_once_and_checks_listed_fields():
+    setup_frappe_stub()
+    utils = import_utils()
+    meta = make_meta()
+
+    doc = Doc(meta, customer="C-1", total=5, version=1)
+    utils.validate_mandatory_fields(doc)
+    utils.validate_mandatory_fields(doc)
+    walks = CountingFields.walks
+
+    with pytest.raises(Exception, match="Customer is mandatory"):
+        utils.validate_mandatory_fields(Doc(meta, total=1))
+    with pytest.raises(Exception, match="Total cannot be negative"):
+        utils.validate_mandatory_fields(Doc(meta, customer="C-1", total=-1))
+
+    assert doc.get("version") == 3
+    assert CountingFields.walks == walks
+
+    plan = importlib.import_module("car_workshop.utils.validator_plans").get_validator_plan(meta)
+    assert plan.mandatory == (("customer", "Customer"),)
+    assert plan.numeric == (("total", "Total"), ("version", "Version"))
+
+
+def test_meta_changes_and_customisations_recompile_the_plan():
+    frappe = setup_frappe_stub()
+    utils = import_utils()
+    plans = importlib.import_module("car_workshop.utils.validator_plans")
+
+    first = plans.get_validator_plan(make_meta())
+    assert plans.get_validator_plan(make_meta()) is first
+
+    extra = AttrDict(fieldname="mileage", label="Mileage", fieldtype="Int", reqd=1)
+    changed = plans.get_validator_plan(make_meta(extra_fields=[extra]))
+    assert changed is not first
+    assert ("mileage", "Mileage") in changed.mandatory
+
+    # Another worker cleared the plans; the next request notices
+    frappe.shared_cache.incr(plans.GENERATION_KEY)
+    frappe.local = types.SimpleNamespace(site="site1")
+    assert plans.get_validator_plan(make_meta(extra_fields=[extra])) is not changed
+
+    utils.validate_mandatory_fields(Doc(make_meta(), customer="C-1"))
+
+
+def test_plans_are_kept_per_site():
+    frappe = setup_frappe_stub()
+    # Cache keys are prefixed with the site
+    caches = {"site1": Cache(), "site2": Cache()}
+    frappe.cache = lambda: caches[frappe.local.site]
+    import_utils()
+    plans = importlib.import_module("car_workshop.utils.validator_plans")
+
+    first = plans.get_validator_plan(make_meta())
+    frappe.local = types.SimpleNamespace(site="site2")
+    assert plans.get_validator_plan(make_meta()) is not first
+
+    # Clearing one site leaves the other site's plans alone
+    plans.clear_validator_plans()
+    frappe.local = types.SimpleNamespace(site="site1")
+    assert plans.get_validator_plan(make_meta()) is first
+
+
+def test_customisations_clear_the_plans_after_commit():
+    frappe = setup_frappe_stub()
+    callbacks = []
+    frappe.db.after_commit = types.SimpleNamespace(add=callbacks.append)
+    import_utils()
+    plans = importlib.import_module("car_workshop.utils.validator_plans")
+
+    plans.clear_validator_plans()
+    assert frappe.shared_cache.values == {}
+
+    # A plan compiled before the commit still sees the old meta
+    stale = plans.get_validator_plan(make_meta())
+    for callback in callbacks:
+        callback()
+
+    assert frappe.shared_cache.values == {plans.GENERATION_KEY: 1}
+    assert plans.get_validator_plan(make_meta()) is not stale
+
+
+def test_excluded_doctypes_are_skipped():
+    setup_frappe_stub({
+        "validate_mandatory_fields_exclude": ["Sales Invoice"],
+    })
+    utils = import_utils()
+
+    doc = Doc(make_meta("Sales Invoice"), total=-10, version=1)
+    utils.validate_mandatory_fields(doc)
+
+    assert doc.get("version") == 1
+
+
+def test_include_hook_restricts_validation():
+    setup_frappe_stub({
+        "validate_mandatory_fields_include": ["Work Order"],
+    })
+    utils = import_utils()
+
+    utils.validate_mandatory_fields(Doc(make_meta("Customer"), total=-1))
+    with pytest.raises(Exception, match="cannot be negative"):
+        utils.validate_mandatory_fields(Doc(make_meta("Work Order"), customer="C-1", total=-1))
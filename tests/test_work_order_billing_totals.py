@@ -0,0 +1,119 @@
+import copy
+import sys
+import types
+from pathlib import Path
+
+
+class Row(types.SimpleNamespace):
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class Document(Row):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.flags = {}
+
+    def set(self, key, value):
+        setattr(self, key, value)
+
+
+frappe_utils_stub = types.SimpleNamespace(
+    flt=lambda x: float(x or 0),
+    cint=lambda x: int(x or 0),
+    getdate=lambda x: x,
+    nowdate=lambda: "2024-01-01",
+    add_days=lambda date, days: date,
+    get_datetime=lambda: "2024-01-01 00:00:00",
+    fmt_money=lambda value, precision, symbol="": f"{symbol}{value}",
+)
+
+frappe_stub = types.SimpleNamespace(
+    _=lambda msg: msg,
+    throw=lambda *a, **k: (_ for _ in ()).throw(Exception(a[0] if a else "")),
+    utils=frappe_utils_stub,
+    session=types.SimpleNamespace(user="test_user"),
+    whitelist=lambda *a, **k: (lambda f: f),
+)
+frappe_stub.model = types.SimpleNamespace(document=types.SimpleNamespace(Document=Document))
+
+sys.modules['frappe'] = frappe_stub
+sys.modules['frappe.model'] = frappe_stub.model
+sys.modules['frappe.model.document'] = frappe_stub.model.document
+sys.modules['frappe.utils'] = frappe_utils_stub
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Other test files import these modules against their own frappe stub
+for name in ("car_workshop.utils", "car_workshop.utils.cache_utils",
+             "car_workshop.utils.tax_template_cache",
+             "car_workshop.car_workshop.doctype.work_order_billing.work_order_billing"):
+    sys.modules.pop(name, None)
+
+from car_workshop.car_workshop.doctype.work_order_billing.work_order_billing import WorkOrderBilling
+
+
+def make_billing(before=None, **kwargs):
+    values = dict(
+        job_type_items=[Row(name="JT1", hours=2, rate=100, amount=0)],
+        service_package_items=[Row(name="SP1", quantity=1, rate=300, amount=0)],
+        part_items=[Row(name="PT1", quantity=3, rate=50, amount=0)],
+        external_service_items=[Row(name="EX1", rate=40, amount=0)],
+        payment_details=[Row(name="PAY1", amount=100)],
+        taxes_and_charges=None,
+        discount_amount=0,
+        down_payment_type="Fixed",
+        down_payment_amount=0,
+    )
+    values.update(kwargs)
+    billing = WorkOrderBilling(**values)
+    billing.get_doc_before_save = lambda: before
+    return billing
+
+
+def test_calculate_totals_for_new_document():
+    billing = make_billing()
+    billing.calculate_totals()
+
+    assert billing.total_services_amount == 500
+    assert billing.total_parts_amount == 150
+    assert billing.total_external_services_amount == 40
+    assert billing.subtotal == 690
+    assert billing.grand_total == 690
+    assert billing.payment_amount == 100
+    assert billing.balance_amount == 590
+
+
+def test_calculate_totals_ignores_stale_saved_totals():
+    saved = make_billing()
+    saved.calculate_totals()
+    saved.total_external_services_amount = 45
+
+    billing = make_billing(before=saved)
+    billing.part_items = [Row(name="PT1", quantity=4, rate=50, amount=150)]
+
+    billing.calculate_totals()
+
+    assert billing.part_items[0].amount == 200
+    assert billing.total_parts_amount == 200
+    assert billing.total_services_amount == 500
+    assert billing.total_external_services_amount == 40
+    assert billing.subtotal == 740
+    assert billing.payment_amount == 100
+
+
+def test_calculate_totals_resums_payments_when_they_change():
+    saved = make_billing()
+    saved.calculate_totals()
+
+    billing = make_billing(before=saved)
+    for table in ("job_type_items", "service_package_items", "part_items", "external_service_items"):
+        setattr(billing, table, copy.deepcopy(getattr(saved, table)))
+    billing.payment_details = [Row(name="PAY1", amount=100), Row(name="PAY2", amount=250)]
+    billing.discount_amount = 40
+
+    billing.calculate_totals()
+
+    assert billing.payment_amount == 350
+    assert billing.grand_total == 650
+    assert billing.balance_amount == 300
@@ -0,0 +1,139 @@
+import importlib
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+# Names do not follow creation order: WO-2024-10000 outgrew the padding and
+# WO-2024-0003 was handed out by another worker's block after WO-2024-0004
+WORK_ORDERS = [
+    AttrDict(name=name, creation=creation, status=status, required_part_qty=4)
+    for name, creation, status in (
+        ("WO-2024-9999", "2024-01-01 09:00:00.000001", "In Progress"),
+        ("WO-2024-0004", "2024-01-01 10:00:00.000000", "Completed"),
+        ("WO-2024-0003", "2024-01-01 10:00:00.000000", "In Progress"),
+        ("WO-2024-0001", "2024-01-01 11:00:00.000000", "Completed"),
+        ("WO-2024-10000", "2024-01-01 12:00:00.000000", "In Progress"),
+    )
+]
+
+
+def setup_frappe_stub():
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    frappe.parse_json = json.loads
+
+    def throw(msg):
+        raise Exception(msg)
+
+    frappe.throw = throw
+    frappe.list_calls = []
+    frappe.queries = []
+
+    def get_list(doctype, filters=None, or_filters=None, fields=None, order_by=None,
+                 limit_page_length=None):
+        frappe.list_calls.append((doctype, filters, or_filters, order_by, limit_page_length))
+        rows = sorted(WORK_ORDERS, key=lambda row: (row.creation, row.name), reverse=True)
+        if "status" in filters:
+            rows = [row for row in rows if row.status in filters["status"][1]]
+        if "creation" in filters:
+            rows = [row for row in rows if row.creation <= filters["creation"][1]]
+        if or_filters:
+            rows = [
+                row for row in rows
+                if row.creation < or_filters["creation"][1] or row.name < or_filters["name"][1]
+            ]
+        return [AttrDict(row) for row in rows[:limit_page_length]]
+
+    def sql(query, values=None, as_dict=False):
+        frappe.queries.append((" ".join(query.split()), values))
+        if "`tabWork Order Part Balance`" in query:
+            return [AttrDict(work_order="WO-2024-10000", issued_qty=3)]
+        if "`tabWork Order Billing`" in query:
+            return [
+                AttrDict(work_order="WO-2024-10000", billing_status="Pending"),
+                AttrDict(work_order="WO-2024-10000", billing_status="Billed"),
+            ]
+        return []
+
+    frappe.get_list = get_list
+    frappe.db = types.SimpleNamespace(sql=sql)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    frappe.utils = utils
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    return frappe
+
+
+def import_api():
+    sys.modules.pop("car_workshop.api.work_order_api", None)
+    return importlib.import_module("car_workshop.api.work_order_api")
+
+
+def test_pages_follow_the_cursor_with_one_query_per_aggregate():
+    frappe = setup_frappe_stub()
+    api = import_api()
+
+    first = api.get_work_order_board(page_length=2)
+    assert [row.name for row in first["work_orders"]] == ["WO-2024-10000", "WO-2024-0001"]
+    assert first["next_cursor"] == "2024-01-01 11:00:00.000000|WO-2024-0001"
+    assert frappe.list_calls[0][2:] == (None, "creation desc, name desc", 3)
+
+    top = first["work_orders"][0]
+    assert (top.issued_qty, top.pending_qty, top.billing_status) == (3.0, 1.0, "Billed")
+    assert first["work_orders"][1].billing_status == "Unbilled"
+    assert len(frappe.queries) == 2
+    assert frappe.queries[0][1] == {"work_orders": ("WO-2024-10000", "WO-2024-0001")}
+
+    # The cursor splits the two Work Orders created in the same instant
+    second = api.get_work_order_board(after=first["next_cursor"], page_length=1)
+    assert [row.name for row in second["work_orders"]] == ["WO-2024-0004"]
+    assert frappe.list_calls[1][1]["creation"] == ["<=", "2024-01-01 11:00:00.000000"]
+    assert frappe.list_calls[1][2] == {
+        "creation": ["<", "2024-01-01 11:00:00.000000"], "name": ["<", "WO-2024-0001"],
+    }
+
+    last = api.get_work_order_board(after=second["next_cursor"], page_length=2)
+    assert [row.name for row in last["work_orders"]] == ["WO-2024-0003", "WO-2024-9999"]
+    assert last["next_cursor"] is None
+
+
+def test_status_filter_accepts_json_list():
+    frappe = setup_frappe_stub()
+    api = import_api()
+
+    result = api.get_work_order_board(status='["In Progress"]')
+
+    assert frappe.list_calls[0][1]["status"] == ["in", ["In Progress"]]
+    assert [row.name for row in result["work_orders"]] == ["WO-2024-10000", "WO-2024-0003", "WO-2024-9999"]
+
+
+def test_empty_page_skips_aggregate_queries():
+    frappe = setup_frappe_stub()
+    api = import_api()
+
+    assert api.get_work_order_board(status="Cancelled") == {"work_orders": [], "next_cursor": None}
+    assert frappe.queries == []
+
+
+def test_malformed_cursor_is_rejected():
+    setup_frappe_stub()
+    api = import_api()
+
+    with pytest.raises(Exception, match="Invalid Work Order board cursor"):
+        api.get_work_order_board(after="WO-2024-0004")
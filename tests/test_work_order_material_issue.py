@@ -0,0 +1,226 @@
+import importlib
+import json
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+class FakeRedis:
+    """Minimal stand-in for the raw hash commands used on frappe.cache()."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def expire(self, key, ttl):
+        self.expiry[key] = ttl
+
+    def delete_value(self, name):
+        self.hashes.pop(self.make_key(name), None)
+        self.expiry.pop(self.make_key(name), None)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping):
+        self.commands.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def ttl(self, key):
+        self.commands.append(lambda: self.redis.expiry.get(key, -1))
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+class CallbackManager:
+    def __init__(self):
+        self.callbacks = []
+
+    def add(self, fn):
+        self.callbacks.append(fn)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+WORK_ORDER_JSON = (
+    Path(__file__).resolve().parents[1]
+    / "car_workshop" / "car_workshop" / "doctype" / "work_order" / "work_order.json"
+)
+
+
+def work_order_fields():
+    return {field["fieldname"]: field for field in json.loads(WORK_ORDER_JSON.read_text())["fields"]}
+
+
+def setup_frappe_stub(part_count=50, set_warehouse="Stores"):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    frappe.session = types.SimpleNamespace(user="advisor@example.com")
+    frappe.redis = FakeRedis()
+    frappe.cache = lambda: frappe.redis
+    frappe.queries = []
+
+    work_order = AttrDict(
+        name="WO-001",
+        set_warehouse=set_warehouse,
+        part_detail=[
+            AttrDict(part=f"P-{i}", item_code=f"ITEM-{i % 10}", quantity=2)
+            for i in range(part_count)
+        ],
+    )
+
+    def get_all(doctype, filters=None, fields=None):
+        frappe.queries.append((doctype, filters))
+        return [
+            AttrDict(item_code=item_code, valuation_rate=5)
+            for item_code in filters["item_code"][1] if item_code != "ITEM-9"
+        ]
+
+    def get_value(doctype, filters, fieldname):
+        frappe.queries.append((doctype, filters))
+        return "EMP-001"
+
+    def get_mapped_doc(doctype, source_name, mapping, target_doc, set_missing_values):
+        target = AttrDict(rows=[])
+        for part in work_order.part_detail:
+            row = AttrDict(part=part.part, item_code=part.item_code, qty=part.quantity)
+            mapping["Work Order Part"]["postprocess"](part, row, work_order)
+            target.rows.append(row)
+        set_missing_values(work_order, target)
+        return target
+
+    frappe.get_doc = lambda doctype, name: work_order
+    frappe.get_all = get_all
+    def get_single_value(doctype, fieldname):
+        frappe.queries.append((doctype, fieldname))
+        return "Finished Goods"
+
+    frappe.db = types.SimpleNamespace(
+        get_value=get_value,
+        get_single_value=get_single_value,
+        after_commit=CallbackManager(),
+    )
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda *args: "2024-01-01"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+    mapper = types.ModuleType("frappe.model.mapper")
+
+    class Document:
+        def get(self, key):
+            return getattr(self, key, None)
+
+    document.Document = Document
+    mapper.get_mapped_doc = get_mapped_doc
+    model.document = document
+    model.mapper = mapper
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    sys.modules["frappe.model.mapper"] = mapper
+    return frappe
+
+
+def import_work_order():
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.employee_cache", None)
+    module_name = "car_workshop.car_workshop.doctype.work_order.work_order"
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+def test_bins_and_employee_cost_constant_queries():
+    frappe = setup_frappe_stub()
+    module = import_work_order()
+
+    target = module.make_material_issue("WO-001")
+
+    assert frappe.queries[0][0] == "Bin"
+    assert frappe.queries[0][1]["warehouse"] == "Stores"
+    assert sorted(frappe.queries[0][1]["item_code"][1]) == sorted(f"ITEM-{i}" for i in range(10))
+    assert frappe.queries[1] == ("Employee", {"user_id": "advisor@example.com"})
+    assert len(frappe.queries) == 2
+
+    assert target.issued_by == "EMP-001"
+    assert target.set_warehouse == "Stores"
+    assert target.rows[0].rate == 5.0 and target.rows[0].amount == 10.0
+    assert target.rows[9].rate == 0
+
+    # The employee is served from the shared cache next time
+    module.make_material_issue("WO-001")
+    assert [doctype for doctype, _ in frappe.queries] == ["Bin", "Employee", "Bin"]
+
+
+def test_employee_writes_drop_the_cached_mapping():
+    frappe = setup_frappe_stub()
+    import_work_order()
+    employee_cache = importlib.import_module("car_workshop.utils.employee_cache")
+
+    assert employee_cache.get_user_employee() == "EMP-001"
+    key = frappe.redis.make_key(employee_cache.USER_EMPLOYEE_KEY)
+    assert frappe.redis.expiry[key] == employee_cache.USER_EMPLOYEE_TTL
+
+    employee_cache.clear_user_employee_cache(AttrDict(name="EMP-001"), "on_update")
+
+    # The mapping survives until the Employee change is committed
+    employee_cache.get_user_employee()
+    assert [doctype for doctype, _ in frappe.queries] == ["Employee"]
+
+    frappe.db.after_commit.run()
+    employee_cache.get_user_employee()
+
+    assert [doctype for doctype, _ in frappe.queries] == ["Employee", "Employee"]
+
+
+def test_source_warehouse_is_a_work_order_field():
+    fields = work_order_fields()
+
+    assert fields["set_warehouse"]["fieldtype"] == "Link"
+    assert fields["set_warehouse"]["options"] == "Warehouse"
+
+    # The stubbed Work Order only uses fields of the real schema
+    setup_frappe_stub(part_count=1)
+    work_order = sys.modules["frappe"].get_doc("Work Order", "WO-001")
+    assert set(work_order) - {"name"} <= set(fields)
+
+
+def test_missing_source_warehouse_falls_back_to_stock_settings():
+    frappe = setup_frappe_stub(set_warehouse=None)
+    module = import_work_order()
+
+    target = module.make_material_issue("WO-001")
+
+    assert frappe.queries[0] == ("Stock Settings", "default_warehouse")
+    assert frappe.queries[1][1]["warehouse"] == "Finished Goods"
+    assert target.set_warehouse == "Finished Goods"
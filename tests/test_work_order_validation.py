@@ -12,10 +12,16 @@ class Document:
     def get(self, name):
         return getattr(self, name, None)
 
+    def is_new(self):
+        return not getattr(self, "name", None)
+
 frappe_utils_stub = types.SimpleNamespace(
     flt=lambda x: float(x or 0),
+    cint=lambda x: int(x or 0),
     nowdate=lambda: "2024-01-01",
     add_days=lambda date, days: date,
+    fmt_money=lambda value, *args, **kwargs: str(value),
+    now=lambda: "2024-01-01 00:00:00",
 )
 
 frappe_stub = types.SimpleNamespace(
@@ -23,6 +29,7 @@ frappe_stub = types.SimpleNamespace(
     throw=lambda msg: (_ for _ in ()).throw(Exception(msg)),
     utils=frappe_utils_stub,
     whitelist=lambda *args, **kwargs: (lambda f: f),
+    get_all=lambda *args, **kwargs: [],
 )
 
 # Setup model modules
@@ -47,6 +54,11 @@ sys.modules['frappe.utils'] = frappe_utils_stub
 # Ensure the package root is on the path
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+# Other test files import these modules against their own frappe stub
+for name in ("car_workshop.utils", "car_workshop.utils.part_movement_ledger",
+             "car_workshop.car_workshop.doctype.work_order.work_order"):
+    sys.modules.pop(name, None)
+
 from car_workshop.car_workshop.doctype.work_order.work_order import WorkOrder
 
 
@@ -76,3 +88,61 @@ def test_validate_important_fields_requires_detail():
     wo = create_work_order()
     with pytest.raises(Exception):
         wo.validate_important_fields()
+
+
+def test_validate_keeps_board_summary():
+    ns = types.SimpleNamespace
+    wo = create_work_order(
+        part_detail=[
+            ns(part="P-1", quantity=2, amount=40, source="Stok", purchase_order=None),
+            ns(part="P-2", quantity=1.5, amount=30, source="Beli Baru", purchase_order="WPO-1"),
+        ],
+        job_type_detail=[
+            ns(job_type="JT-1", price=100, is_opl=0, vendor=None, purchase_order=None),
+            ns(job_type="JT-2", price=50, is_opl=1, vendor="V-1", purchase_order=None),
+        ],
+        service_package_detail=[ns(total_price=200)],
+        external_expense=[ns(amount=25, purchase_order="WPO-2")],
+    )
+
+    wo.validate()
+
+    assert (wo.part_count, wo.job_type_count, wo.service_package_count, wo.expense_count) == (2, 2, 1, 1)
+    assert (wo.total_parts_amount, wo.total_labor_amount) == (70, 150)
+    assert (wo.total_package_amount, wo.total_external_amount) == (200, 25)
+    assert wo.total_amount == 445
+    assert wo.required_part_qty == 3.5
+    # P-1 and the OPL job type JT-2
+    assert wo.lines_without_po == 2
+
+
+def test_validate_takes_consumed_qty_from_ledger(monkeypatch):
+    from car_workshop.utils import part_movement_ledger
+
+    ns = types.SimpleNamespace
+    wo = create_work_order(
+        name="WO-001",
+        part_detail=[
+            ns(part="P-1", item_code="I-1", quantity=2, amount=40, source="Stok",
+               purchase_order=None, consumed_qty=9),
+            ns(part="P-2", item_code="I-2", quantity=1, amount=30, source="Stok",
+               purchase_order=None, consumed_qty=4),
+        ],
+    )
+    calls = []
+
+    class Row(dict):
+        __getattr__ = dict.get
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        calls.append((doctype, filters))
+        return [Row(item_code="I-1", part="P-1", issued_qty=3, returned_qty=1)]
+
+    # Patch the frappe the ledger module was imported with
+    monkeypatch.setattr(part_movement_ledger.frappe, "get_all", get_all)
+    wo.validate()
+
+    # Values posted by the form are replaced by the ledger balances
+    assert [part.consumed_qty for part in wo.part_detail] == [2, 0]
+    assert len(calls) == 1
+    assert calls[0][0] == "Work Order Part Balance"
@@ -7,6 +7,11 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 
+class AttrDict(dict):
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
 def setup_frappe_stub():
     frappe = types.ModuleType("frappe")
     frappe._ = lambda m: m
@@ -34,7 +39,6 @@ def setup_frappe_stub():
                 part="PART-001",
                 part_name="Test Part",
                 item_code="ITEM-001",
-                consumed_qty=1,
                 quantity=3,
                 name="WO_PART_1",
             )
@@ -42,7 +46,14 @@ def setup_frappe_stub():
         return types.SimpleNamespace()
 
     frappe.get_doc = get_doc
-    frappe.get_all = lambda *args, **kwargs: []
+
+    def get_all(doctype, *args, **kwargs):
+        if doctype == "Work Order Part Balance":
+            return [frappe._dict(item_code="ITEM-001", part="PART-001", issued_qty=3, returned_qty=1)]
+        return []
+
+    frappe.get_all = get_all
+    frappe._dict = AttrDict
     utils = types.ModuleType("frappe.utils")
     utils.flt = float
     utils.cint = int
@@ -55,6 +66,18 @@ def setup_frappe_stub():
     frappe.get_desk_link = lambda doctype, name: name
     frappe.log_error = lambda *args, **kwargs: None
     frappe.defaults = types.SimpleNamespace(get_user_default=lambda key: "Test Company")
+    frappe.local = types.SimpleNamespace()
+    frappe.cache = lambda: types.SimpleNamespace(
+        make_key=lambda key: key,
+        hmget=lambda key, fields: [None] * len(fields),
+        pipeline=lambda: types.SimpleNamespace(
+            hset=lambda *args, **kwargs: None, ttl=lambda key: None, execute=lambda: [None, 1]
+        ),
+    )
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, **kwargs: str(value)
+    frappe.session = types.SimpleNamespace(user="Administrator")
+    frappe.generate_hash = lambda length=10: "HASH"
 
     class StockEntryStub:
         def __init__(self):
@@ -114,6 +137,10 @@ def setup_frappe_stub():
 
 
 def import_doctype(module_name):
+    sys.modules.pop("car_workshop.utils", None)
+    sys.modules.pop("car_workshop.utils.part_movement_ledger", None)
+    sys.modules.pop("car_workshop.utils.cache_utils", None)
+    sys.modules.pop("car_workshop.utils.part_snapshot", None)
     sys.modules.pop(module_name, None)
     return importlib.import_module(module_name)
 
@@ -125,8 +152,8 @@ def test_get_work_order_parts_uses_part_detail():
     )
     parts = module.get_work_order_parts("WO-001")
     assert parts[0]["required_qty"] == 3
-    assert parts[0]["consumed_qty"] == 1
-    assert parts[0]["qty"] == 2
+    assert parts[0]["consumed_qty"] == 2
+    assert parts[0]["qty"] == 1
 
 
 def test_stock_entry_submission_without_target_warehouse():
@@ -158,38 +185,148 @@ def test_stock_entry_submission_without_target_warehouse():
     assert se.submitted
 
 
-def test_update_work_order_updates_duplicate_parts():
+def test_update_work_order_records_ledger_without_saving_work_order():
     frappe = setup_frappe_stub()
     messages = []
     frappe.msgprint = lambda msg, *args, **kwargs: messages.append(msg)
 
-    part1 = types.SimpleNamespace(item_code="ITEM-001", consumed_qty=0)
-    part2 = types.SimpleNamespace(item_code="ITEM-001", consumed_qty=0)
-    work_order = types.SimpleNamespace(
-        part_detail=[part1, part2],
-        flags=types.SimpleNamespace(),
-        save=lambda: None,
-        add_comment=lambda *args, **kwargs: None,
-        update_status=lambda: None,
-        calculate_total_consumed_qty=lambda: None,
-    )
-
-    def get_doc(doctype, name):
-        if doctype == "Work Order":
-            return work_order
-        return types.SimpleNamespace()
+    def get_doc(*args, **kwargs):
+        raise AssertionError("Work Order should not be loaded")
 
     frappe.get_doc = get_doc
+    inserted = []
+    upserts = []
+    frappe.db.bulk_insert = lambda doctype, fields, values: inserted.extend(values)
+    frappe.db.sql = lambda query, values=None, **kwargs: upserts.append((query, values))
 
     module = import_doctype(
         "car_workshop.car_workshop.doctype.workshop_material_issue.workshop_material_issue"
     )
     wmi = module.WorkshopMaterialIssue()
+    wmi.doctype = "Workshop Material Issue"
     wmi.name = "WMI-001"
     wmi.work_order = "WO-001"
-    wmi.items = [types.SimpleNamespace(item_code="ITEM-001", qty=1)]
+    wmi.items = [
+        types.SimpleNamespace(name="ROW-1", part="PART-001", item_code="ITEM-001", qty=1, work_order_item=None),
+        types.SimpleNamespace(name="ROW-2", part="PART-001", item_code="ITEM-001", qty=1, work_order_item=None),
+    ]
     wmi.update_work_order()
 
-    assert part1.consumed_qty == 1
-    assert part2.consumed_qty == 1
+    assert len(inserted) == 2
+    # Balance upsert and the consumed_qty copy onto Work Order Part
+    assert len(upserts) == 2
+    assert "issued_qty = IFNULL(issued_qty, 0) + VALUES(issued_qty)" in upserts[0][0]
+    assert upserts[0][1][-4:] == ["WO-001", "ITEM-001", "PART-001", 2.0]
     assert any("ITEM-001: 0.0 → 2.0" in m for m in messages)
+
+
+def test_stock_validation_prefetches_in_three_queries():
+    frappe = setup_frappe_stub()
+    queries = []
+
+    def get_all(doctype, filters=None, fields=None, **kwargs):
+        queries.append(doctype)
+        if doctype == "Part":
+            return [
+                AttrDict(name=name, item_code=f"ITEM-{name}", description=f"Part {name}")
+                for name in filters["name"][1]
+            ]
+        if doctype == "Item":
+            return [
+                types.SimpleNamespace(
+                    name=code, is_stock_item=1, disabled=0, stock_uom="Nos", valuation_rate=7
+                )
+                for code in filters["name"][1]
+            ]
+        if doctype == "Bin":
+            return [
+                types.SimpleNamespace(item_code=code, actual_qty=10, reserved_qty=2, valuation_rate=12)
+                for code in filters["item_code"][1]
+                if code != "ITEM-P2"
+            ]
+        return []
+
+    def fail_get_value(*args, **kwargs):
+        raise AssertionError("per-row lookup")
+
+    def throw(msg):
+        raise Exception(msg)
+
+    frappe.get_all = get_all
+    frappe.throw = throw
+    frappe.db.get_value = fail_get_value
+
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.workshop_material_issue.workshop_material_issue"
+    )
+    wmi = module.WorkshopMaterialIssue()
+    wmi.set_warehouse = "WH"
+    wmi.items = [
+        types.SimpleNamespace(part=f"P{i}", item_code=None, description=None, qty=1, uom=None)
+        for i in range(30)
+    ]
+    wmi.items[2].qty = 0.5
+
+    stock_details = wmi.get_stock_details()
+    wmi.validate_items(stock_details)
+
+    assert queries == ["Part", "Item", "Bin"]
+    assert wmi.items[0].item_code == "ITEM-P0"
+    assert wmi.items[0].uom == "Nos"
+    assert wmi.items[0].rate == 12
+    # No Bin in the warehouse falls back to the Item valuation rate
+    assert wmi.items[2].rate == 7
+
+    # Items without stock in the warehouse are rejected
+    try:
+        wmi.validate_stock_availability(stock_details)
+    except Exception as e:
+        assert "ITEM-P2" in str(e)
+    else:
+        raise AssertionError("expected insufficient stock")
+    assert queries == ["Part", "Item", "Bin"]
+
+
+def test_check_for_duplicates_reports_all_conflicts_in_one_query():
+    frappe = setup_frappe_stub()
+    queries = []
+
+    class AttrDict(dict):
+        __getattr__ = dict.get
+
+    def sql(query, params, as_dict=False):
+        queries.append(params)
+        return [
+            AttrDict(part="P1", name="WMI-SUB", docstatus=1),
+            AttrDict(part="P1", name="WMI-DRAFT-OLD", docstatus=0),
+            AttrDict(part="P3", name="WMI-DRAFT", docstatus=0),
+        ]
+
+    def throw(msg):
+        raise Exception(msg)
+
+    frappe.db.sql = sql
+    frappe.throw = throw
+
+    module = import_doctype(
+        "car_workshop.car_workshop.doctype.workshop_material_issue.workshop_material_issue"
+    )
+    wmi = module.WorkshopMaterialIssue()
+    wmi.name = "WMI-NEW"
+    wmi.work_order = "WO-001"
+    wmi.is_new = lambda: False
+    wmi.items = [types.SimpleNamespace(part=f"P{i}") for i in range(1, 5)]
+
+    try:
+        wmi.check_for_duplicates()
+    except Exception as e:
+        message = str(e)
+    else:
+        raise AssertionError("expected duplicate error")
+
+    assert len(queries) == 1
+    assert set(queries[0]["parts"]) == {"P1", "P2", "P3", "P4"}
+    assert queries[0]["name"] == "WMI-NEW"
+    assert "Part P1 has already been issued for Work Order WO-001 in Material Issue WMI-SUB" in message
+    assert "Part P3 already exists in draft Material Issue WMI-DRAFT" in message
+    assert "P2" not in message
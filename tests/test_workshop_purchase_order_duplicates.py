@@ -0,0 +1,103 @@
+import sys
+import types
+from pathlib import Path
+import pytest
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(active_items):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    def throw(msg):
+        raise Exception(msg)
+    frappe.throw = throw
+    frappe.queries = []
+
+    def sql(query, values=None, as_dict=False):
+        frappe.queries.append(values)
+        return [
+            AttrDict(row) for row in active_items
+            if row["reference_doctype"] in values.get("reference_doctypes", ())
+            and row["purchase_order"] != values.get("exclude_po")
+        ]
+
+    frappe.db = types.SimpleNamespace(exists=lambda *args, **kwargs: True, sql=sql)
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = float
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.now_datetime = lambda: types.SimpleNamespace(strftime=lambda fmt: "00:00:00")
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+    class Document:
+        pass
+    document.Document = Document
+    model.document = document
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_po_module():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    module_name = "car_workshop.car_workshop.doctype.workshop_purchase_order.workshop_purchase_order"
+    sys.modules.pop(module_name, None)
+    return __import__(module_name, fromlist=["*"])
+
+
+def make_po(module, count, billable=0):
+    po = module.WorkshopPurchaseOrder()
+    po.name = "WPO-NEW"
+    po.work_order = "WO-001"
+    po.items = [
+        types.SimpleNamespace(item_type="Part", reference_doctype=f"PART-{i}", billable=billable)
+        for i in range(count)
+    ]
+    return po
+
+
+def test_validate_duplicate_items_uses_one_query_for_many_items():
+    frappe = setup_frappe_stub([
+        {"item_type": "Part", "reference_doctype": "PART-39", "billable": 0, "purchase_order": "WPO-001"},
+    ])
+    module = import_po_module()
+    po = make_po(module, 40)
+
+    with pytest.raises(Exception) as exc:
+        po.validate_duplicate_items()
+
+    assert "WPO-001" in str(exc.value)
+    assert "PART-39" in str(exc.value)
+    assert len(frappe.queries) == 1
+    assert frappe.queries[0]["exclude_po"] == "WPO-NEW"
+
+
+def test_validate_duplicate_items_respects_billable_flag():
+    setup_frappe_stub([
+        {"item_type": "Part", "reference_doctype": "PART-0", "billable": 1, "purchase_order": "WPO-001"},
+    ])
+    module = import_po_module()
+    make_po(module, 3, billable=0).validate_duplicate_items()
+
+
+def test_check_duplicate_po_ignores_billable_flag():
+    setup_frappe_stub([
+        {"item_type": "Part", "reference_doctype": "PART-0", "billable": 1, "purchase_order": "WPO-001"},
+    ])
+    module = import_po_module()
+
+    assert module.check_duplicate_po("WO-001", "Part", "PART-0", "new") == {
+        "exists": True,
+        "po_number": "WPO-001",
+    }
+    assert module.check_duplicate_po("WO-001", "OPL", "PART-0", "new") == {"exists": False}
+    assert module.check_duplicate_po("WO-001", "Part", "PART-0", "WPO-001") == {"exists": False}
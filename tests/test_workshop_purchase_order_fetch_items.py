@@ -0,0 +1,108 @@
+import sys
+import types
+from pathlib import Path
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(rows_by_doctype):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+
+    def sql(query, values=None, as_dict=False):
+        frappe.queries.append((" ".join(query.split()), values))
+        for doctype, rows in rows_by_doctype.items():
+            if f"`tab{doctype}`" in query:
+                return [AttrDict(row) for row in rows]
+        return []
+
+    def get_doc(*args, **kwargs):
+        raise AssertionError("Work Order should not be loaded")
+
+    frappe.db = types.SimpleNamespace(sql=sql, exists=lambda doctype, name: name == "WO-001")
+    frappe.get_doc = get_doc
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.now_datetime = lambda: None
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        pass
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_po_module():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    module_name = "car_workshop.car_workshop.doctype.workshop_purchase_order.workshop_purchase_order"
+    sys.modules.pop(module_name, None)
+    return __import__(module_name, fromlist=["*"])
+
+
+def test_only_requested_sections_are_queried_with_filters_in_sql():
+    frappe = setup_frappe_stub({
+        "Work Order Job Type": [{"job_type": "JT-1", "description": "Paint", "price": 100}],
+    })
+    module = import_po_module()
+
+    result = module.fetch_work_order_items(
+        "WO-001", fetch_opl=1, only_without_po=1, filter_text="50%_off", current_po="WPO-001"
+    )
+
+    assert result == {"opl_jobs": [{"job_type": "JT-1", "description": "Paint", "price": 100}]}
+    assert len(frappe.queries) == 1
+    query, values = frappe.queries[0]
+    assert "FROM `tabWork Order Job Type`" in query
+    assert "AND is_opl = 1" in query
+    assert "purchase_order = %(current_po)s" in query
+    assert "IFNULL(description, '') LIKE %(filter_text)s" in query
+    assert "LIMIT" not in query
+    assert values["filter_text"] == "%50\\%\\_off%"
+    assert values["current_po"] == "WPO-001"
+
+
+def test_pages_report_next_start():
+    frappe = setup_frappe_stub({
+        "Work Order Part": [
+            {"part": f"PART-{i}", "part_name": "", "quantity": 1, "rate": 1, "amount": 1}
+            for i in range(3)
+        ],
+        "Work Order Expense": [{"expense_type": "Towing", "description": "", "amount": 5}],
+    })
+    module = import_po_module()
+
+    result = module.fetch_work_order_items(
+        "WO-001", fetch_parts=1, fetch_expenses=1, only_without_po=0, start=10, page_length=2
+    )
+
+    assert [row["part"] for row in result["parts"]] == ["PART-0", "PART-1"]
+    assert result["next_start"] == {"parts": 12, "expenses": None}
+    assert frappe.queries[0][1]["limit"] == 3
+    assert frappe.queries[0][1]["start"] == 10
+    assert "current_po" not in frappe.queries[0][1]
+
+
+def test_missing_work_order_returns_error():
+    setup_frappe_stub({})
+    module = import_po_module()
+
+    assert "error" in module.fetch_work_order_items("WO-404", fetch_parts=1)
@@ -16,6 +16,8 @@ def setup_frappe_stub():
     utils.cint = int
     utils.getdate = lambda v: v
     utils.now_datetime = lambda: types.SimpleNamespace(strftime=lambda fmt: "00:00:00")
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
     frappe.utils = utils
     sys.modules["frappe"] = frappe
     sys.modules["frappe.utils"] = utils
@@ -0,0 +1,148 @@
+import sys
+import types
+from pathlib import Path
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(locked_rows):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+    frappe.messages = []
+    frappe.cleared = []
+
+    def sql(query, values=None, as_dict=False):
+        frappe.queries.append((" ".join(query.split()), values))
+        if "FOR UPDATE" in query:
+            return [AttrDict(row) for row in locked_rows]
+        return []
+
+    def get_doc(*args, **kwargs):
+        raise AssertionError("Work Order should not be loaded")
+
+    frappe.db = types.SimpleNamespace(
+        sql=sql,
+        sql_list=lambda query, values=None: [row["name"] for row in sql(query, values)],
+    )
+    frappe.get_doc = get_doc
+    frappe.msgprint = lambda msg, *args, **kwargs: frappe.messages.append(msg)
+    frappe.clear_document_cache = lambda doctype, name: frappe.cleared.append((doctype, name))
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    frappe.session = types.SimpleNamespace(user="buyer@example.com")
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.now_datetime = lambda: None
+    utils.now = lambda: "2024-01-01 00:00:00"
+    utils.fmt_money = lambda value, *args, **kwargs: str(value)
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        pass
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_po_module():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    module_name = "car_workshop.car_workshop.doctype.workshop_purchase_order.workshop_purchase_order"
+    sys.modules.pop(module_name, None)
+    return __import__(module_name, fromlist=["*"])
+
+
+def make_po(module, purchase_type, items):
+    po = module.WorkshopPurchaseOrder()
+    po.name = "WPO-001"
+    po.work_order = "WO-001"
+    po.purchase_type = purchase_type
+    po.items = [
+        types.SimpleNamespace(item_type=item_type, reference_doctype=reference, rate=rate)
+        for item_type, reference, rate in items
+    ]
+    return po
+
+
+def test_update_work_order_writes_only_locked_rows():
+    frappe = setup_frappe_stub([
+        {"name": "WOP-1", "reference": "PART-1"},
+        {"name": "WOP-2", "reference": "PART-1"},
+        {"name": "WOP-3", "reference": "PART-2"},
+    ])
+    module = import_po_module()
+    po = make_po(module, "Part", [
+        ("Part", "PART-1", 10),
+        ("Part", "PART-2", 25),
+        ("Part", "PART-1", 99),
+    ])
+
+    po.update_work_order()
+
+    select, values = frappe.queries[0]
+    assert "FROM `tabWork Order Part`" in select
+    assert values == {
+        "work_order": "WO-001",
+        "parentfield": "part_detail",
+        "references": ("PART-1", "PART-2"),
+    }
+
+    updates = [values for query, values in frappe.queries[1:3]]
+    assert all("SET purchase_order = %(purchase_order)s, po_rate = %(rate)s" in query
+               for query, _ in frappe.queries[1:3])
+    assert updates == [
+        {"purchase_order": "WPO-001", "rate": 10.0, "names": ("WOP-1", "WOP-2")},
+        {"purchase_order": "WPO-001", "rate": 25.0, "names": ("WOP-3",)},
+    ]
+    # The Work Order's modified is bumped so stale forms cannot save the old links
+    assert "UPDATE `tabWork Order` SET lines_without_po" in frappe.queries[3][0]
+    assert "modified = %(modified)s" in frappe.queries[3][0]
+    assert frappe.queries[3][1] == {
+        "work_order": "WO-001",
+        "delta": -3,
+        "modified": "2024-01-01 00:00:00",
+        "user": "buyer@example.com",
+    }
+    assert frappe.cleared == [("Work Order", "WO-001")]
+    assert len(frappe.messages) == 1
+
+
+def test_update_work_order_without_matching_rows_writes_nothing():
+    frappe = setup_frappe_stub([])
+    module = import_po_module()
+    po = make_po(module, "OPL", [("OPL", "JT-1", 50)])
+
+    po.update_work_order()
+
+    assert len(frappe.queries) == 1
+    assert "is_opl = 1" in frappe.queries[0][0]
+    assert frappe.messages == []
+
+
+def test_remove_from_work_order_clears_linked_job_types():
+    frappe = setup_frappe_stub([{"name": "WOJ-1"}])
+    module = import_po_module()
+    po = make_po(module, "OPL", [])
+
+    po.remove_from_work_order()
+
+    assert "FROM `tabWork Order Job Type`" in frappe.queries[0][0]
+    assert frappe.queries[0][1]["purchase_order"] == "WPO-001"
+    assert "SET purchase_order = '', vendor_rate = 0" in frappe.queries[1][0]
+    assert frappe.queries[1][1] == {"names": ("WOJ-1",)}
+    assert frappe.queries[2][1]["delta"] == 1
+    assert frappe.queries[2][1]["modified"] == "2024-01-01 00:00:00"
+    assert frappe.cleared == [("Work Order", "WO-001")]
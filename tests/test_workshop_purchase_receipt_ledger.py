@@ -0,0 +1,103 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class AttrDict(dict):
+    __getattr__ = dict.get
+
+
+def setup_frappe_stub(ledger_rows):
+    frappe = types.ModuleType("frappe")
+    frappe._ = lambda m: m
+    frappe.queries = []
+
+    def sql(query, values=None, as_dict=False):
+        frappe.queries.append((query, values))
+        rows = [AttrDict(row) for row in ledger_rows]
+        if values and "po_items" in values:
+            rows = [row for row in rows if row.po_item in values["po_items"]]
+        return rows
+
+    def get_all(*args, **kwargs):
+        raise AssertionError("per-receipt query")
+
+    frappe.db = types.SimpleNamespace(sql=sql)
+    frappe.get_all = get_all
+    frappe.whitelist = lambda *args, **kwargs: (lambda f: f)
+    frappe.msgprint = lambda *args, **kwargs: None
+
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda v: float(v or 0)
+    utils.cint = lambda v: int(v or 0)
+    utils.getdate = lambda v: v
+    utils.nowdate = lambda: "2024-01-01"
+    frappe.utils = utils
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+
+    class Document:
+        pass
+
+    document.Document = Document
+    model.document = document
+
+    sys.modules["frappe"] = frappe
+    sys.modules["frappe.utils"] = utils
+    sys.modules["frappe.model"] = model
+    sys.modules["frappe.model.document"] = document
+    return frappe
+
+
+def import_receipt_module():
+    module_name = "car_workshop.car_workshop.doctype.workshop_purchase_receipt.workshop_purchase_receipt"
+    sys.modules.pop(module_name, None)
+    return importlib.import_module(module_name)
+
+
+def test_received_qty_uses_single_grouped_query():
+    frappe = setup_frappe_stub([
+        {"po_item": "POI-1", "received_qty": 7},
+        {"po_item": "POI-2", "received_qty": 2},
+    ])
+    module = import_receipt_module()
+
+    receipt = module.WorkshopPurchaseReceipt()
+    receipt.purchase_order = "PO-001"
+    receipt.name = "WPR-003"
+
+    assert receipt.get_previously_received_qty() == {"POI-1": 7, "POI-2": 2}
+    assert len(frappe.queries) == 1
+    query, values = frappe.queries[0]
+    assert "GROUP BY wpri.po_item" in query
+    assert values == {"purchase_order": "PO-001", "exclude_receipt": "WPR-003"}
+
+
+def test_unmark_items_uses_ledger_of_other_receipts():
+    frappe = setup_frappe_stub([
+        {"po_item": "POI-1", "received_qty": 3},
+    ])
+    saved = []
+    po_items = [
+        AttrDict(name="POI-1", received_qty=8),
+        AttrDict(name="POI-2", received_qty=5),
+    ]
+    po_doc = types.SimpleNamespace(items=po_items, save=lambda **kwargs: saved.append(True))
+    frappe.get_doc = lambda doctype, name: po_doc
+    module = import_receipt_module()
+
+    receipt = module.WorkshopPurchaseReceipt()
+    receipt.purchase_order = "PO-001"
+    receipt.name = "WPR-002"
+    receipt.items = [AttrDict(po_item="POI-1"), AttrDict(po_item="POI-2")]
+    receipt.unmark_items_as_received()
+
+    assert len(frappe.queries) == 1
+    assert set(frappe.queries[0][1]["po_items"]) == {"POI-1", "POI-2"}
+    assert po_items[0].received_qty == 3
+    assert po_items[1].received_qty == 0
+    assert saved